@@ -1,7 +1,8 @@
 from fastapi import APIRouter
-from .endpoints import vehicles, gtfs, kpi, trips, routes, agencies, predictions
+from app.core.responses import FastJSONRoute
+from .endpoints import vehicles, gtfs, kpi, trips, routes, agencies, predictions, dashboard
 
-api_router = APIRouter()
+api_router = APIRouter(route_class=FastJSONRoute)
 
 # Include all API endpoints
 api_router.include_router(agencies.router, prefix="/agencies", tags=["agencies"])
@@ -10,4 +11,5 @@ api_router.include_router(gtfs.router, prefix="/gtfs", tags=["gtfs"])
 api_router.include_router(kpi.router, prefix="/kpi", tags=["kpi"])
 api_router.include_router(trips.router, prefix="/trips", tags=["trips"])
 api_router.include_router(routes.router, prefix="/routes", tags=["routes"])
-api_router.include_router(predictions.router, prefix="/predictions", tags=["predictions"])
\ No newline at end of file
+api_router.include_router(predictions.router, prefix="/predictions", tags=["predictions"])
+api_router.include_router(dashboard.router, prefix="/dashboard", tags=["dashboard"])
@@ -1,23 +1,29 @@
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.api.pagination import Page, PageRequest, next_cursor_headers
 from app.db.session import get_db
-from app.crud.agency_crud import agency_crud
+from app.crud.agency_crud import AGENCY_KEYS, agency_crud
 from app.schemas.agency import Agency, AgencyCreate, AgencyUpdate, AgencyPublic
 from app.core.config import settings
+from app.core.responses import FastJSONRoute
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
 
 @router.get("/", response_model=List[AgencyPublic])
 async def get_agencies(
+    response: Response,
     enabled_only: bool = True,
-    skip: int = 0,
-    limit: int = 100,
+    page: PageRequest = Depends(Page(default=100)),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get list of all agencies"""
-    agencies = await agency_crud.get_agencies(db, enabled_only=enabled_only, skip=skip, limit=limit)
+    """Get list of agencies by display name, one page at a time (next page cursor in X-Next-Cursor)"""
+    agencies = await agency_crud.get_agencies(
+        db, enabled_only=enabled_only, limit=page.limit + 1, after=page.after(AGENCY_KEYS)
+    )
+    agencies, next_cursor = page.slice(agencies, lambda agency: (agency.display_name, agency.agency_id))
+    response.headers.update(next_cursor_headers(next_cursor))
     return agencies
 
 @router.get("/current", response_model=AgencyPublic)
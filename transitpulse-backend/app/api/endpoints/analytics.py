@@ -8,6 +8,7 @@ This module provides comprehensive analytics for transit operations including:
 - Operational KPIs and dashboards
 
 All endpoints return data in a consistent, readable format with clear documentation.
+They only read, so they run on the read replica when one is configured.
 """
 
 from datetime import datetime, timedelta
@@ -18,15 +19,17 @@ from sqlalchemy.future import select
 from sqlalchemy import func, and_, or_, desc, text
 import logging
 
-from app.core.database import get_db
+from app.core.database import get_read_db
 from app.models.vehicle import LiveVehiclePosition
 from app.models.gtfs_static import GTFSRoute, GTFSStop, GTFSTrip
+from app.core.responses import FastJSONRoute
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
 # Create router
 router = APIRouter(
+    route_class=FastJSONRoute,
     prefix="/analytics",
     tags=["analytics"],
     responses={404: {"description": "Not found"}}
@@ -39,7 +42,7 @@ router = APIRouter(
 @router.get("/fleet/overview")
 async def get_fleet_overview(
     agency_id: Optional[str] = Query(None, description="Filter by agency ID"),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> Dict[str, Any]:
     """
     📊 **Fleet Overview Analytics**
@@ -108,7 +111,7 @@ async def get_fleet_overview(
 
 @router.get("/fleet/status-breakdown")
 async def get_fleet_status_breakdown(
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> Dict[str, Any]:
     """
     🚦 **Fleet Status Breakdown**
@@ -180,7 +183,7 @@ async def get_fleet_status_breakdown(
 async def get_route_performance(
     route_id: Optional[str] = Query(None, description="Specific route ID"),
     time_period: str = Query("24h", description="Time period: 1h, 6h, 24h, 7d"),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> List[Dict[str, Any]]:
     """
     📈 **Route Performance Analytics**
@@ -268,7 +271,7 @@ async def get_route_performance(
 async def get_service_reliability(
     route_id: Optional[str] = Query(None, description="Filter by route"),
     time_period: str = Query("24h", description="Time period for analysis"),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> Dict[str, Any]:
     """
     ⏱️ **Service Reliability Metrics**
@@ -316,7 +319,7 @@ async def get_service_reliability(
 
 @router.get("/kpis/operational")
 async def get_operational_kpis(
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> Dict[str, Any]:
     """
     📊 **Operational KPIs Dashboard**
@@ -376,7 +379,7 @@ async def get_operational_kpis(
 async def get_hourly_trends(
     metric: str = Query("active_vehicles", description="Metric to analyze: active_vehicles, avg_speed, coverage"),
     days_back: int = Query(7, description="Number of days to analyze"),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> Dict[str, Any]:
     """
     📈 **Hourly Trends Analysis**
@@ -461,7 +464,7 @@ async def get_custom_report(
     start_date: Optional[datetime] = Query(None, description="Start date for analysis"),
     end_date: Optional[datetime] = Query(None, description="End date for analysis"),
     filters: Optional[str] = Query(None, description="JSON string of additional filters"),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> Dict[str, Any]:
     """
     📋 **Custom Analytics Reports**
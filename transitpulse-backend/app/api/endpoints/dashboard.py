@@ -0,0 +1,31 @@
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+
+from app.core.responses import FastJSONRoute, SerializedJSONResponse
+from app.realtime.dashboard import dashboard_snapshots
+
+router = APIRouter(route_class=FastJSONRoute)
+
+@router.get("/snapshot")
+async def get_dashboard_snapshot(
+    request: Request,
+    agency: str = Query("golden_gate", description="Transit agency")
+):
+    """
+    Per-route status summary for the dashboard views.
+
+    Returns every bus route with its active vehicle count, vehicles per
+    direction, the headsigns in service and delay statistics from the
+    real-time trip updates, plus fleet-wide totals. The summary is built once
+    per real-time update (``seq``) and trip updates fetch and served from
+    memory; the ETag is a digest of the summary, so polling clients can skip
+    unchanged snapshots with ``If-None-Match``.
+    """
+    try:
+        seq, etag, body = await dashboard_snapshots.serialized(agency)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    headers = {"ETag": etag, "X-Snapshot-Seq": str(seq), "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return SerializedJSONResponse(body, headers=headers)
@@ -1,70 +1,115 @@
 import asyncio
 import json
-from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func
 from sqlalchemy.future import select
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, Iterable, List, Optional, Any, Union
 import logging
 
+import numpy as np
+
+from app.core.config import settings
 from app.core.database import get_db
 from app.models.gtfs_static import (
     GTFSRoute as GTFSRouteModel, 
     GTFSStop as GTFSStopModel, 
     GTFSStopTime, 
     GTFSTrip,
-    GTFSShape,
-    GTFSCalendar,
-    GTFSCalendarDate
+    GTFSShape
 )
+from app.api.fieldsets import Fieldset, model_columns, pick
+from app.api.pagination import Page, PageRequest, next_cursor_headers
+from app.cache import PayloadContent, route_timetables, serialized_payloads, service_calendars, static_feed_versions
+from app.cache.calendar import WEEKDAYS
+from app.cache.timetables import schedule_trips
+from app.core.responses import FastJSONResponse, FastJSONRoute, NDJSONResponse, SerializedJSONResponse
+from app.realtime import realtime_payloads, snapshot_store
 from app.websocket.manager import manager
+from app.utils.gtfs_time import NO_TIME, format_gtfs_time
 from app.schemas.gtfs import GTFSRoute, GTFSRouteResponse, GTFSStop as GTFSStopSchema, GTFSStopResponse
 from data_ingestion.auto_gtfs_updater import auto_updater
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# In-memory storage for vehicle positions (for demo purposes)
-vehicle_positions: Dict[str, Dict] = {}
-
 router = APIRouter(
+    route_class=FastJSONRoute,
     tags=["gtfs"],
     responses={404: {"description": "Not found"}},
 )
 
+ROUTE_FIELDS = Fieldset(
+    ["route_id", "agency_id", "route_short_name", "route_long_name", "route_desc",
+     "route_type", "route_url", "route_color", "route_text_color"],
+    always=["route_id"]
+)
+
+# Sort keys of the paginated lists; NULL names sort first, as the empty string
+ROUTE_KEYS = (func.coalesce(GTFSRouteModel.route_short_name, ""), GTFSRouteModel.route_id)
+STOP_KEYS = (func.coalesce(GTFSStopModel.stop_name, ""), GTFSStopModel.stop_id)
+
+STOP_FIELDS = Fieldset(
+    ["stop_id", "stop_code", "stop_name", "stop_lat", "stop_lon", "zone_id", "wheelchair_boarding"],
+    always=["stop_id"]
+)
+
 @router.get("/routes", response_model=GTFSRouteResponse)
 async def get_gtfs_routes(
+    request: Request,
     db: AsyncSession = Depends(get_db),
-    limit: int = Query(100, gt=0, le=1000),
-    offset: int = Query(0, ge=0)
+    page: PageRequest = Depends(Page(default=100)),
+    fields: Optional[List[str]] = Depends(ROUTE_FIELDS)
 ):
     """
-    Get GTFS bus routes from the database with pagination.
+    Get GTFS bus routes from the database, one page at a time in
+    route_short_name order. Pass ``next_cursor`` back as ``cursor`` for the
+    next page.
     Only returns routes with route_type = 3 (bus routes).
+
+    ``fields`` (e.g. ``route_id,route_short_name,route_color``) selects and
+    returns only those columns.
     """
-    try:
-        result = await db.execute(
-            select(GTFSRouteModel)
-            .where(GTFSRouteModel.route_type == 3)  # Only bus routes
-            .order_by(GTFSRouteModel.route_short_name)
-            .offset(offset)
-            .limit(limit)
+    async def build():
+        query = page.apply(
+            select(GTFSRouteModel).where(GTFSRouteModel.route_type == 3),  # Only bus routes
+            ROUTE_KEYS
         )
-        db_routes = result.scalars().all()
-
-        routes = [
-            GTFSRoute.model_validate({
-                col.name: getattr(route, col.name)
-                for col in route.__table__.columns
-            })
-            for route in db_routes
-        ]
+        if fields is not None:
+            # route_short_name is selected for the cursor even when not returned
+            columns = model_columns(GTFSRouteModel, dict.fromkeys([*fields, "route_short_name"]))
+            result = await db.execute(query.with_only_columns(*columns))
+            rows = [dict(row._mapping) for row in result]
+        else:
+            result = await db.execute(query)
+            rows = [
+                GTFSRoute.model_validate({
+                    col.name: getattr(route, col.name)
+                    for col in route.__table__.columns
+                }).model_dump()
+                for route in result.scalars().all()
+            ]
+        rows, next_cursor = page.slice(rows, lambda r: (r["route_short_name"] or "", r["route_id"]))
+        routes = [pick(row, fields) for row in rows]
 
-        return {
+        return PayloadContent({
             "routes": routes,
             "status": "success",
-            "message": f"{len(routes)} bus routes returned"
-        }
+            "message": f"{len(routes)} bus routes returned",
+            "next_cursor": next_cursor
+        }, next_cursor_headers(next_cursor))
 
+    try:
+        # Served as stored bytes until the next static feed load
+        payload = await serialized_payloads.get(
+            ("gtfs_routes", page.limit, page.cursor, tuple(fields or ())),
+            static_feed_versions.get("golden_gate"),
+            build
+        )
+        return SerializedJSONResponse.negotiated(request, payload)
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Error fetching bus routes", exc_info=True)
         raise HTTPException(
@@ -83,14 +128,19 @@ async def test_connection():
 
 @router.get("/stops", response_model=GTFSStopResponse, name="get_stops")
 async def get_stops_by_route(
+    response: Response,
     route_id: str = Query(..., description="Filter stops by route ID (can be full ID like 'GG_101' or just the number '101')"),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    page: PageRequest = Depends(Page(default=settings.PAGE_SIZE_MAX)),
+    fields: Optional[List[str]] = Depends(STOP_FIELDS)
 ):
     """
-    Get all stops for a specific route.
+    Get the stops for a specific route, one page at a time in stop_name order.
     
     This endpoint returns all stops that are served by trips belonging to the specified route.
     Accepts both full route IDs (e.g., 'GG_101') and numeric route IDs (e.g., '101').
+    Map views can pass ``fields=stop_id,stop_lat,stop_lon`` to fetch only those columns.
+    Pass ``next_cursor`` back as ``cursor`` for the next page.
     """
     try:
         # If route_id is numeric, try to find a matching route with any agency prefix
@@ -118,14 +168,30 @@ async def get_stops_by_route(
                 "data": []
             }
         
-        # Get stops via stop_times
-        result = await db.execute(
-            select(GTFSStopModel)
-            .join(GTFSStopTime, GTFSStopModel.stop_id == GTFSStopTime.stop_id)
-            .where(GTFSStopTime.trip_id.in_(trip_ids))
-            .distinct()
-            .order_by(GTFSStopModel.stop_name)
+        # Get stops via stop_times (a semi-join, so no DISTINCT over the page)
+        stops_query = page.apply(
+            select(GTFSStopModel).where(
+                GTFSStopModel.stop_id.in_(
+                    select(GTFSStopTime.stop_id).where(GTFSStopTime.trip_id.in_(trip_ids))
+                )
+            ),
+            STOP_KEYS
         )
+        stop_key = lambda stop: (stop["stop_name"] or "", stop["stop_id"])
+        if fields is not None:
+            # stop_name is selected for the cursor even when not returned
+            columns = model_columns(GTFSStopModel, dict.fromkeys([*fields, "stop_name"]))
+            result = await db.execute(stops_query.with_only_columns(*columns))
+            stops, next_cursor = page.slice([dict(row._mapping) for row in result], stop_key)
+            stops = [pick(stop, fields) for stop in stops]
+            return FastJSONResponse({
+                "status": "success",
+                "message": f"Found {len(stops)} stops for route {route_id}",
+                "data": stops,
+                "next_cursor": next_cursor
+            }, headers=next_cursor_headers(next_cursor))
+
+        result = await db.execute(stops_query)
         
         # Convert SQLAlchemy objects to dictionaries
         stops = []
@@ -142,8 +208,10 @@ async def get_stops_by_route(
             # Only add the stop if it has a valid stop_id
             if stop_dict['stop_id'] is not None:
                 stops.append(stop_dict)
+        stops, next_cursor = page.slice(stops, stop_key)
+        response.headers.update(next_cursor_headers(next_cursor))
         
-        if not stops:
+        if not stops and not page.cursor:
             return {
                 "status": "success",
                 "message": f"Route {route_id} has {len(trip_ids)} trips but no stop schedule data loaded",
@@ -153,9 +221,12 @@ async def get_stops_by_route(
         return {
             "status": "success",
             "message": f"Found {len(stops)} stops for route {route_id}",
-            "data": stops
+            "data": stops,
+            "next_cursor": next_cursor
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
@@ -406,85 +477,59 @@ async def get_route(
     }
 
 @router.websocket("/ws/vehicles/{route_id}")
-async def websocket_vehicle_updates(websocket: WebSocket, route_id: str):
+async def websocket_vehicle_updates(
+    websocket: WebSocket,
+    route_id: str,
+    agency: str = Query("golden_gate", description="Agency whose snapshot to follow"),
+    since: Optional[int] = Query(None, description="Last sequence number seen, to resume without a full reload"),
+    encoding: str = Query("json", description="Frame encoding: json, or msgpack for compact binary frames")
+):
     """
     WebSocket endpoint for real-time vehicle position updates for a specific route.
+
+    The first message is the route's current state from the in-memory snapshot
+    (``snapshot``), or the net changes since ``since`` (``vehicle_delta``) when
+    that sequence is still in the snapshot history. Updates follow, each
+    stamped with its snapshot sequence number.
+
+    With ``encoding=msgpack`` (if available on the server) frames are binary
+    MessagePack carrying only changed fields; see app.websocket.codec.
     """
-    await manager.connect(websocket, route_id)
+    await manager.connect(websocket, route_id, agency, since, encoding)
     try:
         while True:
             # Keep connection alive
             await asyncio.sleep(10)
-            await websocket.send_json({"type": "ping", "message": "Connection alive"})
+            await manager.send(websocket, {"type": "ping", "message": "Connection alive"})
     except WebSocketDisconnect:
         await manager.disconnect(websocket, route_id)
     except Exception as e:
         print(f"WebSocket error: {e}")
         await manager.disconnect(websocket, route_id)
 
-async def simulate_vehicle_updates(manager):
-    """Simulate vehicle position updates (replace with real data source)
-    
-    Args:
-        manager: WebSocket manager instance for broadcasting updates
+@router.websocket("/ws/vehicles")
+async def websocket_vehicle_subscriptions(
+    websocket: WebSocket,
+    agency: str = Query("golden_gate", description="Agency whose snapshot to follow"),
+    encoding: str = Query("json", description="Frame encoding: json, or msgpack for compact binary frames")
+):
     """
-    while True:
-        try:
-            # In a real app, this would query your real-time data source
-            # For demo, we'll just move some vehicles around
-            for route_id in list(manager.active_connections.keys()):
-                if route_id not in vehicle_positions:
-                    vehicle_positions[route_id] = {}
-                
-                vehicles = vehicle_positions[route_id]
-                
-                # Move existing vehicles
-                for vehicle_id, vehicle in list(vehicles.items()):
-                    # Add some randomness to the movement
-                    vehicle["latitude"] += (0.001 * (0.5 - 0.1 * len(vehicles)))
-                    vehicle["longitude"] += (0.001 * (0.5 - 0.1 * len(vehicles)))
-                    vehicle["bearing"] = (vehicle.get("bearing", 0) + 5) % 360
-                    
-                    # Update timestamp
-                    vehicle["timestamp"] = int(asyncio.get_event_loop().time())
-                    
-                    # Broadcast update to all connected clients for this route
-                    await manager.broadcast(route_id, {
-                        "type": "vehicle_update",
-                        "data": vehicle
-                    })
-            
-            # Add some demo vehicles if none exist
-            if not vehicle_positions:
-                for i in range(1, 4):
-                    route_id = f"route_{i}"
-                    vehicle_positions[route_id] = {}
-                    
-                    # Add 1-2 vehicles per route
-                    for j in range(1, 3):
-                        vehicle_id = f"vehicle_{route_id}_{j}"
-                        vehicle_positions[route_id][vehicle_id] = {
-                            "vehicle_id": vehicle_id,
-                            "route_id": route_id,
-                            "latitude": 37.7749 + (0.1 * j),
-                            "longitude": -122.4194 + (0.1 * j),
-                            "bearing": 90 * j,
-                            "speed": 25,
-                            "timestamp": int(asyncio.get_event_loop().time()),
-                            "label": f"Bus {j}",
-                            "current_status": "IN_TRANSIT_TO"
-                        }
-            
-            await asyncio.sleep(1)  # Update every second
-            
-        except Exception as e:
-            print(f"Error in vehicle update simulation: {e}")
-            await asyncio.sleep(5)  # Wait before retrying
+    WebSocket endpoint for any set of routes, a map viewport, or all vehicles.
+
+    Send subscription requests as JSON, e.g. ``{"action": "subscribe",
+    "routes": ["10", "30"]}`` or ``{"action": "bbox", "bbox": [min_lon,
+    min_lat, max_lon, max_lat]}``. Each request is answered with a snapshot of
+    the vehicles now visible; updates then arrive only for those vehicles,
+    with ``vehicle_removed`` when one leaves the selected routes or viewport.
+    """
+    await manager.serve_subscriber(websocket, agency, encoding)
 
 @router.get("/vehicles/realtime")
 async def get_realtime_vehicles(
+    response: Response,
     route_id: Optional[str] = Query(None, description="Filter vehicles by route ID"),
     agency: str = Query("golden_gate", description="Transit agency"),
+    since: Optional[int] = Query(None, ge=0, description="Only return changes since this snapshot sequence"),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -492,7 +537,15 @@ async def get_realtime_vehicles(
     
     Returns current vehicle positions that are actively on the road right now,
     enhanced with direction_id and headsign information from GTFS data.
+
+    The ``X-Snapshot-Seq`` header carries the current snapshot sequence. With
+    ``since=<seq>`` the response is instead the in-memory delta since that
+    sequence (see ``/vehicles/realtime`` in the vehicles API).
     """
+    response.headers["X-Snapshot-Seq"] = str(snapshot_store.seq(agency))
+    if since is not None:
+        return await realtime_payloads.changes(agency, since, route_id)
+
     try:
         # Query live vehicles from database (only recent positions)
         from sqlalchemy import text
@@ -645,7 +698,9 @@ async def get_data_status():
             last_static = auto_updater.last_static_update.get(agency)
             status["static_data"][agency] = {
                 "last_updated": last_static.isoformat() if last_static else None,
-                "name": auto_updater.gtfs_feeds[agency]["name"]
+                "name": auto_updater.gtfs_feeds[agency]["name"],
+                "feed_version": auto_updater.loaded_feed_versions.get(agency),
+                "load_timings": auto_updater.last_static_load_timings.get(agency)
             }
             
             # Real-time data status  
@@ -702,141 +757,71 @@ async def debug_trips(db: AsyncSession = Depends(get_db)):
         return {"error": str(e), "type": type(e).__name__}
 
 
+def schedule_response(format: str, schedule: Dict[str, Any], trips: Iterable[Dict[str, Any]] = ()):
+    """The schedule as one JSON document, or as NDJSON: the schedule fields, then one line per trip."""
+    if format != "ndjson":
+        return {**schedule, "trips": list(trips)} if "trips" in schedule else schedule
+
+    async def lines():
+        yield {key: value for key, value in schedule.items() if key != "trips"}
+        for trip in trips:
+            yield trip
+
+    return NDJSONResponse(lines())
+
+async def route_timetables_on(route_id: str, date: str):
+    """The weekday name, active services and route timetables of a YYYY-MM-DD date."""
+    from datetime import datetime
+
+    target_date = datetime.strptime(date, "%Y-%m-%d").date()
+    # Services running on this date, exceptions included, from the precomputed calendar
+    service_calendar = await service_calendars.get()
+    active_services = list(service_calendar.services_on(target_date))
+    timetables = await route_timetables.for_route(route_id, active_services) if active_services else []
+    return WEEKDAYS[target_date.weekday()], active_services, timetables
+
 @router.get("/routes/{route_id}/schedule")
 async def get_route_schedule(
     route_id: str,
     date: str = Query(..., description="Date in YYYY-MM-DD format"),
-    db: AsyncSession = Depends(get_db)
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json, or ndjson to stream one trip per line")
 ):
     """
     Get schedule data for a specific route on a specific date
     Returns both scheduled times and real-time comparison data when available
+
+    Trips come from the route's precomputed timetables for the services
+    running on the date, in first-departure order. With ``format=ndjson``
+    the response is streamed: the first line holds the schedule fields
+    without ``trips``, then each trip with its stops follows on its own line.
     """
     try:
-        from datetime import datetime, date as date_type
-        import calendar
-        
-        # Parse the date
-        target_date = datetime.strptime(date, "%Y-%m-%d").date()
-        day_of_week = target_date.weekday()  # 0=Monday, 6=Sunday
-        
-        # Map Python weekday to GTFS calendar format
-        day_names = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
-        gtfs_day = day_names[day_of_week]
-        
-        # Get active services for this date
-        service_query = select(GTFSCalendar).where(
-            GTFSCalendar.start_date <= target_date,
-            GTFSCalendar.end_date >= target_date,
-            getattr(GTFSCalendar, gtfs_day) == 1
-        )
-        
-        service_result = await db.execute(service_query)
-        active_services = [row.service_id for row in service_result.scalars().all()]
-        
-        # Check for calendar date exceptions
-        exception_query = select(GTFSCalendarDate).where(
-            GTFSCalendarDate.date == target_date
-        )
-        exception_result = await db.execute(exception_query)
-        exceptions = exception_result.scalars().all()
-        
-        # Apply exceptions (1=added, 2=removed)
-        for exception in exceptions:
-            if exception.exception_type == 1:  # Service added
-                if exception.service_id not in active_services:
-                    active_services.append(exception.service_id)
-            elif exception.exception_type == 2:  # Service removed
-                if exception.service_id in active_services:
-                    active_services.remove(exception.service_id)
-        
+        gtfs_day, active_services, timetables = await route_timetables_on(route_id, date)
+
         if not active_services:
-            return {
+            return schedule_response(format, {
                 "route_id": route_id,
                 "date": date,
                 "trips": [],
                 "message": "No service scheduled for this date"
-            }
-        
-        # Get trips for this route and services
-        trips_query = select(GTFSTrip).where(
-            GTFSTrip.route_id == route_id,
-            GTFSTrip.service_id.in_(active_services)
-        ).order_by(GTFSTrip.trip_id)
-        
-        trips_result = await db.execute(trips_query)
-        trips = trips_result.scalars().all()
-        
-        if not trips:
-            return {
+            })
+
+        if not timetables:
+            return schedule_response(format, {
                 "route_id": route_id,
                 "date": date,
                 "trips": [],
                 "message": "No trips found for this route on this date"
-            }
-        
-        # Get stop times for these trips
-        trip_ids = [trip.trip_id for trip in trips]
-        stop_times_query = select(GTFSStopTime, GTFSStopModel).join(
-            GTFSStopModel, GTFSStopTime.stop_id == GTFSStopModel.stop_id
-        ).where(
-            GTFSStopTime.trip_id.in_(trip_ids)
-        ).order_by(GTFSStopTime.trip_id, GTFSStopTime.stop_sequence)
-        
-        stop_times_result = await db.execute(stop_times_query)
-        stop_times_data = stop_times_result.all()
-        
-        # Organize data by trip
-        trip_data = {}
-        for trip in trips:
-            trip_data[trip.trip_id] = {
-                "trip_id": trip.trip_id,
-                "route_id": trip.route_id,
-                "direction_id": trip.direction_id,
-                "headsign": trip.trip_headsign,
-                "service_id": trip.service_id,
-                "stops": []
-            }
-        
-        # Add stop times to trips
-        for stop_time, stop in stop_times_data:
-            if stop_time.trip_id in trip_data:
-                trip_data[stop_time.trip_id]["stops"].append({
-                    "stop_id": stop_time.stop_id,
-                    "stop_name": stop.stop_name if stop else "Unknown Stop",
-                    "stop_sequence": stop_time.stop_sequence,
-                    "arrival_time": stop_time.arrival_time.strftime("%H:%M:%S") if stop_time.arrival_time else None,
-                    "departure_time": stop_time.departure_time.strftime("%H:%M:%S") if stop_time.departure_time else None,
-                    "stop_headsign": stop_time.stop_headsign,
-                    "pickup_type": stop_time.pickup_type,
-                    "drop_off_type": stop_time.drop_off_type,
-                    # For future real-time comparison
-                    "actual_arrival": None,
-                    "actual_departure": None,
-                    "delay": None,
-                    "status": "scheduled"
-                })
-        
-        # Convert to list and sort by first departure time
-        schedule_data = list(trip_data.values())
-        
-        # Sort trips by their first stop departure time
-        def get_first_departure(trip):
-            if trip["stops"]:
-                first_stop = min(trip["stops"], key=lambda x: x["stop_sequence"])
-                return first_stop.get("departure_time", "23:59:59")
-            return "23:59:59"
-        
-        schedule_data.sort(key=get_first_departure)
-        
-        return {
+            })
+
+        return schedule_response(format, {
             "route_id": route_id,
             "date": date,
             "day_of_week": gtfs_day,
             "active_services": active_services,
-            "total_trips": len(schedule_data),
-            "trips": schedule_data
-        }
+            "total_trips": sum(len(timetable.trip_ids) for timetable in timetables),
+            "trips": []
+        }, schedule_trips(timetables))
         
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Invalid date format: {e}")
@@ -848,70 +833,52 @@ async def get_route_schedule(
 @router.get("/routes/{route_id}/schedule/summary")
 async def get_route_schedule_summary(
     route_id: str,
-    date: str = Query(..., description="Date in YYYY-MM-DD format"),
-    db: AsyncSession = Depends(get_db)
+    date: str = Query(..., description="Date in YYYY-MM-DD format")
 ):
     """
     Get a summary of schedule data for a route on a specific date
+
+    Computed from the first-departure columns of the route's timetables,
+    without building the trips.
     """
     try:
-        # Get the full schedule data
-        schedule_data = await get_route_schedule(route_id, date, db)
-        
-        if "trips" not in schedule_data or not schedule_data["trips"]:
-            return {
-                "route_id": route_id,
-                "date": date,
-                "summary": {
-                    "total_trips": 0,
-                    "direction_0_trips": 0,
-                    "direction_1_trips": 0,
-                    "first_departure": None,
-                    "last_departure": None,
-                    "service_span": None
-                }
-            }
-        
-        trips = schedule_data["trips"]
-        
-        # Calculate summary statistics
-        direction_0_count = len([t for t in trips if t["direction_id"] == 0])
-        direction_1_count = len([t for t in trips if t["direction_id"] == 1])
-        
-        # Find first and last departures
-        all_departures = []
-        for trip in trips:
-            if trip["stops"]:
-                first_stop = min(trip["stops"], key=lambda x: x["stop_sequence"])
-                if first_stop.get("departure_time"):
-                    all_departures.append(first_stop["departure_time"])
-        
-        all_departures.sort()
-        first_departure = all_departures[0] if all_departures else None
-        last_departure = all_departures[-1] if all_departures else None
-        
+        _, _, timetables = await route_timetables_on(route_id, date)
+
+        direction_counts = {0: 0, 1: 0}
+        for timetable in timetables:
+            if timetable.direction_id in direction_counts:
+                direction_counts[timetable.direction_id] += len(timetable.trip_ids)
+        total_trips = sum(len(timetable.trip_ids) for timetable in timetables)
+
+        # First departures of every trip with stop times
+        departures = np.concatenate(
+            [timetable.first_departures for timetable in timetables] or [np.empty(0, dtype=np.int32)]
+        )
+        departures = departures[departures != NO_TIME]
+        first_departure = int(departures.min()) if len(departures) else None
+        last_departure = int(departures.max()) if len(departures) else None
+
         # Calculate service span
         service_span = None
-        if first_departure and last_departure:
-            from datetime import datetime
-            first_dt = datetime.strptime(first_departure, "%H:%M:%S")
-            last_dt = datetime.strptime(last_departure, "%H:%M:%S")
-            span = last_dt - first_dt
-            service_span = f"{span.seconds // 3600}h {(span.seconds % 3600) // 60}m"
-        
+        if first_departure is not None:
+            span = last_departure - first_departure
+            service_span = f"{span // 3600}h {(span % 3600) // 60}m"
+
         return {
             "route_id": route_id,
             "date": date,
             "summary": {
-                "total_trips": len(trips),
-                "direction_0_trips": direction_0_count,
-                "direction_1_trips": direction_1_count,
-                "first_departure": first_departure,
-                "last_departure": last_departure,
+                "total_trips": total_trips,
+                "direction_0_trips": direction_counts[0],
+                "direction_1_trips": direction_counts[1],
+                "first_departure": format_gtfs_time(first_departure),
+                "last_departure": format_gtfs_time(last_departure),
                 "service_span": service_span
             }
         }
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {e}")
     except Exception as e:
         logger.error(f"Error generating schedule summary for route {route_id} on {date}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate schedule summary: {str(e)}")
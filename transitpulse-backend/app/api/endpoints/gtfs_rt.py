@@ -10,8 +10,9 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '../../..', 'data_ingest
 from data_ingestion.gtfs_ingestor import GTFSIngestor
 from data_ingestion.gtfsrt_ingestor import GTFSRTIngestor
 from app.core.database import get_db
+from app.core.responses import FastJSONRoute
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
 
 # Get API key from environment variables
 API_KEY = os.getenv('GTFS_API_KEY')
@@ -3,9 +3,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.crud import kpi_crud
 from app.schemas.kpi import KPISummary
 from app.core.database import get_db
+from app.core.responses import FastJSONRoute
 from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
 
 @router.get("/kpi/summary", response_model=KPISummary)
 async def read_kpi_summary(db: AsyncSession = Depends(get_db)):
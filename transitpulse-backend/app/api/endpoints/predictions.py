@@ -7,11 +7,15 @@ that integrate live vehicle positions, GTFS-RT data, and schedules.
 
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.api.pagination import Page, PageRequest, next_cursor_headers
 from app.core.database import get_db
+from app.core.responses import FastJSONRoute
 from app.crud.predictions_crud import (
+    NO_ARRIVAL,
+    ROUTE_PREDICTION_KEYS,
     get_predictions_for_stop,
     get_predictions_for_route, 
     get_predictions_for_vehicle,
@@ -26,7 +30,7 @@ from app.schemas.predictions import (
     StopPredictionDisplay
 )
 
-router = APIRouter(prefix="/predictions", tags=["predictions"])
+router = APIRouter(prefix="/predictions", tags=["predictions"], route_class=FastJSONRoute)
 
 
 @router.get("/stop/{stop_id}", response_model=StopPredictionsResponse)
@@ -70,16 +74,26 @@ async def get_stop_predictions(
 @router.get("/route/{route_id}", response_model=RoutePredictionsResponse)
 async def get_route_predictions(
     route_id: str,
-    limit: int = Query(50, ge=1, le=200, description="Maximum number of predictions"),
+    response: Response,
+    page: PageRequest = Depends(Page(default=50)),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Get real-time predictions for all stops on a route.
     
-    Returns predictions organized by stop with vehicle information.
+    Returns predictions organized by stop with vehicle information, one page
+    at a time in stop order. Pass ``next_cursor`` back as ``cursor`` for the
+    next page.
     """
     try:
-        predictions = await get_predictions_for_route(db, route_id, limit)
+        predictions = await get_predictions_for_route(
+            db, route_id, page.limit + 1, after=page.after(ROUTE_PREDICTION_KEYS)
+        )
+        predictions, next_cursor = page.slice(
+            predictions,
+            lambda p: (p.stop_id, p.predicted_arrival_time or NO_ARRIVAL, p.id)
+        )
+        response.headers.update(next_cursor_headers(next_cursor))
         
         # Organize predictions by stop
         predictions_by_stop = {}
@@ -118,9 +132,12 @@ async def get_route_predictions(
             status="success", 
             message=f"Found predictions for {len(predictions_by_stop)} stops",
             predictions_by_stop=predictions_by_stop,
+            next_cursor=next_cursor,
             last_updated=datetime.utcnow()
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
@@ -9,12 +9,20 @@ import json
 from app.core.database import get_db
 from app.models.gtfs_static import GTFSRoute, GTFSShape, GTFSTrip
 from app.schemas.gtfs import GTFSRoute as GTFSRouteSchema, GTFSRouteResponse
+from app.cache import serialized_payloads, static_feed_versions
+from app.core.responses import FastJSONRoute, SerializedJSONResponse
+from app.realtime import snapshot_store
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
+
+def live_data_version():
+    """Routes served here depend on the static feed and on which routes have live vehicles."""
+    return (static_feed_versions.get("golden_gate"), snapshot_store.seq("golden_gate"))
 
 @router.get("/", response_model=GTFSRouteResponse)
 @router.get("", response_model=GTFSRouteResponse)
 async def get_routes(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     limit: int = Query(100, gt=0, le=1000),
     offset: int = Query(0, ge=0)
@@ -23,7 +31,7 @@ async def get_routes(
     Get GTFS bus routes that have active real-time vehicle data.
     Only returns routes with route_type = 3 (bus routes) and active vehicles.
     """
-    try:
+    async def build():
         # Get routes that have active vehicles with real-time data
         query = text("""
             SELECT DISTINCT r.*
@@ -53,7 +61,7 @@ async def get_routes(
                 "route_text_color": route.route_text_color,
                 "route_sort_order": getattr(route, 'route_sort_order', None)
             }
-            routes.append(GTFSRouteSchema.model_validate(route_dict))
+            routes.append(GTFSRouteSchema.model_validate(route_dict).model_dump())
 
         return {
             "routes": routes,
@@ -61,6 +69,10 @@ async def get_routes(
             "message": f"{len(routes)} bus routes with active real-time data"
         }
 
+    try:
+        payload = await serialized_payloads.get(("routes", limit, offset), live_data_version(), build)
+        return SerializedJSONResponse.negotiated(request, payload)
+
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -163,12 +175,12 @@ async def test_tables(db: AsyncSession = Depends(get_db)):
         return {"error": str(e), "type": type(e).__name__}
 
 @router.get("/with-shapes")
-async def get_routes_with_shapes(db: AsyncSession = Depends(get_db)):
+async def get_routes_with_shapes(request: Request, db: AsyncSession = Depends(get_db)):
     """
     Retrieve routes with their associated shapes and color information.
     Only returns routes that have active real-time vehicles.
     """
-    try:
+    async def build():
         # Get routes that have active vehicles and shapes
         query = text("""
             SELECT DISTINCT r.route_id, r.route_short_name, r.route_long_name, r.route_color
@@ -180,27 +192,27 @@ async def get_routes_with_shapes(db: AsyncSession = Depends(get_db)):
             AND lv.route_id IS NOT NULL 
             AND lv.route_id != ''
         """)
-        
+    
         result = await db.execute(query)
         active_routes = result.fetchall()
-        
+    
         route_data = []
         for route_row in active_routes:
             route_id = route_row.route_id
-            
+        
             # Get shape_ids for this route
             shapes_query = text("""
                 SELECT DISTINCT t.shape_id
                 FROM gtfs_trips t
                 WHERE t.route_id = :route_id AND t.shape_id IS NOT NULL
             """)
-            
+        
             shapes_result = await db.execute(shapes_query, {"route_id": route_id})
             shape_ids = [row.shape_id for row in shapes_result.fetchall()]
-            
+        
             if not shape_ids:
                 continue
-            
+        
             # Get all shape points for these shapes
             points_query = text("""
                 SELECT shape_id, shape_pt_lat, shape_pt_lon, shape_pt_sequence
@@ -208,23 +220,23 @@ async def get_routes_with_shapes(db: AsyncSession = Depends(get_db)):
                 WHERE shape_id = ANY(:shape_ids)
                 ORDER BY shape_id, shape_pt_sequence
             """)
-            
+        
             points_result = await db.execute(points_query, {"shape_ids": shape_ids})
             shapes = points_result.fetchall()
-            
+        
             # Group points by shape_id
             shape_groups = {}
             for shape in shapes:
                 if shape.shape_id not in shape_groups:
                     shape_groups[shape.shape_id] = []
                 shape_groups[shape.shape_id].append([shape.shape_pt_lat, shape.shape_pt_lon])
-            
+        
             # Convert shape groups to array of coordinates
             route_shapes = list(shape_groups.values())
-            
+        
             # Default color if not provided
             route_color = f"#{route_row.route_color}" if route_row.route_color else "#1a56db"
-            
+        
             route_data.append({
                 "route_id": route_id,
                 "route_short_name": route_row.route_short_name or "",
@@ -232,11 +244,16 @@ async def get_routes_with_shapes(db: AsyncSession = Depends(get_db)):
                 "route_color": route_color,
                 "shapes": route_shapes
             })
-        
+    
         return {
             "routes": route_data,
             "status": "success", 
             "message": f"{len(route_data)} routes with active vehicles and shape data"
         }
+
+    try:
+        # Multi-megabyte payload: built once per realtime update, then served as stored bytes
+        payload = await serialized_payloads.get(("routes_with_shapes",), live_data_version(), build)
+        return SerializedJSONResponse.negotiated(request, payload)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Query
+from app.core.responses import FastJSONRoute
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
 
 @router.get("/shapes")
 def get_shapes(route_id: str = Query(..., description="The route ID")):
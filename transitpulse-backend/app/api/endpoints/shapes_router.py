@@ -1,25 +1,57 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
 import logging
 
 from app.schemas.gtfs import GTFSShape
-from app.db.session import get_db
-from app.utils.gtfs_utils import get_all_gtfs_shapes  # ✅ THIS IS CRUCIAL
+from app.api.pagination import Page, PageRequest, next_cursor_headers
+from app.db.session import async_session, get_db
+from app.cache import PayloadContent, serialized_payloads, static_feed_versions
+from app.core.config import settings
+from app.core.responses import FastJSONRoute, NDJSONResponse, SerializedJSONResponse
+from app.utils.gtfs_utils import SHAPE_KEYS, get_all_gtfs_shapes, stream_gtfs_shapes  # ✅ THIS IS CRUCIAL
 
 logger = logging.getLogger(__name__)
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
 
 @router.get("/shapes", response_model=List[GTFSShape])
 async def get_shapes(
+    request: Request,
     shape_id: Optional[str] = Query(None, description="Optional shape_id to filter"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json, or ndjson to stream one point per line"),
+    page: PageRequest = Depends(Page(default=settings.PAGE_SIZE_MAX)),
     db: AsyncSession = Depends(get_db)
 ):
+    """
+    Shape points in shape_id and sequence order, one page at a time. The
+    cursor of the next page is returned in the X-Next-Cursor header. The
+    ndjson format streams every matching point and is not paginated.
+    """
     logger.info(f"🔍 GET /shapes called with shape_id={shape_id}")
-    try:
-        shapes = await get_all_gtfs_shapes(db=db, shape_id=shape_id)
+    if format == "ndjson":
+        return NDJSONResponse(stream_gtfs_shapes(async_session, shape_id))
+
+    async def build():
+        shapes = await get_all_gtfs_shapes(
+            db=db, shape_id=shape_id, limit=page.limit + 1, after=page.after(SHAPE_KEYS)
+        )
+        shapes, next_cursor = page.slice(
+            shapes, lambda shape: (shape.shape_id, shape.shape_pt_sequence, shape.id)
+        )
         logger.info(f"✅ Retrieved {len(shapes)} shapes")
-        return shapes
+        return PayloadContent(
+            [GTFSShape.model_validate(shape).model_dump() for shape in shapes],
+            next_cursor_headers(next_cursor)
+        )
+
+    try:
+        # Shape points only change with the static feed: encoded once per feed version
+        payload = await serialized_payloads.get(
+            ("shapes", shape_id, page.limit, page.cursor), static_feed_versions.get("golden_gate"), build
+        )
+        return SerializedJSONResponse.negotiated(request, payload)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"❌ Error in get_shapes: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {e}")
@@ -10,7 +10,9 @@ import asyncio
 from datetime import datetime
 import json
 
-router = APIRouter(prefix="/traffic", tags=["traffic"])
+from app.core.responses import FastJSONRoute
+
+router = APIRouter(prefix="/traffic", tags=["traffic"], route_class=FastJSONRoute)
 
 # Bay Area bounding box for traffic data
 BAY_AREA_BOUNDS = {
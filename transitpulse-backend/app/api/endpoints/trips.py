@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from typing import List, Dict, Optional
-from datetime import datetime, timedelta, time
+from datetime import datetime, timedelta
 import logging
 import sys
 import os
@@ -14,45 +14,38 @@ import pytz
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
 
 from app.db.session import get_db
-from data_ingestion.auto_gtfs_updater import AutoGTFSUpdater
+from app.api.fieldsets import Fieldset, pick
+from app.cache import static_trip_index, trip_updates_cache
+from app.realtime import snapshot_store
+from app.schemas.trip import TripBatchRequest
+from app.core.responses import FastJSONRoute
+from app.utils.gtfs_time import AGENCY_TZ, MAX_GTFS_TIME, format_gtfs_time, gtfs_time_to_datetime
 
-router = APIRouter(tags=["trips"])
+router = APIRouter(tags=["trips"], route_class=FastJSONRoute)
 logger = logging.getLogger(__name__)
 
-def compute_scheduled_datetime(gtfs_time: time, reference: datetime) -> datetime:
+def compute_scheduled_datetime(gtfs_time: int, reference: datetime) -> datetime:
     """
-    Adjusts GTFS stop_time (possibly >24:00:00) to correct datetime based on current time.
+    Datetime of a GTFS stop time, in the same (naive, agency-local) terms as ``reference``.
     
     Args:
-        gtfs_time: The scheduled time from GTFS (may be >24:00:00)
+        gtfs_time: Seconds of the service day (may be past 24:00:00)
         reference: Current datetime for context
         
     Returns:
-        Properly adjusted datetime for the scheduled time
+        The stop time on the service day that puts it nearest ``reference``:
+        yesterday's for an overnight trip still running, today's, or
+        tomorrow's when today's is long past
     """
-    if not gtfs_time:
+    if gtfs_time is None:
         return reference
 
-    # Handle GTFS time overflow past midnight (e.g., 25:15:00)
-    hour = gtfs_time.hour
-    minute = gtfs_time.minute
-    second = gtfs_time.second
-
-    if hour >= 24:
-        # Overflow to next day
-        adjusted_time = time(hour=hour - 24, minute=minute, second=second)
-        scheduled_date = reference.date() + timedelta(days=1)
-    else:
-        adjusted_time = gtfs_time
-        scheduled_date = reference.date()
-
-    scheduled_datetime = datetime.combine(scheduled_date, adjusted_time)
-
-    # If it's too far in the past, assume it's for the next service day
-    if scheduled_datetime < reference - timedelta(hours=6):
-        scheduled_datetime += timedelta(days=1)
-
-    return scheduled_datetime
+    candidates = [
+        gtfs_time_to_datetime(gtfs_time, reference.date() + timedelta(days=offset)).replace(tzinfo=None)
+        for offset in (-1, 0, 1)
+    ]
+    # Centered 6 hours ahead: a time up to 6 hours past stays on its day, as before
+    return min(candidates, key=lambda scheduled: abs(scheduled - reference - timedelta(hours=6)))
 
 def format_delay_display(delay_seconds: int) -> str:
     """Format delay in seconds to human-readable display string"""
@@ -68,13 +61,33 @@ async def get_trips_otp():
     # Placeholder for on-time performance data
     return {"message": "Trips OTP endpoint - Coming Soon!"}
 
+# Attributes of each stop in /trip-details
+TRIP_STOP_FIELDS = Fieldset(
+    [
+        "stop_sequence", "stop_id", "stop_name", "stop_lat", "stop_lon", "stop_code",
+        "scheduled_arrival", "scheduled_departure", "predicted_arrival", "predicted_departure",
+        "actual_arrival", "actual_departure", "arrival_delay", "departure_delay", "status",
+        "delay_status", "seconds_to_arrival", "minutes_to_arrival", "seconds_to_departure",
+        "minutes_to_departure", "time_since_arrival_seconds", "time_since_arrival_minutes",
+    ],
+    always=["stop_sequence", "stop_id"]
+)
+
+# Stop attributes read from gtfs_stops rather than gtfs_stop_times
+STOP_TABLE_FIELDS = {"stop_name", "stop_lat", "stop_lon", "stop_code"}
+
 @router.get("/trip-details/{trip_id}")
 async def get_trip_details_with_updates(
     trip_id: str,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    fields: Optional[List[str]] = Depends(TRIP_STOP_FIELDS)
 ):
     """
     Get trip details including scheduled stops and real-time updates.
+
+    ``fields`` limits each stop to the named attributes, e.g.
+    ``fields=stop_name,predicted_arrival,status``; the stops table is only
+    joined when one of its columns is requested.
     """
     try:
         # Get trip basic info and route
@@ -100,18 +113,21 @@ async def get_trip_details_with_updates(
             raise HTTPException(status_code=404, detail="Trip not found")
         
         # Get all stops for this trip with scheduled times
-        stops_query = text("""
+        if fields is None or STOP_TABLE_FIELDS.intersection(fields):
+            stop_columns = "s.stop_name, s.stop_lat, s.stop_lon, s.stop_code"
+            stop_join = "JOIN gtfs_stops s ON st.stop_id = s.stop_id"
+        else:
+            stop_columns = "NULL AS stop_name, NULL AS stop_lat, NULL AS stop_lon, NULL AS stop_code"
+            stop_join = ""
+        stops_query = text(f"""
             SELECT 
                 st.stop_sequence,
                 st.stop_id,
                 st.arrival_time,
                 st.departure_time,
-                s.stop_name,
-                s.stop_lat,
-                s.stop_lon,
-                s.stop_code
+                {stop_columns}
             FROM gtfs_stop_times st
-            JOIN gtfs_stops s ON st.stop_id = s.stop_id
+            {stop_join}
             WHERE st.trip_id = :trip_id
             ORDER BY st.stop_sequence
         """)
@@ -134,13 +150,11 @@ async def get_trip_details_with_updates(
         # Get real-time trip updates with timeout and fallback
         current_trip_updates = None
         try:
-            updater = AutoGTFSUpdater()
-            # Use asyncio.wait_for to add timeout to avoid hanging
-            import asyncio
-            trip_updates = await asyncio.wait_for(
-                updater.fetch_trip_updates("golden_gate"), 
-                timeout=5.0  # 5 second timeout
-            )
+            # Shared, TTL-cached feed: concurrent requests cause at most one upstream fetch
+            trip_updates = list((await asyncio.wait_for(
+                trip_updates_cache.get("golden_gate"),
+                timeout=5.0
+            )).values())
             
             # Find updates for this specific trip
             if trip_updates:
@@ -183,8 +197,8 @@ async def get_trip_details_with_updates(
                 "stop_lat": float(stop.stop_lat) if stop.stop_lat else None,
                 "stop_lon": float(stop.stop_lon) if stop.stop_lon else None,
                 "stop_code": stop.stop_code,
-                "scheduled_arrival": stop.arrival_time.strftime('%H:%M:%S') if stop.arrival_time else None,
-                "scheduled_departure": stop.departure_time.strftime('%H:%M:%S') if stop.departure_time else None,
+                "scheduled_arrival": format_gtfs_time(stop.arrival_time),
+                "scheduled_departure": format_gtfs_time(stop.departure_time),
                 "predicted_arrival": None,
                 "predicted_departure": None,
                 "actual_arrival": None,
@@ -268,7 +282,7 @@ async def get_trip_details_with_updates(
                         
                         break
             
-            stops_with_updates.append(stop_data)
+            stops_with_updates.append(pick(stop_data, fields))
         
         return {
             "trip_info": {
@@ -407,8 +421,8 @@ async def get_vehicle_trip_details(
                         "stop_code": stop.stop_code,
                         "stop_lat": float(stop.stop_lat) if stop.stop_lat else None,
                         "stop_lon": float(stop.stop_lon) if stop.stop_lon else None,
-                        "scheduled_arrival": stop.arrival_time.strftime('%H:%M:%S') if stop.arrival_time else None,
-                        "scheduled_departure": stop.departure_time.strftime('%H:%M:%S') if stop.departure_time else None,
+                        "scheduled_arrival": format_gtfs_time(stop.arrival_time),
+                        "scheduled_departure": format_gtfs_time(stop.departure_time),
                         "predicted_arrival": None,
                         "predicted_departure": None,
                         "actual_arrival": None,
@@ -439,12 +453,11 @@ async def get_vehicle_trip_details(
         current_trip_updates = None
         
         try:
-            updater = AutoGTFSUpdater()
-            import asyncio
-            trip_updates = await asyncio.wait_for(
-                updater.fetch_trip_updates("golden_gate"), 
+            # Shared, TTL-cached feed: concurrent requests cause at most one upstream fetch
+            trip_updates = list((await asyncio.wait_for(
+                trip_updates_cache.get("golden_gate"),
                 timeout=5.0
-            )
+            )).values())
             
             # Find updates for this specific trip
             if trip_updates:
@@ -693,12 +706,11 @@ async def get_trip_progress(
         # Get trip updates with historical data and timeout
         current_trip_updates = None
         try:
-            updater = AutoGTFSUpdater()
-            import asyncio
-            trip_updates = await asyncio.wait_for(
-                updater.fetch_trip_updates("golden_gate"), 
+            # Shared, TTL-cached feed: concurrent requests cause at most one upstream fetch
+            trip_updates = list((await asyncio.wait_for(
+                trip_updates_cache.get("golden_gate"),
                 timeout=5.0
-            )
+            )).values())
             
             if trip_updates:
                 for update in trip_updates:
@@ -733,8 +745,8 @@ async def get_trip_progress(
                     "lon": float(stop.stop_lon) if stop.stop_lon else None
                 },
                 "scheduled": {
-                    "arrival": stop.arrival_time.strftime('%H:%M:%S') if stop.arrival_time else None,
-                    "departure": stop.departure_time.strftime('%H:%M:%S') if stop.departure_time else None
+                    "arrival": format_gtfs_time(stop.arrival_time),
+                    "departure": format_gtfs_time(stop.departure_time)
                 },
                 "actual": {
                     "arrival": None,
@@ -886,41 +898,28 @@ async def get_trip_progress(
 def convert_gtfs_time_to_datetime(gtfs_time: int, reference_datetime: datetime) -> Optional[datetime]:
     """
     Converts GTFS-RT times to datetime:
-    - If value is > 86400: it's a Unix timestamp (handle timezone correctly)
-    - Else: it's seconds since midnight of service day
+    - If value is > MAX_GTFS_TIME: it's a Unix timestamp (handle timezone correctly)
+    - Else: it's seconds of the service day of ``reference_datetime``
     """
     try:
-        if gtfs_time > 86400:
+        if gtfs_time > MAX_GTFS_TIME:
             # Unix timestamp (seconds since epoch)
             # GTFS-RT timestamps are typically in UTC, convert to Pacific Time
-            import pytz
-            
             # Create UTC datetime and convert to Pacific time
             utc_datetime = datetime.utcfromtimestamp(gtfs_time)
             utc_datetime = pytz.utc.localize(utc_datetime)
             
             # Convert to Pacific time (handles PST/PDT automatically)
-            pacific_tz = pytz.timezone("America/Los_Angeles")
-            local_datetime = utc_datetime.astimezone(pacific_tz).replace(tzinfo=None)
+            local_datetime = utc_datetime.astimezone(AGENCY_TZ).replace(tzinfo=None)
                 
             return local_datetime
         else:
-            # Seconds since midnight of service day
-            hours = gtfs_time // 3600
-            minutes = (gtfs_time % 3600) // 60
-            seconds = gtfs_time % 60
-
-            base_date = reference_datetime.date()
-
-            if hours >= 24:
-                base_date += timedelta(days=1)
-                hours -= 24
-
-            return datetime.combine(base_date, time(hour=hours, minute=minutes, second=seconds))
+            # Seconds of the service day, counted from its noon minus 12h
+            return gtfs_time_to_datetime(gtfs_time, reference_datetime.date()).replace(tzinfo=None)
     except Exception as e:
         logger.warning(f"GTFS time conversion failed for {gtfs_time}: {e}")
         # Fallback: just use the timestamp as-is without timezone conversion
-        if gtfs_time > 86400:
+        if gtfs_time > MAX_GTFS_TIME:
             return datetime.fromtimestamp(gtfs_time)
         return None
 
@@ -1297,3 +1296,55 @@ async def get_vehicle_trip_summary(
     except Exception as e:
         logger.error(f"Error fetching vehicle trip summary: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/batch")
+async def get_trips_batch(request: TripBatchRequest):
+    """
+    Look up many trips in one request.
+
+    Accepts trip_ids and/or vehicle_ids (resolved to each vehicle's current
+    trip) and returns, per trip, the trip and route metadata, the ordered
+    stop times, the latest GTFS-RT trip update and the vehicle currently on
+    it. Everything is served from in-memory caches: the static trip index,
+    the TTL-cached trip updates feed and the realtime vehicle snapshot.
+    """
+    try:
+        snapshot = snapshot_store.get(request.agency)
+        vehicles = {
+            vehicle_id: snapshot.vehicles[vehicle_id]
+            for vehicle_id in request.vehicle_ids if vehicle_id in snapshot.vehicles
+        }
+        trip_ids = list(dict.fromkeys(
+            request.trip_ids + [v["trip_id"] for v in vehicles.values() if v.get("trip_id")]
+        ))
+
+        wanted = set(trip_ids)
+        vehicles_by_trip = {
+            v["trip_id"]: v for v in snapshot.vehicles.values() if v.get("trip_id") in wanted
+        }
+        static_trips = await static_trip_index.get(trip_ids)
+        trip_updates = await trip_updates_cache.get(request.agency) if request.include_realtime else {}
+
+        trips = {}
+        for trip_id, entry in static_trips.items():
+            trips[trip_id] = {
+                "trip_info": entry["trip_info"],
+                "stop_times": entry["stop_times"] if request.include_stop_times else None,
+                "trip_update": trip_updates.get(trip_id),
+                "vehicle": vehicles_by_trip.get(trip_id),
+            }
+
+        return {
+            "status": "success",
+            "message": f"Found {len(trips)} of {len(trip_ids)} requested trips",
+            "trips": trips,
+            "vehicles": vehicles,
+            "missing_trip_ids": [trip_id for trip_id in trip_ids if trip_id not in trips],
+            "missing_vehicle_ids": [v for v in request.vehicle_ids if v not in vehicles],
+            "seq": snapshot.seq,
+            "last_updated": datetime.now().isoformat()
+        }
+
+    except Exception as e:
+        logger.error(f"Error fetching trip batch: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,13 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text
 from app.crud import vehicle_crud
 from app.schemas.vehicle import LiveVehiclePosition
 from app.core.database import get_db
+from app.api.fieldsets import Fieldset, pick
+from app.realtime import realtime_payloads, snapshot_store
+from app.core.responses import FastJSONRoute, SerializedJSONResponse
 from typing import List, Optional
-from datetime import datetime
 
-router = APIRouter()
+router = APIRouter(route_class=FastJSONRoute)
+
+# Seconds between SSE heartbeat comments while nothing changes
+STREAM_HEARTBEAT_SECONDS = 15
+
+# Attributes of each /realtime vehicle
+VEHICLE_ATTRIBUTES = [
+    "vehicle_id", "route_id", "trip_id", "latitude", "longitude", "bearing", "speed",
+    "timestamp", "agency", "status", "direction_id", "direction_name", "headsign",
+]
+
+VEHICLE_FIELDS = Fieldset(VEHICLE_ATTRIBUTES, always=["vehicle_id"])
 
 @router.get("/live", response_model=List[LiveVehiclePosition])
 async def read_live_vehicles(db: AsyncSession = Depends(get_db)):
@@ -27,87 +40,77 @@ async def read_live_vehicles(db: AsyncSession = Depends(get_db)):
 
 @router.get("/realtime")
 async def get_realtime_vehicles(
-    db: AsyncSession = Depends(get_db),
     route_id: Optional[str] = Query(None, description="Filter by route ID"),
-    agency: Optional[str] = Query(None, description="Filter by agency")
+    agency: Optional[str] = Query(None, description="Filter by agency"),
+    since: Optional[int] = Query(None, ge=0, description="Only return changes since this snapshot sequence"),
+    fields: Optional[List[str]] = Depends(VEHICLE_FIELDS)
 ):
     """
     Get real-time vehicle positions with enhanced data including direction information.
     Only returns vehicles that have active route assignments.
+
+    Served from the in-memory snapshot, so ``data`` and ``seq`` (also sent as
+    the ``X-Snapshot-Seq`` header) always describe the same snapshot. The full
+    payload is serialized once per snapshot and shared with ``/stream``.
+    ``fields`` limits each vehicle to the named attributes; map views can ask
+    for ``vehicle_id,latitude,longitude,bearing``.
+
+    Passing ``seq`` back as ``since`` returns only the vehicles added or
+    changed since then plus the ids of removed ones; ``full`` is true when the
+    client was too far behind and ``data`` holds every vehicle instead.
     """
+    agency_key = agency or "golden_gate"
     try:
-        # Base query for vehicle positions with route information - only vehicles with route assignments
-        # and that are currently active (within last 15 minutes)
-        query = text("""
-            SELECT DISTINCT
-                lv.vehicle_id,
-                lv.route_id,
-                lv.trip_id,
-                lv.latitude,
-                lv.longitude,
-                lv.bearing,
-                lv.speed,
-                lv.timestamp,
-                lv.current_status,
-                lv.occupancy_status,
-                'GG' as agency,
-                CASE 
-                    WHEN t.direction_id = 0 THEN 'Outbound'
-                    WHEN t.direction_id = 1 THEN 'Inbound'
-                    ELSE NULL
-                END as direction_name,
-                t.direction_id,
-                t.trip_headsign as headsign
-            FROM live_vehicle_positions lv
-            LEFT JOIN gtfs_trips t ON lv.trip_id = t.trip_id
-            WHERE lv.latitude IS NOT NULL 
-            AND lv.longitude IS NOT NULL
-            AND lv.route_id IS NOT NULL 
-            AND lv.route_id != ''
-            AND lv.timestamp > NOW() - INTERVAL '15 minutes'
-        """)
-        
-        # Add route filter if specified
-        if route_id:
-            query = text(str(query) + " AND lv.route_id = :route_id")
-        
-        query = text(str(query) + " ORDER BY lv.timestamp DESC")
-        
-        # Execute query
-        if route_id:
-            result = await db.execute(query, {"route_id": route_id})
+        if since is not None:
+            payload = await realtime_payloads.changes(agency_key, since, route_id)
+        elif fields is None:
+            seq, body = await realtime_payloads.serialized(agency_key, route_id)
+            return SerializedJSONResponse(body.encode(), headers={"X-Snapshot-Seq": str(seq)})
         else:
-            result = await db.execute(query)
-        
-        vehicles = result.fetchall()
-        
-        # Format response
-        vehicle_data = []
-        for vehicle in vehicles:
-            vehicle_dict = {
-                "vehicle_id": vehicle.vehicle_id,
-                "route_id": vehicle.route_id,
-                "trip_id": vehicle.trip_id,
-                "latitude": float(vehicle.latitude) if vehicle.latitude else None,
-                "longitude": float(vehicle.longitude) if vehicle.longitude else None,
-                "bearing": vehicle.bearing,
-                "speed": vehicle.speed,
-                "timestamp": vehicle.timestamp.isoformat() if vehicle.timestamp else None,
-                "agency": vehicle.agency,
-                "status": vehicle.current_status,
-                "direction_id": vehicle.direction_id,
-                "direction_name": vehicle.direction_name,
-                "headsign": vehicle.headsign
-            }
-            vehicle_data.append(vehicle_dict)
-        
-        return {
-            "status": "success",
-            "message": f"Found {len(vehicle_data)} active vehicles with route assignments",
-            "data": vehicle_data,
-            "last_updated": datetime.now().isoformat(),
-            "agency": agency or "golden_gate"
-        }
-        
+            payload = await realtime_payloads.payload(agency_key, route_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+    if fields is not None:
+        payload["data"] = [pick(vehicle, fields) for vehicle in payload["data"]]
+    return SerializedJSONResponse(payload, headers={"X-Snapshot-Seq": str(payload["seq"])})
+
+@router.get("/stream")
+async def stream_realtime_vehicles(
+    request: Request,
+    route_id: Optional[str] = Query(None, description="Filter by route ID"),
+    agency: str = Query("golden_gate", description="Transit agency")
+):
+    """
+    Server-Sent Events stream of real-time vehicle positions.
+
+    Pushes the ``/vehicles/realtime`` payload from the in-memory snapshot each
+    time it changes, as ``vehicles`` events whose id is the snapshot sequence
+    number. A reconnecting client sends that id back as ``Last-Event-ID`` and
+    only gets a new event once the snapshot has moved past it. A heartbeat
+    comment keeps idle connections open through proxies.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    try:
+        last_seq = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_seq = None
+
+    async def events():
+        seq = last_seq
+        yield "retry: 5000\n\n"
+        while not await request.is_disconnected():
+            current = snapshot_store.seq(agency)
+            if current == seq:
+                changed = await snapshot_store.wait_for_change(agency, seq, timeout=STREAM_HEARTBEAT_SECONDS)
+                if not changed:
+                    yield ": heartbeat\n\n"
+                continue
+            seq, payload = await realtime_payloads.serialized(agency, route_id)
+            yield f"id: {seq}\nevent: vehicles\ndata: {payload}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
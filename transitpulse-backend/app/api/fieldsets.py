@@ -0,0 +1,54 @@
+"""
+Sparse fieldsets for list and detail endpoints
+
+``?fields=stop_id,stop_lat,stop_lon`` limits a response to the named
+attributes. Endpoints declare the attributes they can return with a
+``Fieldset`` dependency and use the parsed list to select only those
+columns in SQL and to serialize only those keys. Without ``fields`` the
+full record is returned as before.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from fastapi import HTTPException, Query
+
+
+class Fieldset:
+    """Dependency parsing ``fields=`` against the attributes an endpoint offers."""
+
+    def __init__(self, allowed: Sequence[str], always: Sequence[str] = ()):
+        self.allowed = list(allowed)
+        # Identifiers returned even when not requested, so records stay addressable
+        self.always = list(always)
+
+    def __call__(
+        self,
+        fields: Optional[str] = Query(None, description="Comma-separated attributes to return (default: all)")
+    ) -> Optional[List[str]]:
+        if not fields:
+            return None
+        requested = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in requested if name not in self.allowed]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "status": "error",
+                    "message": f"Unknown fields: {', '.join(unknown)}",
+                    "allowed": self.allowed,
+                }
+            )
+        # Request order, identifiers first, no duplicates
+        return list(dict.fromkeys([*self.always, *requested]))
+
+
+def model_columns(model: Any, fields: Iterable[str]) -> List[Any]:
+    """The mapped columns of ``model`` for the selected attribute names."""
+    return [getattr(model, name) for name in fields]
+
+
+def pick(record: Dict[str, Any], fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+    """``record`` limited to ``fields`` (unchanged when no fields were requested)."""
+    if fields is None:
+        return record
+    return {name: record.get(name) for name in fields}
@@ -0,0 +1,105 @@
+"""
+Keyset pagination for list endpoints
+
+List endpoints return one page at a time in a fixed order of sort keys.
+Instead of OFFSET, which makes the database read and discard every earlier
+row, the next page starts after the sort key values of the last row sent
+(``WHERE (a, b) > (:a, :b)``), so a deep page costs the same as the first.
+Those values travel as an opaque ``cursor``: each page returns the cursor
+of the next one in the ``X-Next-Cursor`` header (and as ``next_cursor`` in
+enveloped responses), or none on the last page. Page sizes are capped at
+``PAGE_SIZE_MAX``.
+"""
+
+import base64
+import datetime
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Query
+from sqlalchemy import tuple_
+
+from app.core.config import settings
+from app.core.responses import dumps
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    return base64.urlsafe_b64encode(dumps(list(values))).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str, keys: Sequence[Any]) -> List[Any]:
+    """The sort key values in ``cursor``, converted to the types of ``keys``."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError("wrong number of values")
+        return [_coerce(key, value) for key, value in zip(keys, values)]
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=400,
+            detail={"status": "error", "message": "Invalid cursor"}
+        )
+
+
+def _coerce(key: Any, value: Any) -> Any:
+    # JSON has no datetimes or UUIDs; the column type says what the value was
+    if value is None:
+        return None
+    try:
+        python_type = key.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime.datetime:
+        return datetime.datetime.fromisoformat(value)
+    return python_type(value)
+
+
+@dataclass
+class PageRequest:
+    """Page size and position parsed by ``Page``."""
+    limit: int
+    cursor: Optional[str] = None
+
+    def after(self, keys: Sequence[Any]) -> Optional[List[Any]]:
+        """Sort key values the page starts after, or None for the first page."""
+        return decode_cursor(self.cursor, keys) if self.cursor else None
+
+    def apply(self, query: Any, keys: Sequence[Any]) -> Any:
+        """``query`` ordered by ``keys`` from the cursor on, with one row more than the page holds."""
+        after = self.after(keys)
+        if after is not None:
+            query = query.where(tuple_(*keys) > tuple_(*after))
+        return query.order_by(*keys).limit(self.limit + 1)
+
+    def slice(self, rows: Sequence[Any], key: Callable[[Any], Sequence[Any]]) -> Tuple[List[Any], Optional[str]]:
+        """The rows of this page and the cursor of the next one.
+
+        ``rows`` is the result of a query for ``limit + 1`` rows; ``key``
+        returns the sort key values of a row, in the order of the keys.
+        """
+        rows = list(rows)
+        if len(rows) <= self.limit:
+            return rows, None
+        rows = rows[:self.limit]
+        return rows, encode_cursor(key(rows[-1]))
+
+
+class Page:
+    """Dependency parsing ``limit`` and ``cursor``."""
+
+    def __init__(self, default: int = 100):
+        self.default = min(default, settings.PAGE_SIZE_MAX)
+
+    def __call__(
+        self,
+        limit: Optional[int] = Query(None, gt=0, description=f"Page size (at most {settings.PAGE_SIZE_MAX})"),
+        cursor: Optional[str] = Query(None, description="Cursor of the page to fetch, from X-Next-Cursor")
+    ) -> PageRequest:
+        return PageRequest(min(limit or self.default, settings.PAGE_SIZE_MAX), cursor)
+
+
+def next_cursor_headers(cursor: Optional[str]) -> Dict[str, str]:
+    return {NEXT_CURSOR_HEADER: cursor} if cursor else {}
@@ -0,0 +1,25 @@
+# In-memory caches over static GTFS data and upstream realtime feeds
+from .versions import FeedVersions, StaticFeedCache, static_feed_versions
+from .trips import StaticTripIndex, TripUpdatesCache, static_trip_index, trip_updates_cache
+from .payloads import PayloadContent, SerializedPayloadCache, serialized_payloads
+from .calendar import ServiceCalendar, ServiceCalendarCache, service_calendars
+from .timetables import RouteTimetableCache, Timetable, route_timetables
+
+__all__ = [
+    'FeedVersions',
+    'StaticFeedCache',
+    'static_feed_versions',
+    'StaticTripIndex',
+    'TripUpdatesCache',
+    'static_trip_index',
+    'trip_updates_cache',
+    'PayloadContent',
+    'SerializedPayloadCache',
+    'serialized_payloads',
+    'ServiceCalendar',
+    'ServiceCalendarCache',
+    'service_calendars',
+    'RouteTimetableCache',
+    'Timetable',
+    'route_timetables',
+]
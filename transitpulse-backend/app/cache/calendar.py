@@ -0,0 +1,141 @@
+"""
+Service calendar
+
+Which services run on a date is resolved once per static feed rather than
+per request: calendar.txt and calendar_dates.txt are expanded into a dense
+date × service_id bitmap covering the feed's validity window, with the
+exceptions already applied. ``services_on(date)`` and ``runs(service_id,
+date)`` are then plain index lookups, shared by the schedule, active trip
+and prediction code. The bitmap is rebuilt when a new static feed version
+is loaded.
+"""
+
+import datetime
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from app.cache.versions import StaticFeedCache
+from app.core.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+# calendar_dates.txt exception types
+SERVICE_ADDED = 1
+SERVICE_REMOVED = 2
+
+
+class ServiceCalendar:
+    """Dense date × service_id bitmap of the services that run on each day."""
+
+    def __init__(self, start: Optional[datetime.date], service_ids: Sequence[str], bitmap: np.ndarray):
+        self.start = start
+        self.service_ids = list(service_ids)
+        self.index: Dict[str, int] = {service_id: i for i, service_id in enumerate(self.service_ids)}
+        self.bitmap = bitmap
+        # Services of each day, in service_id order, so services_on() does not scan the bitmap
+        ids = np.array(self.service_ids, dtype=object)
+        self._services_by_day: List[Tuple[str, ...]] = [tuple(ids[row]) for row in bitmap]
+
+    @property
+    def end(self) -> Optional[datetime.date]:
+        """Last day of the window, or None for an empty calendar."""
+        if self.start is None:
+            return None
+        return self.start + datetime.timedelta(days=len(self.bitmap) - 1)
+
+    @classmethod
+    def build(cls, calendars: Iterable, exceptions: Iterable) -> "ServiceCalendar":
+        """Expand calendar rows (weekday flags, start/end dates) and calendar_dates rows."""
+        calendars = [row for row in calendars if row.start_date and row.end_date]
+        exceptions = [row for row in exceptions if row.date]
+        service_ids = sorted({row.service_id for row in calendars} | {row.service_id for row in exceptions})
+
+        dates = [d for row in calendars for d in (row.start_date, row.end_date)] + [row.date for row in exceptions]
+        if not dates:
+            return cls(None, service_ids, np.zeros((0, len(service_ids)), dtype=bool))
+        start, end = min(dates), max(dates)
+
+        index = {service_id: i for i, service_id in enumerate(service_ids)}
+        bitmap = np.zeros(((end - start).days + 1, len(service_ids)), dtype=bool)
+        # Weekday (0 = Monday) of every day in the window
+        weekdays = (np.arange(len(bitmap)) + start.weekday()) % 7
+
+        for row in calendars:
+            runs_on = np.array([bool(getattr(row, day)) for day in WEEKDAYS])
+            first, last = (row.start_date - start).days, (row.end_date - start).days + 1
+            bitmap[first:last, index[row.service_id]] = runs_on[weekdays[first:last]]
+
+        for row in exceptions:
+            if row.exception_type in (SERVICE_ADDED, SERVICE_REMOVED):
+                bitmap[(row.date - start).days, index[row.service_id]] = row.exception_type == SERVICE_ADDED
+
+        return cls(start, service_ids, bitmap)
+
+    def _day(self, day: datetime.date) -> Optional[int]:
+        if self.start is None:
+            return None
+        offset = (day - self.start).days
+        return offset if 0 <= offset < len(self.bitmap) else None
+
+    def services_on(self, day: datetime.date) -> Tuple[str, ...]:
+        """service_ids that run on ``day`` (none outside the feed's validity window)."""
+        offset = self._day(day)
+        return self._services_by_day[offset] if offset is not None else ()
+
+    def runs(self, service_id: str, day: datetime.date) -> bool:
+        offset = self._day(day)
+        column = self.index.get(service_id)
+        return offset is not None and column is not None and bool(self.bitmap[offset, column])
+
+    def service_day(self, service_id: str, moment: datetime.datetime) -> Optional[datetime.date]:
+        """The service day a trip of ``service_id`` running at ``moment`` belongs to.
+
+        That is the calendar day of ``moment`` when the service runs on it,
+        otherwise the day before when the service ran then (a trip continuing
+        past midnight), otherwise None.
+        """
+        today = moment.date()
+        if self.runs(service_id, today):
+            return today
+        yesterday = today - datetime.timedelta(days=1)
+        if self.runs(service_id, yesterday):
+            return yesterday
+        return None
+
+
+class ServiceCalendarCache(StaticFeedCache[ServiceCalendar]):
+    """The service calendar of the loaded static feed, built on first use and after each feed load."""
+
+    CALENDAR_QUERY = text(f"""
+        SELECT service_id, {', '.join(WEEKDAYS)}, start_date, end_date
+        FROM gtfs_calendar
+    """)
+
+    EXCEPTIONS_QUERY = text("""
+        SELECT service_id, date, exception_type
+        FROM gtfs_calendar_dates
+    """)
+
+    def __init__(self, session_factory=SessionLocal):
+        super().__init__()
+        self.session_factory = session_factory
+
+    async def _load(self) -> ServiceCalendar:
+        async with self.session_factory() as db:
+            calendars = (await db.execute(self.CALENDAR_QUERY)).fetchall()
+            exceptions = (await db.execute(self.EXCEPTIONS_QUERY)).fetchall()
+        calendar = ServiceCalendar.build(calendars, exceptions)
+        logger.info(
+            f"Service calendar built: {len(calendar.service_ids)} services, "
+            f"{calendar.start} to {calendar.end}"
+        )
+        return calendar
+
+
+# Process-wide service calendar
+service_calendars = ServiceCalendarCache()
@@ -0,0 +1,88 @@
+"""
+Pre-serialized response payloads
+
+Hot read-only responses (route lists, shapes) only change when a new static
+feed is loaded or the realtime snapshot moves on. They are kept here as the
+JSON bytes sent to clients, tagged with the version they were built from, so
+repeated requests skip both the database and the encoder. Each entry is
+also compressed once when it is built, so compressed responses cost no CPU
+per request. A request with a different version rebuilds the entry;
+concurrent requests for the same entry share one build.
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+from app.cache.versions import static_feed_versions
+from app.core.compression import precompress
+from app.core.config import settings
+from app.core.responses import dumps
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SerializedPayload:
+    """JSON bytes of a response and their precompressed encodings."""
+    body: bytes
+    # content-coding ("gzip", "br") -> compressed body
+    encoded: Dict[str, bytes] = field(default_factory=dict)
+    # Response headers that belong with the body, such as a pagination cursor
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class PayloadContent:
+    """What ``build()`` returns when response headers are to be stored with the content."""
+    content: Any
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+class SerializedPayloadCache:
+    """key -> (version, payload), least recently used first out."""
+
+    def __init__(self, max_entries: int = 256, minimum_size: int = 1024):
+        self.max_entries = max_entries
+        # Payloads smaller than this are not worth compressing
+        self.minimum_size = minimum_size
+        self._entries: "OrderedDict[Hashable, Tuple[Hashable, SerializedPayload]]" = OrderedDict()
+        self._building: Dict[Tuple[Hashable, Hashable], asyncio.Task] = {}
+        static_feed_versions.on_change(lambda agency_key, version: self.clear())
+
+    async def get(self, key: Hashable, version: Hashable, build: Callable[[], Awaitable[Any]]) -> SerializedPayload:
+        """The serialized payload for ``key`` at ``version``, building it with ``build()`` if needed."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        task = self._building.get((key, version))
+        if task is None:
+            task = self._building[(key, version)] = asyncio.create_task(self._build(key, version, build))
+            task.add_done_callback(lambda _: self._building.pop((key, version), None))
+        return await asyncio.shield(task)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def _build(self, key: Hashable, version: Hashable, build: Callable[[], Awaitable[Any]]) -> SerializedPayload:
+        content = await build()
+        headers: Dict[str, str] = {}
+        if isinstance(content, PayloadContent):
+            content, headers = content.content, content.headers
+        body = dumps(content)
+        # Compressing a multi-megabyte payload takes a while; keep it off the event loop
+        encoded = await asyncio.to_thread(precompress, body, self.minimum_size)
+        payload = SerializedPayload(body, encoded, headers)
+        self._entries[key] = (version, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return payload
+
+
+# Process-wide serialized payloads
+serialized_payloads = SerializedPayloadCache(minimum_size=settings.COMPRESSION_MINIMUM_SIZE)
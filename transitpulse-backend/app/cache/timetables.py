@@ -0,0 +1,504 @@
+"""
+Route timetables
+
+Each (route, direction, service_id) of the loaded static feed is kept as a
+timetable matrix: the ordered stop pattern the route serves, and trips ×
+stops integer arrays of arrival and departure times (seconds of the
+service day, ``NO_TIME`` where a trip skips a stop). Trips are ordered by
+first departure. Schedules are then slices of these matrices rather than
+joins over gtfs_stop_times.
+
+The ingestion leader builds all timetables right after loading a new
+static feed version, in a worker process that streams the stop times and
+builds each timetable as soon as its rows are read. The result is stored in
+static_feed_artifacts as plain arrays (``np.savez``) and JSON metadata,
+tagged with the feed versions it was built from. Every worker then loads
+that artifact instead of building the timetables itself; a worker builds
+them, in a worker process as well, only when no artifact matches the loaded
+feed versions.
+"""
+
+import asyncio
+import heapq
+import io
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import asyncpg
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+from app.cache.versions import StaticFeedCache
+from app.core.database import IngestSessionLocal, SessionLocal, get_asyncpg_dsn
+from app.models.gtfs_static import StaticFeedArtifact
+from app.utils.gtfs_time import NO_TIME, format_gtfs_times
+
+logger = logging.getLogger(__name__)
+
+# Missing stop_sequence / pickup_type / drop_off_type in the integer matrices
+NO_VALUE = -1
+
+
+class StopTimeRow(NamedTuple):
+    """The columns of a stop time a timetable is built from."""
+    stop_id: str
+    stop_name: Optional[str]
+    stop_sequence: Optional[int]
+    arrival_time: Optional[int]
+    departure_time: Optional[int]
+    stop_headsign: Optional[str]
+    pickup_type: Optional[int]
+    drop_off_type: Optional[int]
+
+
+# One row per stop time, and one per trip without stop times, grouped by timetable
+STOP_TIMES_QUERY = """
+    SELECT t.route_id, t.direction_id, t.service_id, t.trip_id, t.trip_headsign,
+           st.stop_id, st.stop_sequence, st.arrival_time, st.departure_time,
+           st.stop_headsign, st.pickup_type, st.drop_off_type, s.stop_name
+    FROM gtfs_trips t
+    LEFT JOIN gtfs_stop_times st ON st.trip_id = t.trip_id
+    LEFT JOIN gtfs_stops s ON s.stop_id = st.stop_id
+    ORDER BY t.route_id, t.direction_id, t.service_id, t.trip_id, st.stop_sequence
+"""
+
+# Matrices of the stored artifact: every timetable's, raveled and concatenated
+ARTIFACT_ARRAYS = {
+    "arrivals": np.int32,
+    "departures": np.int32,
+    "stop_sequences": np.int32,
+    "pickup_types": np.int8,
+    "drop_off_types": np.int8,
+}
+
+
+@dataclass
+class Timetable:
+    """Trips of one route, direction and service as trips × stops matrices."""
+    route_id: str
+    direction_id: Optional[int]
+    service_id: str
+    # Stop pattern in travel order (a stop visited twice has two columns)
+    stop_ids: List[str]
+    stop_names: List[Optional[str]]
+    # Trips in first-departure order
+    trip_ids: List[str]
+    headsigns: List[Optional[str]]
+    # int32 (trips, stops); NO_TIME / NO_VALUE where the trip does not serve the stop
+    arrivals: np.ndarray
+    departures: np.ndarray
+    stop_sequences: np.ndarray
+    pickup_types: np.ndarray
+    drop_off_types: np.ndarray
+    # object (trips, stops), or None when no stop time has a headsign
+    stop_headsigns: Optional[np.ndarray] = None
+
+    @property
+    def first_departures(self) -> np.ndarray:
+        """Departure of each trip from its first stop (NO_TIME for trips without stop times)."""
+        served = self.stop_sequences != NO_VALUE
+        if not served.shape[1]:
+            return np.full(len(self.trip_ids), NO_TIME, dtype=np.int32)
+        first = served.argmax(axis=1)
+        rows = np.arange(len(self.trip_ids))
+        times = np.where(self.departures[rows, first] != NO_TIME,
+                         self.departures[rows, first], self.arrivals[rows, first])
+        return np.where(served.any(axis=1), times, NO_TIME)
+
+    def trips(self) -> List[Dict[str, Any]]:
+        """Each trip with its stops, in the shape of the schedule endpoint."""
+        arrivals = np.array(format_gtfs_times(self.arrivals.ravel()), dtype=object).reshape(self.arrivals.shape)
+        departures = np.array(format_gtfs_times(self.departures.ravel()), dtype=object).reshape(self.departures.shape)
+
+        trips = []
+        for row, trip_id in enumerate(self.trip_ids):
+            stops = []
+            for column in np.flatnonzero(self.stop_sequences[row] != NO_VALUE):
+                pickup_type = int(self.pickup_types[row, column])
+                drop_off_type = int(self.drop_off_types[row, column])
+                stops.append({
+                    "stop_id": self.stop_ids[column],
+                    "stop_name": self.stop_names[column] or "Unknown Stop",
+                    "stop_sequence": int(self.stop_sequences[row, column]),
+                    "arrival_time": arrivals[row, column],
+                    "departure_time": departures[row, column],
+                    "stop_headsign": self.stop_headsigns[row, column] if self.stop_headsigns is not None else None,
+                    "pickup_type": pickup_type if pickup_type != NO_VALUE else None,
+                    "drop_off_type": drop_off_type if drop_off_type != NO_VALUE else None,
+                    # For future real-time comparison
+                    "actual_arrival": None,
+                    "actual_departure": None,
+                    "delay": None,
+                    "status": "scheduled"
+                })
+            trips.append({
+                "trip_id": trip_id,
+                "route_id": self.route_id,
+                "direction_id": self.direction_id,
+                "headsign": self.headsigns[row],
+                "service_id": self.service_id,
+                "stops": stops
+            })
+        return trips
+
+    @classmethod
+    def build(cls, route_id: str, direction_id: Optional[int], service_id: str,
+              trips: Sequence[Tuple[str, Optional[str], Sequence[Any]]]) -> "Timetable":
+        """Timetable of ``(trip_id, headsign, stop time rows in sequence order)`` tuples."""
+        # Distinct stop patterns, and the columns of each in the merged pattern
+        patterns: Dict[Tuple[str, ...], Sequence[Any]] = {}
+        for _, _, stop_times in trips:
+            patterns.setdefault(tuple(row.stop_id for row in stop_times), stop_times)
+        stop_ids, stop_names, columns = _merge_patterns(list(patterns.values()))
+        pattern_columns = dict(zip(patterns, columns))
+
+        shape = (len(trips), len(stop_ids))
+        arrivals = np.full(shape, NO_TIME, dtype=np.int32)
+        departures = np.full(shape, NO_TIME, dtype=np.int32)
+        stop_sequences = np.full(shape, NO_VALUE, dtype=np.int32)
+        pickup_types = np.full(shape, NO_VALUE, dtype=np.int8)
+        drop_off_types = np.full(shape, NO_VALUE, dtype=np.int8)
+        stop_headsigns = np.full(shape, None, dtype=object)
+
+        for row, (_, _, stop_times) in enumerate(trips):
+            columns = pattern_columns[tuple(st.stop_id for st in stop_times)]
+            if not columns:
+                continue
+            arrivals[row, columns] = [_int(st.arrival_time, NO_TIME) for st in stop_times]
+            departures[row, columns] = [_int(st.departure_time, NO_TIME) for st in stop_times]
+            stop_sequences[row, columns] = [_int(st.stop_sequence, NO_VALUE) for st in stop_times]
+            pickup_types[row, columns] = [_int(st.pickup_type, NO_VALUE) for st in stop_times]
+            drop_off_types[row, columns] = [_int(st.drop_off_type, NO_VALUE) for st in stop_times]
+            stop_headsigns[row, columns] = [st.stop_headsign for st in stop_times]
+
+        timetable = cls(
+            route_id=route_id,
+            direction_id=direction_id,
+            service_id=service_id,
+            stop_ids=stop_ids,
+            stop_names=stop_names,
+            trip_ids=[trip_id for trip_id, _, _ in trips],
+            headsigns=[headsign for _, headsign, _ in trips],
+            arrivals=arrivals,
+            departures=departures,
+            stop_sequences=stop_sequences,
+            pickup_types=pickup_types,
+            drop_off_types=drop_off_types,
+            stop_headsigns=stop_headsigns if any(stop_headsigns.ravel()) else None,
+        )
+        return timetable.in_departure_order()
+
+    def in_departure_order(self) -> "Timetable":
+        """The timetable with its trips in first-departure order; trips without times last."""
+        first = self.first_departures.tolist()
+        order = sorted(range(len(self.trip_ids)), key=lambda i: (first[i] == NO_TIME, first[i], self.trip_ids[i]))
+        return Timetable(
+            route_id=self.route_id,
+            direction_id=self.direction_id,
+            service_id=self.service_id,
+            stop_ids=self.stop_ids,
+            stop_names=self.stop_names,
+            trip_ids=[self.trip_ids[i] for i in order],
+            headsigns=[self.headsigns[i] for i in order],
+            arrivals=self.arrivals[order],
+            departures=self.departures[order],
+            stop_sequences=self.stop_sequences[order],
+            pickup_types=self.pickup_types[order],
+            drop_off_types=self.drop_off_types[order],
+            stop_headsigns=self.stop_headsigns[order] if self.stop_headsigns is not None else None,
+        )
+
+
+def schedule_trips(timetables: Iterable[Timetable]) -> List[Dict[str, Any]]:
+    """Trips of several timetables with their stops, together in first-departure order."""
+    keyed = []
+    for timetable in timetables:
+        first = timetable.first_departures.tolist()
+        for trip, departure in zip(timetable.trips(), first):
+            keyed.append(((departure == NO_TIME, departure, trip["trip_id"]), trip))
+    keyed.sort(key=lambda item: item[0])
+    return [trip for _, trip in keyed]
+
+
+def _int(value: Any, missing: int) -> int:
+    return missing if value is None else int(value)
+
+
+def _merge_patterns(patterns: Sequence[Sequence[Any]]) -> Tuple[List[str], List[Optional[str]], List[List[int]]]:
+    """Merge stop patterns into one column order that keeps the order of each.
+
+    The k-th visit of a stop in a pattern is one node; consecutive stops of a
+    pattern are edges, and the columns are a topological order of the nodes,
+    earliest seen first among those ready. Patterns that disagree on the
+    order of two stops form a cycle, which is broken by giving the stop a
+    second column for the patterns that reach it later. Returns the stop ids
+    and names of the columns and the columns of each pattern.
+    """
+    node_ids: Dict[Tuple[str, int], int] = {}
+    # First stop time seen for each node, for its stop id and name
+    nodes: List[Any] = []
+    # Node of each stop of each pattern
+    positions: List[List[int]] = []
+    for stop_times in patterns:
+        visits: Dict[str, int] = {}
+        pattern_nodes = []
+        for stop_time in stop_times:
+            visit = visits.get(stop_time.stop_id, 0)
+            visits[stop_time.stop_id] = visit + 1
+            node = node_ids.setdefault((stop_time.stop_id, visit), len(nodes))
+            if node == len(nodes):
+                nodes.append(stop_time)
+            pattern_nodes.append(node)
+        positions.append(pattern_nodes)
+
+    order: List[int] = []
+    emitted = set()
+    while len(emitted) < len(nodes):
+        # Edges between the nodes not placed yet
+        successors: Dict[int, List[int]] = {}
+        indegree: Dict[int, int] = {node: 0 for node in range(len(nodes)) if node not in emitted}
+        edges = set()
+        for pattern_nodes in positions:
+            for before, after in zip(pattern_nodes, pattern_nodes[1:]):
+                if before not in emitted and (before, after) not in edges:
+                    edges.add((before, after))
+                    successors.setdefault(before, []).append(after)
+                    indegree[after] += 1
+
+        ready = [node for node, count in indegree.items() if count == 0]
+        heapq.heapify(ready)
+        while ready:
+            node = heapq.heappop(ready)
+            order.append(node)
+            emitted.add(node)
+            for after in successors.get(node, ()):
+                indegree[after] -= 1
+                if indegree[after] == 0:
+                    heapq.heappush(ready, after)
+        if len(emitted) == len(nodes):
+            break
+
+        # A cycle: place the earliest node some pattern reaches next, and give
+        # the patterns that reach it from an unplaced stop a copy of it instead
+        frontier = []
+        for pattern_nodes in positions:
+            for node in pattern_nodes:
+                if node not in emitted:
+                    frontier.append(node)
+                    break
+        node = min(frontier)
+        copy = len(nodes)
+        nodes.append(nodes[node])
+        for pattern_nodes in positions:
+            for i in range(1, len(pattern_nodes)):
+                if pattern_nodes[i] == node and pattern_nodes[i - 1] not in emitted:
+                    pattern_nodes[i] = copy
+        order.append(node)
+        emitted.add(node)
+
+    column_of = {node: column for column, node in enumerate(order)}
+    return (
+        [nodes[node].stop_id for node in order],
+        [nodes[node].stop_name for node in order],
+        [[column_of[node] for node in pattern_nodes] for pattern_nodes in positions],
+    )
+
+
+def encode_timetables(by_route: Dict[str, List[Timetable]]) -> bytes:
+    """The timetables as an ``np.savez`` archive of plain arrays, with their other fields as JSON."""
+    metadata = []
+    parts: Dict[str, List[np.ndarray]] = {name: [] for name in ARTIFACT_ARRAYS}
+    for timetables in by_route.values():
+        for timetable in timetables:
+            metadata.append({
+                "route_id": timetable.route_id,
+                "direction_id": timetable.direction_id,
+                "service_id": timetable.service_id,
+                "stop_ids": timetable.stop_ids,
+                "stop_names": timetable.stop_names,
+                "trip_ids": timetable.trip_ids,
+                "headsigns": timetable.headsigns,
+                "stop_headsigns": timetable.stop_headsigns.tolist() if timetable.stop_headsigns is not None else None,
+            })
+            for name in ARTIFACT_ARRAYS:
+                parts[name].append(getattr(timetable, name).ravel())
+
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        metadata=np.frombuffer(json.dumps(metadata).encode("utf-8"), dtype=np.uint8),
+        **{name: np.concatenate(parts[name]) if parts[name] else np.empty(0, dtype=dtype)
+           for name, dtype in ARTIFACT_ARRAYS.items()}
+    )
+    return buffer.getvalue()
+
+
+def decode_timetables(data: bytes) -> Dict[str, List[Timetable]]:
+    """Timetables of an ``encode_timetables`` archive; object arrays (pickles) are refused."""
+    with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+        metadata = json.loads(archive["metadata"].tobytes())
+        arrays = {name: archive[name] for name in ARTIFACT_ARRAYS}
+
+    by_route: Dict[str, List[Timetable]] = {}
+    offset = 0
+    for entry in metadata:
+        shape = (len(entry["trip_ids"]), len(entry["stop_ids"]))
+        size = shape[0] * shape[1]
+        matrices = {name: arrays[name][offset:offset + size].reshape(shape) for name in ARTIFACT_ARRAYS}
+        offset += size
+        stop_headsigns = None
+        if entry["stop_headsigns"] is not None:
+            stop_headsigns = np.empty(shape, dtype=object)
+            stop_headsigns[...] = entry["stop_headsigns"]
+        by_route.setdefault(entry["route_id"], []).append(Timetable(
+            route_id=entry["route_id"],
+            direction_id=entry["direction_id"],
+            service_id=entry["service_id"],
+            stop_ids=entry["stop_ids"],
+            stop_names=entry["stop_names"],
+            trip_ids=entry["trip_ids"],
+            headsigns=entry["headsigns"],
+            stop_headsigns=stop_headsigns,
+            **matrices,
+        ))
+    return by_route
+
+
+async def _stream_timetables(dsn: str) -> Dict[str, List[Timetable]]:
+    """Every timetable, each built as soon as its rows have been read."""
+    by_route: Dict[str, List[Timetable]] = {}
+    key = None
+    trips: List[Tuple[str, Optional[str], List[StopTimeRow]]] = []
+
+    def flush():
+        if trips:
+            by_route.setdefault(key[0], []).append(Timetable.build(*key, trips))
+
+    connection = await asyncpg.connect(dsn)
+    try:
+        # A server-side cursor, so only one timetable's rows are held at a time
+        async with connection.transaction(readonly=True):
+            async for row in connection.cursor(STOP_TIMES_QUERY, prefetch=5000):
+                row_key = (row["route_id"], row["direction_id"], row["service_id"])
+                if row_key != key:
+                    flush()
+                    key, trips = row_key, []
+                if not trips or trips[-1][0] != row["trip_id"]:
+                    trips.append((row["trip_id"], row["trip_headsign"], []))
+                if row["stop_id"] is not None:
+                    trips[-1][2].append(StopTimeRow(
+                        row["stop_id"], row["stop_name"], row["stop_sequence"], row["arrival_time"],
+                        row["departure_time"], row["stop_headsign"], row["pickup_type"], row["drop_off_type"]
+                    ))
+            flush()
+    finally:
+        await connection.close()
+
+    for timetables in by_route.values():
+        timetables.sort(key=lambda t: (t.direction_id is None, t.direction_id or 0, t.service_id))
+    return by_route
+
+
+def _build_artifact(dsn: str) -> bytes:
+    """Encoded timetables of the static tables; runs in a worker process."""
+    return encode_timetables(asyncio.run(_stream_timetables(dsn)))
+
+
+class RouteTimetableCache(StaticFeedCache[Dict[str, List[Timetable]]]):
+    """Timetables of every route of the loaded static feed, per feed version."""
+
+    ARTIFACT = "route_timetables"
+
+    ARTIFACT_QUERY = text("""
+        SELECT feed_version, data FROM static_feed_artifacts WHERE name = :name
+    """)
+
+    VERSIONS_QUERY = text("""
+        SELECT agency_key, version FROM static_feed_versions ORDER BY agency_key
+    """)
+
+    def __init__(self, session_factory=SessionLocal, ingest_session_factory=IngestSessionLocal,
+                 dsn: Optional[str] = None):
+        super().__init__()
+        self.session_factory = session_factory
+        self.ingest_session_factory = ingest_session_factory
+        self.dsn = dsn or get_asyncpg_dsn()
+
+    async def for_route(self, route_id: str, service_ids: Iterable[str]) -> List[Timetable]:
+        """Timetables of ``route_id`` for the given services, by direction then service."""
+        service_ids = set(service_ids)
+        timetables = (await self.get()).get(route_id, [])
+        return [timetable for timetable in timetables if timetable.service_id in service_ids]
+
+    async def publish(self) -> bool:
+        """
+        Build the timetables of the loaded feeds and store them for every
+        worker. Called by the ingestion leader after a static load; does
+        nothing when the stored timetables match the loaded feed versions.
+
+        Returns:
+            Whether new timetables were stored.
+        """
+        async with self.ingest_session_factory() as db:
+            versions = await self._feed_versions(db)
+            stored = (await db.execute(self.ARTIFACT_QUERY, {"name": self.ARTIFACT})).first()
+        if stored is not None and stored.feed_version == versions:
+            return False
+
+        started = time.perf_counter()
+        data = await self._build()
+        async with self.ingest_session_factory() as db:
+            stmt = insert(StaticFeedArtifact).values(name=self.ARTIFACT, feed_version=versions, data=data)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['name'],
+                set_={
+                    'feed_version': stmt.excluded.feed_version,
+                    'built_at': stmt.excluded.built_at,
+                    'data': stmt.excluded.data
+                }
+            )
+            await db.execute(stmt)
+            await db.commit()
+        logger.info(
+            f"Route timetables built for {versions or 'unknown feed versions'} in "
+            f"{time.perf_counter() - started:.2f}s ({len(data) / 1e6:.1f} MB stored)"
+        )
+        return True
+
+    async def _load(self) -> Dict[str, List[Timetable]]:
+        started = time.perf_counter()
+        async with self.session_factory() as db:
+            versions = await self._feed_versions(db)
+            stored = (await db.execute(self.ARTIFACT_QUERY, {"name": self.ARTIFACT})).first()
+
+        if stored is not None and stored.feed_version == versions:
+            data, source = stored.data, "stored artifact"
+        else:
+            # None stored for the loaded feeds yet (the leader is still building it): build here
+            data, source = await self._build(), "static tables"
+        by_route = await asyncio.to_thread(decode_timetables, data)
+
+        logger.info(
+            f"Route timetables loaded from the {source}: {sum(len(t) for t in by_route.values())} timetables "
+            f"for {len(by_route)} routes in {time.perf_counter() - started:.2f}s"
+        )
+        return by_route
+
+    async def _feed_versions(self, db) -> str:
+        """The loaded feed versions as ``agency=version`` pairs, which tag the artifact."""
+        rows = await db.execute(self.VERSIONS_QUERY)
+        return ",".join(f"{row.agency_key}={row.version or ''}" for row in rows)
+
+    async def _build(self) -> bytes:
+        # Building is CPU-bound; a worker process keeps it off this process's event loop
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            return await asyncio.get_running_loop().run_in_executor(pool, _build_artifact, self.dsn)
+
+
+# Process-wide route timetables
+route_timetables = RouteTimetableCache()
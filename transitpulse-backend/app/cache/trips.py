@@ -0,0 +1,175 @@
+"""
+Trip caches for batched lookups
+
+- StaticTripIndex keeps trip metadata and ordered stop times in memory,
+  loading the trips it has not seen in one query per table. It is cleared
+  whenever a new static feed version is loaded.
+- TripUpdatesCache keeps the latest GTFS-RT trip updates per agency as the
+  ingestion leader published them. Workers read the leader's copy from the
+  database; concurrent requests share a single read.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.cache.versions import static_feed_versions
+from app.core.database import SessionLocal
+from app.utils.gtfs_time import format_gtfs_time
+
+logger = logging.getLogger(__name__)
+
+
+class StaticTripIndex:
+    """trip_id -> {"trip_info": {...}, "stop_times": [...]}, least recently used first out."""
+
+    TRIPS_QUERY = text("""
+        SELECT t.trip_id, t.route_id, t.service_id, t.trip_headsign, t.direction_id,
+               t.block_id, t.shape_id,
+               r.route_short_name, r.route_long_name, r.route_color, r.route_text_color
+        FROM gtfs_trips t
+        LEFT JOIN gtfs_routes r ON t.route_id = r.route_id
+        WHERE t.trip_id = ANY(:trip_ids)
+    """)
+
+    STOP_TIMES_QUERY = text("""
+        SELECT st.trip_id, st.stop_sequence, st.stop_id, st.arrival_time, st.departure_time,
+               s.stop_name, s.stop_code, s.stop_lat, s.stop_lon
+        FROM gtfs_stop_times st
+        LEFT JOIN gtfs_stops s ON st.stop_id = s.stop_id
+        WHERE st.trip_id = ANY(:trip_ids)
+        ORDER BY st.trip_id, st.stop_sequence
+    """)
+
+    def __init__(self, session_factory=SessionLocal, max_trips: int = 5000):
+        self.session_factory = session_factory
+        self.max_trips = max_trips
+        self._trips: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        static_feed_versions.on_change(lambda agency_key, version: self.clear())
+
+    async def get(self, trip_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Cached entries for the trips that exist; unknown trip ids are left out."""
+        wanted = list(dict.fromkeys(trip_id for trip_id in trip_ids if trip_id))
+        missing = [trip_id for trip_id in wanted if trip_id not in self._trips]
+        if missing:
+            await self._load(missing)
+
+        found = {}
+        for trip_id in wanted:
+            entry = self._trips.get(trip_id)
+            if entry is not None:
+                self._trips.move_to_end(trip_id)
+                found[trip_id] = entry
+        return found
+
+    def clear(self) -> None:
+        self._trips.clear()
+
+    async def _load(self, trip_ids: List[str]) -> None:
+        async with self.session_factory() as db:
+            trips = (await db.execute(self.TRIPS_QUERY, {"trip_ids": trip_ids})).fetchall()
+            stop_times = (await db.execute(self.STOP_TIMES_QUERY, {"trip_ids": trip_ids})).fetchall()
+
+        loaded: Dict[str, Dict[str, Any]] = {}
+        for row in trips:
+            loaded[row.trip_id] = {
+                "trip_info": {
+                    "trip_id": row.trip_id,
+                    "route_id": row.route_id,
+                    "service_id": row.service_id,
+                    "trip_headsign": row.trip_headsign,
+                    "direction_id": row.direction_id,
+                    "block_id": row.block_id,
+                    "shape_id": row.shape_id,
+                    "route_short_name": row.route_short_name,
+                    "route_long_name": row.route_long_name,
+                    "route_color": row.route_color,
+                    "route_text_color": row.route_text_color,
+                },
+                "stop_times": [],
+            }
+        for row in stop_times:
+            entry = loaded.get(row.trip_id)
+            if entry is None:
+                continue
+            entry["stop_times"].append({
+                "stop_sequence": row.stop_sequence,
+                "stop_id": row.stop_id,
+                "stop_name": row.stop_name,
+                "stop_code": row.stop_code,
+                "stop_lat": float(row.stop_lat) if row.stop_lat is not None else None,
+                "stop_lon": float(row.stop_lon) if row.stop_lon is not None else None,
+                "arrival_time": format_gtfs_time(row.arrival_time),
+                "departure_time": format_gtfs_time(row.departure_time),
+            })
+
+        self._trips.update(loaded)
+        while len(self._trips) > self.max_trips:
+            self._trips.popitem(last=False)
+
+
+class TripUpdatesCache:
+    """Latest GTFS-RT trip updates per agency, as published by the ingestion leader.
+
+    Only the leader fetches the upstream feed; it stores each fetch here and
+    in the live_trip_updates table, and announces it to the other workers,
+    which reload the table row. A worker that missed announcements reads the
+    row again after the TTL, so it never polls the upstream feed itself.
+    """
+
+    PUBLISHED_QUERY = text("""
+        SELECT updates, fetched_at FROM live_trip_updates WHERE agency_key = :agency_key
+    """)
+
+    def __init__(self, session_factory=SessionLocal, ttl: float = 30.0):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        # agency -> (stored_at monotonic, trip_id -> update)
+        self._entries: Dict[str, Tuple[float, Dict[str, Dict]]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def get(self, agency_key: str = "golden_gate") -> Dict[str, Dict]:
+        entry = self._entries.get(agency_key)
+        if entry and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+
+        task = self._inflight.get(agency_key)
+        if task is None:
+            task = self._inflight[agency_key] = asyncio.create_task(self._refresh(agency_key))
+            task.add_done_callback(lambda _: self._inflight.pop(agency_key, None))
+        return await asyncio.shield(task)
+
+    def store(self, agency_key: str, updates: List[Dict]) -> Dict[str, Dict]:
+        """Keep updates the leader just fetched."""
+        by_trip = {u["trip_id"]: u for u in updates if u.get("trip_id")}
+        self._entries[agency_key] = (time.monotonic(), by_trip)
+        return by_trip
+
+    def invalidate(self, agency_key: Optional[str] = None) -> None:
+        """Reload from the database on the next ``get`` (every agency when None)."""
+        if agency_key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(agency_key, None)
+
+    async def _refresh(self, agency_key: str) -> Dict[str, Dict]:
+        previous = self._entries.get(agency_key, (0.0, {}))[1]
+        try:
+            async with self.session_factory() as db:
+                row = (await db.execute(self.PUBLISHED_QUERY, {"agency_key": agency_key})).first()
+        except Exception as e:
+            logger.warning(f"Could not read published trip updates for {agency_key}: {e}")
+            # Keep serving the previous updates until the next TTL expiry
+            self._entries[agency_key] = (time.monotonic(), previous)
+            return previous
+
+        return self.store(agency_key, (row.updates or []) if row is not None else [])
+
+
+# Process-wide caches
+static_trip_index = StaticTripIndex()
+trip_updates_cache = TripUpdatesCache()
@@ -0,0 +1,117 @@
+"""
+Static feed versions
+
+Caches derived from the static GTFS tables are keyed by the version (sha256)
+of the feed archive loaded into the database. The ingestion leader sets the
+version after each load and announces it to the other workers, so every
+worker drops stale entries at the same point. The loaded versions are also
+recorded in the database with the tables, and workers re-read them on
+start and whenever they may have missed an announcement.
+"""
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+
+from sqlalchemy import text
+
+from app.core.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class FeedVersions:
+    """Version of the static feed currently loaded, per agency."""
+
+    LOADED_QUERY = text("""
+        SELECT agency_key, version FROM static_feed_versions
+    """)
+
+    def __init__(self):
+        self._versions: Dict[str, Optional[str]] = {}
+        self._listeners: List[Callable[[str, Optional[str]], None]] = []
+
+    def get(self, agency_key: str) -> Optional[str]:
+        return self._versions.get(agency_key)
+
+    def set(self, agency_key: str, version: Optional[str]) -> None:
+        if self._versions.get(agency_key) == version:
+            return
+        self._versions[agency_key] = version
+        logger.info(f"Static feed version for {agency_key} is now {(version or 'unknown')[:12]}")
+        for listener in self._listeners:
+            try:
+                listener(agency_key, version)
+            except Exception as e:
+                logger.error(f"Error invalidating static caches: {e}")
+
+    async def refresh(self, session_factory=SessionLocal) -> Dict[str, Optional[str]]:
+        """Set the versions recorded in the database, returning them."""
+        async with session_factory() as db:
+            loaded = {row.agency_key: row.version for row in await db.execute(self.LOADED_QUERY)}
+        for agency_key, version in loaded.items():
+            self.set(agency_key, version)
+        return loaded
+
+    def on_change(self, listener: Callable[[str, Optional[str]], None]) -> None:
+        """Call ``listener(agency_key, version)`` whenever a version changes."""
+        self._listeners.append(listener)
+
+
+# Process-wide static feed versions
+static_feed_versions = FeedVersions()
+
+
+T = TypeVar("T")
+
+
+class StaticFeedCache(ABC, Generic[T]):
+    """A structure derived from the loaded static feed.
+
+    Built on first use and again in the background whenever a new feed
+    version is loaded, so the first request after a load does not pay for
+    it. Subclasses implement ``_load``.
+    """
+
+    def __init__(self, versions: FeedVersions = static_feed_versions):
+        self._value: Optional[T] = None
+        # Bumped on every feed change, so a build that read the previous feed is not kept
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        versions.on_change(self._static_changed)
+
+    async def get(self) -> T:
+        value = self._value
+        if value is not None:
+            return value
+        async with self._lock:
+            if self._value is not None:
+                return self._value
+            generation = self._generation
+            value = await self._load()
+            if generation == self._generation:
+                self._value = value
+            return value
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._value = None
+
+    @abstractmethod
+    async def _load(self) -> T:
+        """Build the structure from the static tables."""
+
+    def _static_changed(self, agency_key: str, version: Optional[str]) -> None:
+        self.clear()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        loop.create_task(self._warm())
+
+    async def _warm(self) -> None:
+        try:
+            await self.get()
+        except Exception as e:
+            logger.warning(f"Could not rebuild {type(self).__name__} after a static feed change: {e}")
@@ -0,0 +1,185 @@
+"""
+HTTP response compression
+
+``CompressionMiddleware`` compresses JSON and text responses above a size
+threshold with the best encoding the client accepts: brotli when the
+optional ``brotli`` package is installed, otherwise gzip. Streamed
+responses are compressed chunk by chunk and flushed as they go, so rows
+still reach the client as they are produced. Server-Sent Events are never
+compressed, since buffering would delay events.
+
+Payloads that are cached as bytes can be compressed once with
+``precompress`` and sent with their ``Content-Encoding`` already set; the
+middleware passes such responses through untouched.
+"""
+
+import gzip
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only without it
+    brotli = None
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Stored payloads are compressed once, so they can afford higher levels than per-request compression
+PRECOMPRESS_GZIP_LEVEL = 9
+PRECOMPRESS_BROTLI_QUALITY = 9
+
+
+def available_encodings() -> List[str]:
+    """Supported content codings, most preferred first."""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def negotiate(accept_encoding: str, offered: Optional[Iterable[str]] = None) -> Optional[str]:
+    """The preferred coding from ``offered`` that an Accept-Encoding header allows, if any."""
+    offered = list(offered) if offered is not None else available_encodings()
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip()] = q
+
+    best, best_q = None, 0.0
+    for coding in offered:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=level if level is not None else 4)
+    return gzip.compress(body, compresslevel=level if level is not None else 6, mtime=0)
+
+
+def precompress(body: bytes, minimum_size: int = 1024) -> Dict[str, bytes]:
+    """Every supported encoding of ``body`` (nothing when it is too small to be worth it)."""
+    if len(body) < minimum_size:
+        return {}
+    encoded = {"gzip": compress(body, "gzip", PRECOMPRESS_GZIP_LEVEL)}
+    if brotli is not None:
+        encoded["br"] = compress(body, "br", PRECOMPRESS_BROTLI_QUALITY)
+    return encoded
+
+
+def is_compressible(content_type: str) -> bool:
+    content_type = content_type.lower()
+    if content_type.startswith("text/event-stream"):
+        return False
+    return (
+        content_type.startswith("text/")
+        or "json" in content_type
+        or "javascript" in content_type
+        or "xml" in content_type
+    )
+
+
+class _StreamCompressor:
+    """Incremental compressor that flushes after every chunk."""
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def chunk(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressionMiddleware:
+    """Negotiated gzip/brotli compression for responses of at least ``minimum_size`` bytes."""
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.levels = {"gzip": gzip_level, "br": brotli_quality}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        # None until the first body chunk decides; then "passthrough", "whole" or a stream compressor
+        mode: Optional[object] = None
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, mode
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if mode is None:
+                headers = MutableHeaders(raw=start["headers"])
+                if (
+                    "content-encoding" in headers
+                    or not is_compressible(headers.get("content-type", ""))
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    mode = "passthrough"
+                    await send(start)
+                    await send(message)
+                    return
+
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body:
+                    mode = "whole"
+                    body = compress(body, encoding, self.levels[encoding])
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                mode = _StreamCompressor(encoding, self.levels[encoding])
+                if "content-length" in headers:
+                    del headers["content-length"]
+                await send(start)
+
+            if mode == "passthrough":
+                await send(message)
+            elif isinstance(mode, _StreamCompressor):
+                data = mode.chunk(body) if body else b""
+                if not more_body:
+                    data += mode.finish()
+                if data or not more_body:
+                    await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def select_encoding(accept_encoding: str, encoded: Dict[str, bytes]) -> Tuple[Optional[str], Optional[bytes]]:
+    """The precompressed body to send for an Accept-Encoding header, if any."""
+    encoding = negotiate(accept_encoding, [e for e in available_encodings() if e in encoded])
+    return (encoding, encoded[encoding]) if encoding else (None, None)
@@ -12,6 +12,12 @@ class Settings(BaseSettings):
         default="golden_gate_transit",
         env="DEFAULT_AGENCY_ID"
     )
+
+    # Timezone of the agency's GTFS schedule times
+    AGENCY_TIMEZONE: str = Field(
+        default="America/Los_Angeles",
+        env="AGENCY_TIMEZONE"
+    )
     
     # Agency branding and configuration
     AGENCY_CONFIGS: Dict[str, Dict[str, Any]] = {
@@ -36,12 +42,111 @@ class Settings(BaseSettings):
         env="DATABASE_URL"
     )
     
+    # Optional read replica for reporting queries; used while it lags the
+    # primary by at most REPLICA_MAX_LAG_SECONDS (checked every REPLICA_LAG_CHECK_SECONDS)
+    DATABASE_REPLICA_URL: Optional[str] = Field(
+        default=None,
+        env="DATABASE_REPLICA_URL"
+    )
+    REPLICA_MAX_LAG_SECONDS: float = Field(
+        default=30.0,
+        env="REPLICA_MAX_LAG_SECONDS"
+    )
+    REPLICA_LAG_CHECK_SECONDS: float = Field(
+        default=5.0,
+        env="REPLICA_LAG_CHECK_SECONDS"
+    )
+
+    # Connection pools (see app/core/database.py): API requests and ingestion writes
+    # get separate pools; connections are recycled after DB_POOL_RECYCLE seconds
+    DB_POOL_SIZE: int = Field(
+        default=10,
+        env="DB_POOL_SIZE"
+    )
+    DB_MAX_OVERFLOW: int = Field(
+        default=10,
+        env="DB_MAX_OVERFLOW"
+    )
+    DB_INGEST_POOL_SIZE: int = Field(
+        default=5,
+        env="DB_INGEST_POOL_SIZE"
+    )
+    DB_INGEST_MAX_OVERFLOW: int = Field(
+        default=5,
+        env="DB_INGEST_MAX_OVERFLOW"
+    )
+    DB_POOL_TIMEOUT: float = Field(
+        default=30.0,
+        env="DB_POOL_TIMEOUT"
+    )
+    DB_POOL_RECYCLE: int = Field(
+        default=1800,
+        env="DB_POOL_RECYCLE"
+    )
+    # Prepared statements asyncpg keeps per connection
+    DB_STATEMENT_CACHE_SIZE: int = Field(
+        default=500,
+        env="DB_STATEMENT_CACHE_SIZE"
+    )
+    # Log every SQL statement (development only)
+    DB_ECHO: bool = Field(
+        default=False,
+        env="DB_ECHO"
+    )
+
     # Redis configuration
     REDIS_URL: str = Field(
         default="redis://localhost:6379/0",
         env="REDIS_URL"
     )
     
+    # Websocket fan-out across workers: "memory" (single process) or "redis" (uses REDIS_URL)
+    WEBSOCKET_FANOUT_BACKEND: str = Field(
+        default="memory",
+        env="WEBSOCKET_FANOUT_BACKEND"
+    )
+
+    # Websocket clients that take longer than this to accept a batch are dropped
+    WEBSOCKET_SEND_TIMEOUT: float = Field(
+        default=5.0,
+        env="WEBSOCKET_SEND_TIMEOUT"
+    )
+
+    # Responses smaller than this many bytes are sent uncompressed
+    COMPRESSION_MINIMUM_SIZE: int = Field(
+        default=1024,
+        env="COMPRESSION_MINIMUM_SIZE"
+    )
+
+    # Largest page a paginated list endpoint returns
+    PAGE_SIZE_MAX: int = Field(
+        default=1000,
+        env="PAGE_SIZE_MAX"
+    )
+
+    # GTFS static feed cache (downloaded archives are kept here for reuse)
+    GTFS_CACHE_DIR: str = Field(
+        default="data/gtfs_cache",
+        env="GTFS_CACHE_DIR"
+    )
+
+    # Background ingestion jobs: "embedded" runs them inside the API process,
+    # "worker" leaves them to a separate `python scheduler.py` process
+    SCHEDULER_MODE: str = Field(
+        default="embedded",
+        env="SCHEDULER_MODE"
+    )
+
+    # Only the holder of this Postgres advisory lock ingests; other workers follow
+    LEADER_ELECTION_ENABLED: bool = Field(
+        default=True,
+        env="LEADER_ELECTION_ENABLED"
+    )
+    LEADER_LOCK_KEY: int = Field(
+        default=74201,
+        env="LEADER_LOCK_KEY"
+    )
+
     # API settings
     DEBUG: bool = Field(
         default=False,
@@ -1,28 +1,277 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from app.core.base import Base
+"""
+Database engines and sessions
+
+All engines are created by ``create_engine`` with the pool settings from
+the configuration, SQL echo off unless ``DB_ECHO`` is set, and asyncpg's
+prepared statement cache sized by ``DB_STATEMENT_CACHE_SIZE``. There are
+two pools so bulk loads cannot starve API requests of connections:
+
+- ``engine`` / ``SessionLocal``: API requests and in-process readers
+- ``ingest_engine`` / ``IngestSessionLocal``: feed ingestion writes
+
+With ``DATABASE_REPLICA_URL`` set, read-only reporting endpoints take their
+sessions from ``get_read_db``, which uses a third pool on the replica while
+its replication lag is within ``REPLICA_MAX_LAG_SECONDS`` and the primary
+otherwise (or when the replica cannot be reached).
+
+Each pool records how long checkouts waited for a connection, how many
+timed out, and how close it came to running out of connections
+(``pool_metrics()``, served at ``/debug/db-pool``).
+"""
+
+import asyncio # Import asyncio for running create_db_and_tables
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from databases import Database # Still use this for direct connection mgmt
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.base import Base
 from app.core.config import settings
 # Ensure all models are imported so their tables are registered
 import app.models
-import asyncio # Import asyncio for running create_db_and_tables
+
+logger = logging.getLogger(__name__)
 
 DATABASE_URL = settings.DATABASE_URL
 
-# Use asyncpg driver with databases library
-database = Database(DATABASE_URL)
 
-# Use asyncpg driver with SQLAlchemy
-engine = create_async_engine(DATABASE_URL, echo=True)
+@dataclass
+class PoolStats:
+    """Checkout metrics for a single connection pool."""
+    name: str
+    pool_size: int
+    max_overflow: int
+    checkouts: int = 0
+    timeouts: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    peak_checked_out: int = 0
+    # Most recent checkout waits, for percentiles
+    recent_waits: Deque[float] = field(default_factory=lambda: deque(maxlen=1000))
+
+    @property
+    def capacity(self) -> int:
+        return self.pool_size + max(self.max_overflow, 0)
+
+    def record_checkout(self, wait: float, checked_out: int) -> None:
+        self.checkouts += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.recent_waits.append(wait)
+        self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def as_dict(self, pool: Optional["InstrumentedPool"] = None) -> Dict[str, Any]:
+        checked_out = pool.checkedout() if pool is not None else None
+        waits = sorted(self.recent_waits)
+        return {
+            "pool": self.name,
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "checked_out": checked_out,
+            "saturation": round(checked_out / self.capacity, 3) if checked_out is not None and self.capacity else None,
+            "peak_checked_out": self.peak_checked_out,
+            "peak_saturation": round(self.peak_checked_out / self.capacity, 3) if self.capacity else None,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else None,
+            "p95_wait_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 3) if waits else None,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that times how long each checkout waits for a connection."""
+
+    stats: Optional[PoolStats] = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            if self.stats is not None:
+                self.stats.timeouts += 1
+            raise
+        if self.stats is not None:
+            self.stats.record_checkout(time.perf_counter() - started, self.checkedout())
+        return connection
+
+    def recreate(self):
+        # dispose() replaces the pool; keep counting into the same stats
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+_engines: Dict[str, AsyncEngine] = {}
+
+
+def create_engine(
+    name: str,
+    url: str = DATABASE_URL,
+    pool_size: int = settings.DB_POOL_SIZE,
+    max_overflow: int = settings.DB_MAX_OVERFLOW,
+) -> AsyncEngine:
+    """An async engine with the configured pool settings, registered for ``pool_metrics()``."""
+    engine = create_async_engine(
+        url,
+        echo=settings.DB_ECHO,
+        poolclass=InstrumentedPool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        connect_args={"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE},
+    )
+    engine.sync_engine.pool.stats = PoolStats(name, pool_size, max_overflow)
+    _engines[name] = engine
+    return engine
+
+
+def pool_metrics() -> List[Dict[str, Any]]:
+    """Checkout wait and saturation metrics of every engine's pool."""
+    metrics = []
+    for engine in _engines.values():
+        pool = engine.sync_engine.pool
+        metrics.append(pool.stats.as_dict(pool))
+    return metrics
+
+
+# API requests and in-process readers
+engine = create_engine("api")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
 
+# Feed ingestion writes
+ingest_engine = create_engine(
+    "ingest", pool_size=settings.DB_INGEST_POOL_SIZE, max_overflow=settings.DB_INGEST_MAX_OVERFLOW
+)
+IngestSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=ingest_engine, class_=AsyncSession)
+
+# Read-only reporting queries, when a replica is configured
+replica_engine = create_engine("replica", url=settings.DATABASE_REPLICA_URL) if settings.DATABASE_REPLICA_URL else None
+ReplicaSessionLocal = (
+    sessionmaker(autocommit=False, autoflush=False, bind=replica_engine, class_=AsyncSession)
+    if replica_engine is not None else None
+)
+
+# Seconds the replica is behind; 0 when it has replayed everything it received
+# (an idle primary would otherwise look stale) or is not a standby at all.
+# NULL when the WAL receiver is not streaming: the replica has replayed all it
+# received, but may be missing everything the primary wrote since.
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class ReadRouter:
+    """Chooses the replica or the primary for read-only sessions."""
+
+    def __init__(
+        self,
+        replica_factory=ReplicaSessionLocal,
+        primary_factory=SessionLocal,
+        max_lag: float = settings.REPLICA_MAX_LAG_SECONDS,
+        check_interval: float = settings.REPLICA_LAG_CHECK_SECONDS,
+        check_timeout: float = 2.0,
+    ):
+        self.replica_factory = replica_factory
+        self.primary_factory = primary_factory
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self.lag: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.replica_sessions = 0
+        self.primary_sessions = 0
+        self._checked_at = 0.0
+        self._check_task: Optional[asyncio.Task] = None
+
+    async def replica_usable(self) -> bool:
+        """Whether the replica answered the last lag check within the staleness bound.
+
+        A due check runs in the background; callers get the last decision
+        meanwhile (the primary until the first check completes).
+        """
+        if self.replica_factory is None:
+            return False
+        if time.monotonic() - self._checked_at >= self.check_interval and self._check_task is None:
+            self._check_task = asyncio.create_task(self._check_lag())
+            self._check_task.add_done_callback(lambda _: setattr(self, "_check_task", None))
+        return self.lag is not None and self.lag <= self.max_lag
+
+    async def session_factory(self):
+        if await self.replica_usable():
+            self.replica_sessions += 1
+            return self.replica_factory
+        self.primary_sessions += 1
+        return self.primary_factory
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "replica_configured": self.replica_factory is not None,
+            "max_lag_seconds": self.max_lag,
+            "replica_lag_seconds": self.lag,
+            "last_error": self.last_error,
+            "replica_sessions": self.replica_sessions,
+            "primary_sessions": self.primary_sessions,
+        }
+
+    async def _query_lag(self) -> Optional[float]:
+        async with self.replica_factory() as db:
+            lag = (await db.execute(REPLICA_LAG_QUERY)).scalar()
+        return float(lag) if lag is not None else None
+
+    async def _check_lag(self) -> None:
+        try:
+            # Bounds the connect as well as the query
+            lag = await asyncio.wait_for(self._query_lag(), timeout=self.check_timeout)
+            if lag is None:
+                raise RuntimeError("replica WAL receiver is not streaming")
+            self.lag = lag
+            self.last_error = None
+            if self.lag > self.max_lag:
+                logger.warning(f"Replica is {self.lag:.1f}s behind; reading from the primary")
+        except Exception as e:
+            if self.last_error is None:
+                logger.warning(f"Replica unavailable, reading from the primary: {e}")
+            self.lag = None
+            self.last_error = str(e) or type(e).__name__
+        self._checked_at = time.monotonic()
+
+
+# Process-wide read routing
+read_router = ReadRouter()
+
+
+def get_asyncpg_dsn(url: str = DATABASE_URL) -> str:
+    """Plain asyncpg DSN for connections that bypass SQLAlchemy (advisory locks, LISTEN)."""
+    return url.replace("postgresql+asyncpg://", "postgresql://", 1)
+
 async def get_db():
     async with SessionLocal() as session:
         yield session
 
+async def get_read_db():
+    """Session for read-only endpoints: the replica when it is fresh enough, else the primary."""
+    session_factory = await read_router.session_factory()
+    async with session_factory() as session:
+        yield session
+
 async def create_db_and_tables():
     """Creates all database tables defined in Base.metadata."""
-    async with engine.begin() as conn:
+    async with ingest_engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
 if __name__ == "__main__":
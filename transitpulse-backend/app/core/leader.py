@@ -0,0 +1,133 @@
+"""
+Ingestion leader election
+
+With several uvicorn workers (or several scheduler workers) only one process
+should poll the upstream feeds and write to the database. Each process runs a
+LeaderElector that tries to take a session-level Postgres advisory lock on a
+dedicated connection. The holder of the lock is the leader; everyone else
+retries periodically. If the leader dies or loses its connection, Postgres
+releases the lock and the next follower to retry takes over. A lock attempt
+or liveness probe that does not answer within ``probe_timeout`` seconds counts
+as a lost connection: the leader steps down rather than keep running its
+duties on a session that may already have released the lock.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+import asyncpg
+
+from app.core.config import settings
+from app.core.database import get_asyncpg_dsn
+
+logger = logging.getLogger(__name__)
+
+Callback = Callable[[], Awaitable[None]]
+
+
+class LeaderElector:
+    """Postgres advisory-lock based leader election."""
+
+    def __init__(
+        self,
+        lock_key: int = settings.LEADER_LOCK_KEY,
+        dsn: Optional[str] = None,
+        retry_interval: float = 5.0,
+        probe_timeout: float = 5.0,
+        on_elected: Optional[Callback] = None,
+        on_demoted: Optional[Callback] = None,
+    ):
+        self.lock_key = lock_key
+        self.dsn = dsn or get_asyncpg_dsn()
+        self.retry_interval = retry_interval
+        self.probe_timeout = probe_timeout
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.is_leader = False
+        self._connection: Optional[asyncpg.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """Start campaigning in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._campaign(), name="leader-election")
+
+    async def stop(self) -> None:
+        """Stop campaigning and give up leadership if held."""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._demote()
+
+    def status(self) -> dict:
+        return {
+            "is_leader": self.is_leader,
+            "lock_key": self.lock_key,
+            "campaigning": self._task is not None and not self._task.done(),
+        }
+
+    async def _campaign(self) -> None:
+        while True:
+            try:
+                if self._connection is not None and self._connection.is_closed():
+                    # The lock died with the session that held it
+                    await self._demote()
+                if self._connection is None:
+                    self._connection = await asyncpg.connect(self.dsn, timeout=self.probe_timeout)
+
+                if not self.is_leader:
+                    acquired = await asyncio.wait_for(
+                        self._connection.fetchval("SELECT pg_try_advisory_lock($1)", self.lock_key),
+                        self.probe_timeout,
+                    )
+                    if acquired:
+                        await self._elect()
+                else:
+                    # Holding the lock: make sure the session that owns it is still alive
+                    await asyncio.wait_for(self._connection.fetchval("SELECT 1"), self.probe_timeout)
+
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                logger.warning(f"Leader election connection did not answer within {self.probe_timeout}s")
+                await self._demote()
+            except Exception as e:
+                logger.warning(f"Leader election connection error: {e}")
+                await self._demote()
+
+            await asyncio.sleep(self.retry_interval)
+
+    async def _elect(self) -> None:
+        self.is_leader = True
+        logger.info(f"Acquired ingestion leadership (advisory lock {self.lock_key})")
+        if self.on_elected:
+            try:
+                await self.on_elected()
+            except Exception as e:
+                logger.error(f"Error starting leader duties: {e}")
+
+    async def _demote(self) -> None:
+        was_leader = self.is_leader
+        self.is_leader = False
+
+        if was_leader:
+            logger.warning("Lost ingestion leadership")
+            if self.on_demoted:
+                try:
+                    await self.on_demoted()
+                except Exception as e:
+                    logger.error(f"Error stopping leader duties: {e}")
+
+        if self._connection is not None:
+            try:
+                if was_leader and not self._connection.is_closed():
+                    await asyncio.wait_for(
+                        self._connection.execute("SELECT pg_advisory_unlock($1)", self.lock_key),
+                        self.probe_timeout,
+                    )
+                await asyncio.wait_for(self._connection.close(), self.probe_timeout)
+            except Exception:
+                self._connection.terminate()
+            self._connection = None
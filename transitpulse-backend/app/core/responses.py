@@ -0,0 +1,152 @@
+"""
+JSON encoding for API responses
+
+Responses are encoded with orjson, which serializes datetimes, dates,
+UUIDs, dataclasses and NumPy arrays natively and is several times faster
+than the standard library on large payloads. When orjson is not installed
+the standard library is used with the same output.
+
+Routers use ``FastJSONRoute`` so that dicts and lists returned by endpoints
+without a response model go straight to the encoder instead of first being
+copied through FastAPI's ``jsonable_encoder``. ``NDJSONResponse`` streams
+large result sets one JSON object per line as the rows arrive.
+"""
+
+import asyncio
+import datetime
+import decimal
+import functools
+import json
+import logging
+from typing import Any, AsyncIterable, AsyncIterator, Callable
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the stdlib encoder
+    orjson = None
+
+from fastapi import Request
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.routing import APIRoute, request_response
+
+from app.core.compression import select_encoding
+
+logger = logging.getLogger(__name__)
+
+
+def _default(value: Any) -> Any:
+    """Types neither encoder handles natively, encoded as jsonable_encoder would."""
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, bytes):
+        return value.decode()
+    if hasattr(value, "model_dump"):  # Pydantic models nested in plain dicts
+        return value.model_dump(mode="json")
+    if hasattr(value, "tolist"):  # NumPy scalars and arrays (stdlib fallback)
+        return value.tolist()
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize ``content`` to compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+        )
+    return json.dumps(content, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class EncodedJSON(str):
+    """JSON text produced by ``FastJSONRoute``; passes through jsonable_encoder untouched."""
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class of the API."""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, EncodedJSON):
+            return content.encode("utf-8")
+        return dumps(content)
+
+
+class SerializedJSONResponse(JSONResponse):
+    """A response whose body is already JSON bytes, sent without re-encoding."""
+
+    def render(self, content: Any) -> bytes:
+        return content if isinstance(content, bytes) else dumps(content)
+
+    @classmethod
+    def negotiated(cls, request: Request, payload: Any, **kwargs: Any) -> "SerializedJSONResponse":
+        """Send a cached payload, precompressed when the client accepts one of its encodings."""
+        encoding, body = select_encoding(request.headers.get("accept-encoding", ""), payload.encoded)
+        kwargs["headers"] = {**payload.headers, **(kwargs.get("headers") or {})}
+        response = cls(body if encoding else payload.body, **kwargs)
+        response.headers.append("Vary", "Accept-Encoding")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        return response
+
+
+class NDJSONResponse(StreamingResponse):
+    """Streams objects from an async iterable as newline-delimited JSON."""
+
+    media_type = "application/x-ndjson"
+
+    def __init__(self, rows: AsyncIterable[Any], chunk_size: int = 32768, **kwargs: Any):
+        kwargs.setdefault("media_type", self.media_type)
+        super().__init__(_ndjson_chunks(rows, chunk_size), **kwargs)
+
+
+async def _ndjson_chunks(rows: AsyncIterable[Any], chunk_size: int) -> AsyncIterator[bytes]:
+    # Lines are batched into chunks of about chunk_size bytes rather than sent one write per row
+    buffer = bytearray()
+    try:
+        async for row in rows:
+            buffer += dumps(row)
+            buffer += b"\n"
+            if len(buffer) >= chunk_size:
+                yield bytes(buffer)
+                buffer.clear()
+    except Exception as e:
+        # The status line is already sent; the failure is reported in-band as the last line
+        logger.error(f"Error streaming NDJSON response: {e}")
+        buffer += dumps({"status": "error", "message": str(e)}) + b"\n"
+    if buffer:
+        yield bytes(buffer)
+
+
+class FastJSONRoute(APIRoute):
+    """Route that encodes plain dict and list results itself."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        response_class = self.response_class
+        if isinstance(response_class, DefaultPlaceholder):
+            response_class = response_class.value
+        if self.response_field is None and issubclass(response_class, FastJSONResponse):
+            self.dependant.call = _pre_encoded(self.dependant.call)
+            self.app = request_response(self.get_route_handler())
+
+
+def _pre_encoded(call: Callable) -> Callable:
+    def encode(content: Any) -> Any:
+        return EncodedJSON(dumps(content).decode("utf-8")) if isinstance(content, (dict, list)) else content
+
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def endpoint(*args: Any, **kwargs: Any) -> Any:
+            return encode(await call(*args, **kwargs))
+    else:
+        @functools.wraps(call)
+        def endpoint(*args: Any, **kwargs: Any) -> Any:
+            return encode(call(*args, **kwargs))
+    return endpoint
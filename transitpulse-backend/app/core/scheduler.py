@@ -0,0 +1,257 @@
+"""
+Asyncio-native job scheduler
+
+Runs coroutine jobs on the current event loop, so jobs share the
+application's connection pools and in-memory caches. Each job is driven by
+its own task, which means a slow job never delays the ticks of other jobs.
+
+Per job the scheduler provides:
+- Overlap prevention: a tick that comes due while the previous run is still
+  in progress is skipped and counted instead of starting a second run.
+- Missed-run policies: ``skip`` drops ticks that were missed (for example
+  after the loop was blocked), ``run_once`` coalesces them into a single
+  catch-up run.
+- Jitter: a random delay of up to ``jitter`` seconds is added to each tick
+  so several workers do not hit upstream feeds at the same instant.
+- Metrics: run/failure counts, duration and start lag (actual start minus
+  scheduled start).
+"""
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, time as dtime, timedelta
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class MissedRunPolicy(str, Enum):
+    SKIP = "skip"          # Drop missed ticks and wait for the next one
+    RUN_ONCE = "run_once"  # Run once to catch up, then resume the cadence
+
+
+@dataclass
+class JobStats:
+    """Runtime metrics for a single job."""
+    runs: int = 0
+    failures: int = 0
+    overlaps_skipped: int = 0
+    missed_runs: int = 0
+    last_started: Optional[datetime] = None
+    last_finished: Optional[datetime] = None
+    last_duration: Optional[float] = None
+    max_duration: float = 0.0
+    total_duration: float = 0.0
+    last_lag: Optional[float] = None
+    max_lag: float = 0.0
+    last_error: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "overlaps_skipped": self.overlaps_skipped,
+            "missed_runs": self.missed_runs,
+            "last_started": self.last_started.isoformat() if self.last_started else None,
+            "last_finished": self.last_finished.isoformat() if self.last_finished else None,
+            "last_duration_seconds": self.last_duration,
+            "avg_duration_seconds": round(self.total_duration / self.runs, 3) if self.runs else None,
+            "max_duration_seconds": round(self.max_duration, 3),
+            "last_lag_seconds": self.last_lag,
+            "max_lag_seconds": round(self.max_lag, 3),
+            "last_error": self.last_error,
+        }
+
+
+@dataclass
+class ScheduledJob:
+    """A coroutine job run either every ``interval`` or daily ``at`` a time of day."""
+    name: str
+    func: Callable[[], Awaitable[Any]]
+    interval: Optional[timedelta] = None
+    at: Optional[dtime] = None
+    jitter: float = 0.0
+    missed_policy: MissedRunPolicy = MissedRunPolicy.SKIP
+    run_immediately: bool = False
+    next_run: Optional[datetime] = None
+    stats: JobStats = field(default_factory=JobStats)
+    current_run: Optional[asyncio.Task] = None
+
+    @property
+    def period(self) -> timedelta:
+        return self.interval if self.interval is not None else timedelta(days=1)
+
+    @property
+    def is_running(self) -> bool:
+        return self.current_run is not None and not self.current_run.done()
+
+    def first_run(self, now: datetime) -> datetime:
+        if self.run_immediately:
+            return now
+        if self.at is not None:
+            candidate = datetime.combine(now.date(), self.at)
+            return candidate if candidate > now else candidate + timedelta(days=1)
+        return now + self.period
+
+    def following_run(self, scheduled: datetime, now: datetime) -> datetime:
+        """Next tick after ``scheduled`` that is still in the future."""
+        if self.at is not None:
+            next_run = datetime.combine(now.date(), self.at)
+            return next_run if next_run > now else next_run + timedelta(days=1)
+
+        next_run = scheduled + self.period
+        if next_run <= now:
+            behind = (now - next_run) // self.period + 1
+            next_run += self.period * behind
+        return next_run
+
+
+class AsyncJobScheduler:
+    """Schedules coroutine jobs on the running event loop."""
+
+    def __init__(self, name: str = "scheduler"):
+        self.name = name
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self.is_running = False
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        *,
+        interval: Optional[timedelta] = None,
+        at: Optional[dtime] = None,
+        jitter: float = 0.0,
+        missed_policy: MissedRunPolicy = MissedRunPolicy.SKIP,
+        run_immediately: bool = False,
+    ) -> ScheduledJob:
+        """
+        Register a job.
+
+        Args:
+            name: Unique job name used in logs and metrics
+            func: Zero-argument coroutine function to run
+            interval: Run every ``interval`` (mutually exclusive with ``at``)
+            at: Run once a day at this local time of day
+            jitter: Maximum random delay in seconds added to each tick
+            missed_policy: What to do with ticks that were missed
+            run_immediately: Run once as soon as the scheduler starts
+        """
+        if (interval is None) == (at is None):
+            raise ValueError("Exactly one of interval or at must be given")
+        if name in self.jobs:
+            raise ValueError(f"Job {name} is already registered")
+
+        job = ScheduledJob(
+            name=name,
+            func=func,
+            interval=interval,
+            at=at,
+            jitter=jitter,
+            missed_policy=MissedRunPolicy(missed_policy),
+            run_immediately=run_immediately,
+        )
+        self.jobs[name] = job
+        if self.is_running:
+            self._tasks[name] = asyncio.create_task(self._drive(job), name=f"{self.name}:{name}")
+        return job
+
+    async def start(self) -> None:
+        """Start driving all registered jobs on the current loop."""
+        if self.is_running:
+            return
+        self.is_running = True
+        for job in self.jobs.values():
+            self._tasks[job.name] = asyncio.create_task(self._drive(job), name=f"{self.name}:{job.name}")
+        logger.info(f"{self.name} started with jobs: {', '.join(self.jobs) or 'none'}")
+
+    async def stop(self) -> None:
+        """Stop scheduling and cancel in-flight runs."""
+        self.is_running = False
+        tasks = list(self._tasks.values())
+        tasks += [job.current_run for job in self.jobs.values() if job.is_running]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+        logger.info(f"{self.name} stopped")
+
+    async def run_forever(self) -> None:
+        """Start the scheduler and block until it is stopped (worker mode)."""
+        await self.start()
+        try:
+            await asyncio.gather(*self._tasks.values())
+        finally:
+            await self.stop()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Per-job schedule and runtime metrics."""
+        return {
+            "running": self.is_running,
+            "jobs": {
+                job.name: {
+                    "schedule": f"every {job.interval.total_seconds():g}s" if job.interval else f"daily at {job.at.strftime('%H:%M')}",
+                    "jitter_seconds": job.jitter,
+                    "missed_policy": job.missed_policy.value,
+                    "next_run": job.next_run.isoformat() if job.next_run else None,
+                    "in_progress": job.is_running,
+                    **job.stats.as_dict(),
+                }
+                for job in self.jobs.values()
+            },
+        }
+
+    async def _drive(self, job: ScheduledJob) -> None:
+        job.next_run = job.first_run(datetime.now())
+        while self.is_running:
+            scheduled = job.next_run
+            delay = (scheduled - datetime.now()).total_seconds() + random.uniform(0, job.jitter)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            now = datetime.now()
+            job.next_run = job.following_run(scheduled, now)
+
+            # Ticks that passed while we were not able to run
+            missed = int((now - scheduled) // job.period)
+            if missed > 0:
+                job.stats.missed_runs += missed
+                if job.missed_policy == MissedRunPolicy.SKIP:
+                    logger.warning(f"Job {job.name} missed {missed} run(s), skipping to {job.next_run:%H:%M:%S}")
+                    continue
+                logger.warning(f"Job {job.name} missed {missed} run(s), running once to catch up")
+
+            if job.is_running:
+                job.stats.overlaps_skipped += 1
+                logger.warning(f"Job {job.name} is still running, skipping this run")
+                continue
+
+            job.stats.last_lag = round(max(0.0, (now - scheduled).total_seconds()), 3)
+            job.stats.max_lag = max(job.stats.max_lag, job.stats.last_lag)
+            job.current_run = asyncio.create_task(self._execute(job), name=f"{self.name}:{job.name}:run")
+
+    async def _execute(self, job: ScheduledJob) -> None:
+        stats = job.stats
+        stats.last_started = datetime.now()
+        started = time.perf_counter()
+        try:
+            await job.func()
+            stats.last_error = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            stats.failures += 1
+            stats.last_error = str(e)
+            logger.error(f"Error running scheduled job {job.name}: {e}")
+        finally:
+            duration = time.perf_counter() - started
+            stats.runs += 1
+            stats.last_finished = datetime.now()
+            stats.last_duration = round(duration, 3)
+            stats.total_duration += duration
+            stats.max_duration = max(stats.max_duration, duration)
@@ -1,9 +1,12 @@
-from typing import List, Optional
+from typing import Any, List, Optional, Sequence
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, tuple_
 from app.models.agency import Agency
 from app.schemas.agency import AgencyCreate, AgencyUpdate
 
+# Listing order; agency_id breaks ties between equal display names
+AGENCY_KEYS = (Agency.display_name, Agency.agency_id)
+
 class AgencyCRUD:
     async def get_agency_by_id(self, db: AsyncSession, agency_id: str) -> Optional[Agency]:
         """Get agency by agency_id"""
@@ -15,13 +18,17 @@ class AgencyCRUD:
         result = await db.execute(select(Agency).where(Agency.id == id))
         return result.scalar_one_or_none()
     
-    async def get_agencies(self, db: AsyncSession, enabled_only: bool = True, skip: int = 0, limit: int = 100) -> List[Agency]:
-        """Get all agencies"""
+    async def get_agencies(
+        self, db: AsyncSession, enabled_only: bool = True, limit: int = 100, after: Optional[Sequence[Any]] = None
+    ) -> List[Agency]:
+        """Get agencies in AGENCY_KEYS order, starting after the ``after`` key values"""
         query = select(Agency)
         if enabled_only:
             query = query.where(Agency.enabled == True)
+        if after is not None:
+            query = query.where(tuple_(*AGENCY_KEYS) > tuple_(*after))
         
-        query = query.offset(skip).limit(limit).order_by(Agency.display_name)
+        query = query.order_by(*AGENCY_KEYS).limit(limit)
         result = await db.execute(query)
         return result.scalars().all()
     
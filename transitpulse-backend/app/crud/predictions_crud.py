@@ -5,17 +5,28 @@ This module handles database operations for computed arrival predictions.
 It integrates with existing real-time data sources rather than duplicating them.
 """
 
-from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Sequence
+from datetime import datetime, timedelta, timezone
+import numpy as np
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete, and_, or_, text
+from sqlalchemy import select, delete, and_, or_, text, func, tuple_
 from sqlalchemy.orm import selectinload
 
+from app.cache import service_calendars
+from app.utils.gtfs_time import AGENCY_TZ, NO_TIME, gtfs_times_to_timestamps
 from app.models.predictions import StopPrediction
 from app.models.vehicle import LiveVehiclePosition
 from app.models.gtfs_static import GTFSStopTime, GTFSTrip, GTFSStop, GTFSRoute
 from app.schemas.predictions import StopPredictionCreate, StopPredictionDisplay
 
+# Route predictions by stop, then arrival (predictions without one last); id breaks ties
+NO_ARRIVAL = datetime.max.replace(tzinfo=timezone.utc)
+ROUTE_PREDICTION_KEYS = (
+    StopPrediction.stop_id,
+    func.coalesce(StopPrediction.predicted_arrival_time, NO_ARRIVAL),
+    StopPrediction.id,
+)
+
 
 async def create_prediction(
     db: AsyncSession, 
@@ -58,9 +69,10 @@ async def get_predictions_for_stop(
 async def get_predictions_for_route(
     db: AsyncSession,
     route_id: str,
-    limit: int = 50
+    limit: int = 50,
+    after: Optional[Sequence[Any]] = None
 ) -> List[StopPrediction]:
-    """Get active predictions for all stops on a route"""
+    """Get active predictions for all stops on a route, in ROUTE_PREDICTION_KEYS order after ``after``"""
     query = select(StopPrediction).where(
         and_(
             StopPrediction.route_id == route_id,
@@ -69,10 +81,10 @@ async def get_predictions_for_route(
                 StopPrediction.expires_at > datetime.utcnow()
             )
         )
-    ).order_by(
-        StopPrediction.stop_id,
-        StopPrediction.predicted_arrival_time
-    ).limit(limit)
+    )
+    if after is not None:
+        query = query.where(tuple_(*ROUTE_PREDICTION_KEYS) > tuple_(*after))
+    query = query.order_by(*ROUTE_PREDICTION_KEYS).limit(limit)
     
     result = await db.execute(query)
     return result.scalars().all()
@@ -128,6 +140,7 @@ async def compute_predictions_from_vehicles(
     vehicle_result = await db.execute(vehicle_query)
     vehicles = vehicle_result.scalars().all()
     
+    service_calendar = await service_calendars.get()
     predictions = []
     
     for vehicle in vehicles:
@@ -152,43 +165,47 @@ async def compute_predictions_from_vehicles(
         
         # Simple prediction logic: estimate arrival times based on schedule
         # In a real implementation, this would use more sophisticated algorithms
-        current_time = datetime.utcnow()
-        
-        for stop_time in stop_times:
-            if not stop_time.arrival_time:
-                continue
-                
-            # Calculate estimated arrival (simplified approach)
-            # This should be replaced with proper prediction algorithms
-            scheduled_time = datetime.combine(current_time.date(), stop_time.arrival_time)
-            
-            # Adjust for next day if needed
-            if scheduled_time < current_time:
-                scheduled_time += timedelta(days=1)
-                
-            # Simple delay estimation (would be more sophisticated in practice)
-            estimated_delay = 0  # Default to on-time
+        current_time = datetime.now(timezone.utc)
+
+        # Schedule times count from the trip's service day: today, or yesterday
+        # for a trip still running past midnight
+        local_time = current_time.astimezone(AGENCY_TZ)
+        service_date = service_calendar.service_day(trip.service_id, local_time) if trip else None
+        if service_date is None:
+            service_date = local_time.date()
+
+        # Scheduled arrivals of the whole trip as Unix timestamps at once
+        arrivals = gtfs_times_to_timestamps(
+            [NO_TIME if st.arrival_time is None else st.arrival_time for st in stop_times], service_date
+        )
+
+        # Simple delay estimation (would be more sophisticated in practice)
+        estimated_delay = 0  # Default to on-time
+
+        # Only create predictions for future arrivals
+        upcoming = np.flatnonzero((arrivals != NO_TIME) & (arrivals + estimated_delay > current_time.timestamp()))
+
+        for i in upcoming:
+            stop_time = stop_times[i]
+            scheduled_time = datetime.fromtimestamp(int(arrivals[i]), timezone.utc)
             predicted_time = scheduled_time + timedelta(seconds=estimated_delay)
-            
-            # Only create predictions for future arrivals
-            if predicted_time > current_time:
-                prediction = StopPrediction(
-                    stop_id=stop_time.stop_id,
-                    route_id=vehicle.route_id,
-                    trip_id=vehicle.trip_id,
-                    vehicle_id=vehicle.vehicle_id,
-                    predicted_arrival_time=predicted_time,
-                    scheduled_arrival_time=scheduled_time,
-                    arrival_delay_seconds=estimated_delay,
-                    confidence_level=0.7,  # Medium confidence for computed predictions
-                    prediction_source='computed',
-                    is_real_time=True,
-                    headsign=trip.trip_headsign if trip else None,
-                    direction_id=trip.direction_id if trip else None,
-                    stop_sequence=stop_time.stop_sequence,
-                    expires_at=current_time + timedelta(minutes=30)  # Expire in 30 minutes
-                )
-                predictions.append(prediction)
+            prediction = StopPrediction(
+                stop_id=stop_time.stop_id,
+                route_id=vehicle.route_id,
+                trip_id=vehicle.trip_id,
+                vehicle_id=vehicle.vehicle_id,
+                predicted_arrival_time=predicted_time,
+                scheduled_arrival_time=scheduled_time,
+                arrival_delay_seconds=estimated_delay,
+                confidence_level=0.7,  # Medium confidence for computed predictions
+                prediction_source='computed',
+                is_real_time=True,
+                headsign=trip.trip_headsign if trip else None,
+                direction_id=trip.direction_id if trip else None,
+                stop_sequence=stop_time.stop_sequence,
+                expires_at=current_time + timedelta(minutes=30)  # Expire in 30 minutes
+            )
+            predictions.append(prediction)
     
     return predictions
 
@@ -1,7 +1,7 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.dialects.postgresql import insert
-from app.models.vehicle import LiveVehiclePosition
+from app.models.vehicle import LiveTripUpdates, LiveVehiclePosition
 from typing import List, Optional
 from datetime import datetime
 
@@ -140,6 +140,27 @@ async def bulk_create_or_update_vehicle_positions(
     await db.execute(stmt)
     await db.commit()
 
+async def replace_trip_updates(db: AsyncSession, agency_key: str, updates: List[dict]) -> None:
+    """
+    Store the latest trip updates of an agency, replacing the previous ones.
+    
+    Args:
+        db: AsyncSession - Database session
+        agency_key: str - Agency the updates belong to
+        updates: List[dict] - Trip updates as returned by fetch_trip_updates
+    """
+    stmt = insert(LiveTripUpdates).values(agency_key=agency_key, fetched_at=datetime.utcnow(), updates=updates)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['agency_key'],
+        set_={
+            'fetched_at': stmt.excluded.fetched_at,
+            'updates': stmt.excluded.updates
+        }
+    )
+    
+    await db.execute(stmt)
+    await db.commit()
+
 async def delete_old_vehicle_positions(db: AsyncSession, older_than_minutes: int = 30) -> int:
     """
     Delete vehicle positions older than specified minutes.
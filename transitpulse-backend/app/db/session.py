@@ -1,11 +1,12 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
 from typing import AsyncGenerator
-from app.core.config import settings
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+# One set of pools for the whole process; see app.core.database
+from app.core.database import engine
+
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with async_session() as session:
-        yield session
\ No newline at end of file
+        yield session
@@ -5,8 +5,16 @@ import sys
 import os
 import traceback
 import asyncio
+from typing import Optional
+from app.core.config import settings
+from app.core.compression import CompressionMiddleware
+from app.core.database import pool_metrics, read_router
+from app.core.responses import FastJSONResponse, FastJSONRoute
 from app.websocket.manager import manager
-from app.api.endpoints import gtfs as gtfs_router
+from app.core.leader import LeaderElector
+from app.realtime.interpolation import interpolation_engine
+from data_ingestion.auto_gtfs_updater import auto_updater
+from scheduler import TransitPulseScheduler
 
 # Import routers
 try:
@@ -34,8 +42,10 @@ print("="*50 + "\n", file=sys.stderr)
 app = FastAPI(
     title="TransitPulse API",
     description="API for TransitPulse real-time transit data",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
+app.router.route_class = FastJSONRoute
 
 # Get allowed origins from environment variable or default to localhost:3002
 ALLOWED_ORIGINS = os.getenv(
@@ -52,37 +62,93 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip/brotli for large JSON responses; cached payloads arrive precompressed and pass through
+app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MINIMUM_SIZE)
+
+# Ingestion jobs share this process's connection pools and caches
+ingestion_scheduler = TransitPulseScheduler()
+leader_elector = LeaderElector(
+    on_elected=ingestion_scheduler.start,
+    on_demoted=ingestion_scheduler.stop_scheduler
+)
+
 # WebSocket endpoint for real-time vehicle updates
 @app.websocket("/ws/vehicles/{route_id}")
-async def websocket_endpoint(websocket: WebSocket, route_id: str):
-    await manager.connect(websocket, route_id)
+async def websocket_endpoint(
+    websocket: WebSocket,
+    route_id: str,
+    agency: str = "golden_gate",
+    since: Optional[int] = None,
+    encoding: str = "json"
+):
+    # Starts with the route's current state (or the changes since `since`), then deltas
+    await manager.connect(websocket, route_id, agency, since, encoding)
     try:
         while True:
             # Keep connection alive
             await asyncio.sleep(10)
-            await websocket.send_json({"type": "ping", "message": "Connection alive"})
+            await manager.send(websocket, {"type": "ping", "message": "Connection alive"})
     except Exception as e:
         print(f"WebSocket error: {e}")
     finally:
         await manager.disconnect(websocket, route_id)
 
-# Background task to simulate vehicle updates (replace with real data source)
+# WebSocket endpoint for several routes and/or a map viewport over one connection
+@app.websocket("/ws/vehicles")
+async def websocket_subscriptions(websocket: WebSocket, agency: str = "golden_gate", encoding: str = "json"):
+    feed_info = auto_updater.gtfs_feeds.get(agency)
+    if feed_info is None:
+        await websocket.close(code=1008)  # Unknown agency
+        return
+    await manager.serve_subscriber(websocket, agency, encoding, feed_info["agency_id"])
+
+# Background tasks for real-time vehicle updates
 @app.on_event("startup")
 async def startup_event():
-    from app.api.endpoints.gtfs import simulate_vehicle_updates
-    from app.websocket.manager import manager
-    from data_ingestion.auto_gtfs_updater import auto_updater
-    
-    # Start the vehicle simulation (for demo routes without real data)
-    asyncio.create_task(simulate_vehicle_updates(manager))
-    
-    # Start automated GTFS data updates
-    asyncio.create_task(auto_updater.start_realtime_updates(["golden_gate"]))
-    
-    # Trigger initial static data update if needed
-    asyncio.create_task(auto_updater.update_static_data("golden_gate"))
+    # Subscribe to websocket fan-out so this worker relays broadcasts from any worker
+    await manager.start()
+
+    # Smooth 1 Hz positions between feed updates for this worker's websocket clients
+    await interpolation_engine.start()
     
-    print("🚀 Started automated GTFS updates and real-time vehicle tracking", file=sys.stderr)
+    # Start automated GTFS data updates (static load runs immediately on start).
+    # With leader election only one worker ingests; the others follow its snapshots.
+    if settings.SCHEDULER_MODE == "embedded":
+        if settings.LEADER_ELECTION_ENABLED:
+            await leader_elector.start()
+            asyncio.create_task(auto_updater.start_follower_refresh(
+                ingestion_scheduler.agencies, is_follower=lambda: not leader_elector.is_leader
+            ))
+            print("🗳️ Campaigning for ingestion leadership", file=sys.stderr)
+        else:
+            await ingestion_scheduler.start()
+            print("🚀 Started automated GTFS updates and real-time vehicle tracking", file=sys.stderr)
+    else:
+        # A separate scheduler worker ingests; serve its snapshots from the database
+        asyncio.create_task(auto_updater.start_follower_refresh(ingestion_scheduler.agencies))
+        print(f"ℹ️ Ingestion jobs not started (SCHEDULER_MODE={settings.SCHEDULER_MODE})", file=sys.stderr)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await leader_elector.stop()
+    if ingestion_scheduler.is_running:
+        await ingestion_scheduler.stop_scheduler()
+    await interpolation_engine.stop()
+    await manager.stop()
+
+@app.get("/debug/scheduler")
+async def debug_scheduler():
+    """Per-job duration and lag metrics of the embedded ingestion scheduler"""
+    return {
+        "mode": settings.SCHEDULER_MODE,
+        "leader_election": leader_elector.status(),
+        **ingestion_scheduler.metrics()
+    }
+
+@app.get("/debug/db-pool")
+async def debug_db_pool():
+    """Checkout wait time and saturation of the connection pools, and where reads are routed"""
+    return {"pools": pool_metrics(), "read_routing": read_router.status()}
 
 @app.get("/")
 async def root():
@@ -103,14 +169,12 @@ try:
     from app.api import api_router
     app.include_router(api_router, prefix="/api/v1")
     
-    # Import and include additional routers
-    from .api.endpoints.shapes_router import router as shapes_router
+    # Include the additional routers imported above
     app.include_router(shapes_router, prefix="/api/v1", tags=["shapes"])
     
     from .api.endpoints.traffic import router as traffic_router
     app.include_router(traffic_router, prefix="/api/v1")
     
-    from .api.endpoints.analytics import router as analytics_router
     app.include_router(analytics_router, prefix="/api/v1", tags=["analytics"])
     
     print("✅ Successfully registered all API routers", file=sys.stderr)
@@ -16,6 +16,9 @@ __all__ = [
     'GTFSStopTime',
     'GTFSCalendar',
     'GTFSCalendarDate',
+    'StaticFeedVersion',
+    'StaticFeedArtifact',
     'LiveVehiclePosition',
+    'LiveTripUpdates',
     'StopPrediction'
 ]
\ No newline at end of file
@@ -1,9 +1,11 @@
-from sqlalchemy import Column, String, Float, Integer, Text, Time, Date
+from sqlalchemy import Column, String, Float, Integer, Text, Date, DateTime, Index, LargeBinary
+from datetime import datetime
 from app.core.base import Base
 
 # GTFS Static Models
 class GTFSRoute(Base):
     __tablename__ = "gtfs_routes"
+    agency_key = Column(String)  # Feed the row was loaded from; a load replaces only its own rows
     route_id = Column(String, primary_key=True, index=True)
     agency_id = Column(String, index=True)
     route_short_name = Column(String)
@@ -16,6 +18,7 @@ class GTFSRoute(Base):
 
 class GTFSStop(Base):
     __tablename__ = "gtfs_stops"
+    agency_key = Column(String)  # Feed the row was loaded from; a load replaces only its own rows
     stop_id = Column(String, primary_key=True, index=True)
     stop_code = Column(String)
     stop_name = Column(String)
@@ -30,17 +33,25 @@ class GTFSStop(Base):
 
 class GTFSShape(Base):
     __tablename__ = "gtfs_shapes"
+    agency_key = Column(String)  # Feed the row was loaded from; a load replaces only its own rows
     id = Column(Integer, primary_key=True, autoincrement=True) # Auto-incrementing ID
-    shape_id = Column(String, index=True)
+    shape_id = Column(String)  # Leading column of idx_gtfs_shapes_shape_sequence
     shape_pt_lat = Column(Float)
     shape_pt_lon = Column(Float)
     shape_pt_sequence = Column(Integer)
     shape_dist_traveled = Column(Float)
 
+    __table_args__ = (
+        # Points of a shape in order (shape listing and its keyset pages)
+        Index('idx_gtfs_shapes_shape_sequence', 'shape_id', 'shape_pt_sequence', 'id',
+              postgresql_include=['shape_pt_lat', 'shape_pt_lon']),
+    )
+
 class GTFSTrip(Base):
     __tablename__ = "gtfs_trips"
+    agency_key = Column(String)  # Feed the row was loaded from; a load replaces only its own rows
     trip_id = Column(String, primary_key=True, index=True)
-    route_id = Column(String, index=True)
+    route_id = Column(String)  # Leading column of idx_gtfs_trips_route_service
     service_id = Column(String, index=True)
     trip_headsign = Column(String)
     trip_short_name = Column(String)
@@ -50,12 +61,20 @@ class GTFSTrip(Base):
     wheelchair_accessible = Column(Integer)
     bikes_allowed = Column(Integer)
 
+    __table_args__ = (
+        # Trips of a route on the services running on a date (schedules)
+        Index('idx_gtfs_trips_route_service', 'route_id', 'service_id',
+              postgresql_include=['direction_id', 'trip_headsign']),
+    )
+
 class GTFSStopTime(Base):
     __tablename__ = "gtfs_stop_times"
+    agency_key = Column(String)  # Feed the row was loaded from; a load replaces only its own rows
     id = Column(Integer, primary_key=True, autoincrement=True)
-    trip_id = Column(String, index=True)
-    arrival_time = Column(Time)
-    departure_time = Column(Time)
+    trip_id = Column(String)  # Leading column of the composite indexes below
+    # Seconds from noon minus 12h of the service day; past 86400 after midnight
+    arrival_time = Column(Integer)
+    departure_time = Column(Integer)
     stop_id = Column(String, index=True)
     stop_sequence = Column(Integer)
     stop_headsign = Column(String)
@@ -63,8 +82,18 @@ class GTFSStopTime(Base):
     drop_off_type = Column(Integer)
     shape_dist_traveled = Column(Float)
 
+    __table_args__ = (
+        # A trip's stop times in order, and stop counts per trip, from the index alone
+        Index('idx_gtfs_stop_times_trip_sequence', 'trip_id', 'stop_sequence',
+              postgresql_include=['stop_id', 'arrival_time', 'departure_time']),
+        # Sequence of a given stop on a trip (vehicle progress)
+        Index('idx_gtfs_stop_times_trip_stop', 'trip_id', 'stop_id',
+              postgresql_include=['stop_sequence']),
+    )
+
 class GTFSCalendar(Base):
     __tablename__ = "gtfs_calendar"
+    agency_key = Column(String)  # Feed the row was loaded from; a load replaces only its own rows
     service_id = Column(String, primary_key=True, index=True)
     monday = Column(Integer)
     tuesday = Column(Integer)
@@ -78,7 +107,23 @@ class GTFSCalendar(Base):
 
 class GTFSCalendarDate(Base):
     __tablename__ = "gtfs_calendar_dates"
+    agency_key = Column(String)  # Feed the row was loaded from; a load replaces only its own rows
     id = Column(Integer, primary_key=True, autoincrement=True)
     service_id = Column(String, index=True)
     date = Column(Date)
     exception_type = Column(Integer)
+
+# Feed version loaded for each agency, written in the same transaction as the tables
+class StaticFeedVersion(Base):
+    __tablename__ = "static_feed_versions"
+    agency_key = Column(String, primary_key=True)
+    version = Column(String)  # sha256 of the feed archive, None when unknown
+    loaded_at = Column(DateTime, default=datetime.utcnow)
+
+# Structures derived from the static tables, built once by the ingestion leader
+class StaticFeedArtifact(Base):
+    __tablename__ = "static_feed_artifacts"
+    name = Column(String, primary_key=True)
+    feed_version = Column(String)  # Loaded feed versions it was built from, as agency=sha256 pairs
+    built_at = Column(DateTime, default=datetime.utcnow)
+    data = Column(LargeBinary)
@@ -1,11 +1,11 @@
-from sqlalchemy import Column, String, Float, Integer, DateTime
+from sqlalchemy import Column, String, Float, Integer, DateTime, Index, JSON
 from app.core.base import Base
 from datetime import datetime
 
 class LiveVehiclePosition(Base):
     __tablename__ = "live_vehicle_positions"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+    timestamp = Column(DateTime, default=datetime.utcnow)  # See idx_live_vehicle_positions_recent
     vehicle_id = Column(String, index=True, unique=True) # Unique per vehicle for current position
     trip_id = Column(String, index=True)
     route_id = Column(String, index=True)
@@ -16,4 +16,18 @@ class LiveVehiclePosition(Base):
     current_status = Column(Integer) # e.g., IN_TRANSIT_TO (from GTFS-RT enum)
     congestion_level = Column(Integer) # (from GTFS-RT enum)
     occupancy_status = Column(Integer) # (from GTFS-RT enum)
-    stop_id = Column(String, nullable=True) # Last stop ID vehicle passed/is at
\ No newline at end of file
+    stop_id = Column(String, nullable=True) # Last stop ID vehicle passed/is at
+    __table_args__ = (
+        # Positions reported within a time window, with the columns the
+        # active-trip and fleet queries join and group on
+        Index('idx_live_vehicle_positions_recent', 'timestamp',
+              postgresql_include=['vehicle_id', 'trip_id', 'route_id']),
+    )
+
+
+class LiveTripUpdates(Base):
+    """Latest GTFS-RT trip updates of an agency, as fetched by the ingestion leader."""
+    __tablename__ = "live_trip_updates"
+    agency_key = Column(String, primary_key=True)
+    fetched_at = Column(DateTime, default=datetime.utcnow)
+    updates = Column(JSON)  # List of trip update dicts, as returned by fetch_trip_updates
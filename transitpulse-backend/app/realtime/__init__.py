@@ -0,0 +1,16 @@
+# Realtime vehicle snapshots shared across endpoints and workers
+from .snapshot import VehicleSnapshotStore, snapshot_store
+from .notifier import SnapshotNotifier, snapshot_notifier
+from .payloads import RealtimePayloadBuilder, realtime_payloads
+from .dashboard import DashboardSnapshotBuilder, dashboard_snapshots
+
+__all__ = [
+    'VehicleSnapshotStore',
+    'snapshot_store',
+    'SnapshotNotifier',
+    'snapshot_notifier',
+    'RealtimePayloadBuilder',
+    'realtime_payloads',
+    'DashboardSnapshotBuilder',
+    'dashboard_snapshots',
+]
@@ -0,0 +1,202 @@
+"""
+Pre-joined dashboard snapshot
+
+The dashboard views need the same thing: every route with its live vehicle
+count, the headsigns being served and how far off schedule the vehicles are.
+Instead of each browser tab fetching the full fleet and the route list and
+joining them itself, the summary is built here once per snapshot sequence
+from memory (vehicles from the shared snapshot, delays from the cached
+GTFS-RT trip updates, route names from a route list loaded once per static
+feed version) and every caller gets the same serialized bytes. It is
+rebuilt when the snapshot sequence, the trip updates or the static feed
+change, and tagged with a digest of those bytes, so the tag changes exactly
+when the content does, across restarts and leader changes.
+"""
+
+import asyncio
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.cache import static_feed_versions, trip_updates_cache
+from app.core.database import SessionLocal
+from app.core.responses import dumps
+from app.models.gtfs_static import GTFSRoute
+from app.realtime.payloads import RealtimePayloadBuilder, realtime_payloads
+
+logger = logging.getLogger(__name__)
+
+# Same thresholds as the trip detail stop status
+LATE_SECONDS = 300
+EARLY_SECONDS = -180
+
+
+def delay_stats(delays: List[int]) -> Dict[str, Any]:
+    """Schedule adherence of the vehicles that report a delay."""
+    early = sum(1 for d in delays if d < EARLY_SECONDS)
+    late = sum(1 for d in delays if d > LATE_SECONDS)
+    on_time = len(delays) - early - late
+    return {
+        "tracked": len(delays),
+        "early": early,
+        "on_time": on_time,
+        "late": late,
+        "average_delay_seconds": round(sum(delays) / len(delays)) if delays else None,
+        "max_delay_seconds": max(delays) if delays else None,
+        "on_time_percentage": round(on_time / len(delays) * 100, 1) if delays else None,
+    }
+
+
+class DashboardSnapshotBuilder:
+    """Builds and caches the serialized dashboard summary per snapshot sequence and trip updates."""
+
+    def __init__(self, payloads: RealtimePayloadBuilder = realtime_payloads, trip_updates=trip_updates_cache):
+        self.payloads = payloads
+        self.trip_updates = trip_updates
+        # agency -> route metadata, reloaded when a new static feed is loaded
+        self._routes: Dict[str, List[Dict[str, Any]]] = {}
+        # agency -> (seq, trip updates it was built from, etag, serialized summary)
+        self._cache: Dict[str, Tuple[int, Dict[str, Dict], str, bytes]] = {}
+        self._building: Dict[Tuple[str, int, int], asyncio.Task] = {}
+        static_feed_versions.on_change(self._static_changed)
+
+    async def serialized(self, agency_key: str = "golden_gate") -> Tuple[int, str, bytes]:
+        """The summary as JSON bytes, with the sequence it reflects and its ETag."""
+        seq = self.payloads.store.seq(agency_key)
+        updates = await self._trip_updates(agency_key)
+        cached = self._cache.get(agency_key)
+        if cached and cached[0] == seq and cached[1] is updates:
+            return cached[0], cached[2], cached[3]
+
+        key = (agency_key, seq, id(updates))
+        task = self._building.get(key)
+        if task is None:
+            task = self._building[key] = asyncio.create_task(self._build(agency_key, updates))
+            task.add_done_callback(lambda _: self._building.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def summary(self, agency_key: str = "golden_gate",
+                      updates: Optional[Dict[str, Dict]] = None) -> Dict[str, Any]:
+        snapshot = self.payloads.store.get(agency_key)
+        seq, timestamp = snapshot.seq, snapshot.timestamp
+        vehicles = await self.payloads.vehicles(agency_key)
+        if updates is None:
+            updates = await self._trip_updates(agency_key)
+        routes = await self._route_list(agency_key)
+
+        by_route: Dict[str, Dict[str, Any]] = {}
+        for vehicle in vehicles:
+            route_id = vehicle.get("route_id")
+            if not route_id:
+                continue
+            entry = by_route.setdefault(route_id, {"vehicles": 0, "directions": {}, "headsigns": set(), "delays": []})
+            entry["vehicles"] += 1
+            direction = vehicle.get("direction_name") or "Unknown"
+            entry["directions"][direction] = entry["directions"].get(direction, 0) + 1
+            if vehicle.get("headsign"):
+                entry["headsigns"].add(vehicle["headsign"])
+            delay = self._delay(updates.get(vehicle.get("trip_id")))
+            if delay is not None:
+                entry["delays"].append(delay)
+
+        route_rows = []
+        known = set()
+        for route in routes:
+            known.add(route["route_id"])
+            route_rows.append(self._route_row(route, by_route.get(route["route_id"])))
+        # Vehicles on routes missing from the static feed still show up
+        for route_id in sorted(by_route.keys() - known):
+            route_rows.append(self._route_row({"route_id": route_id}, by_route[route_id]))
+        route_rows.sort(key=lambda r: (-r["active_vehicles"], r["route_short_name"] or r["route_id"]))
+
+        all_delays = [d for entry in by_route.values() for d in entry["delays"]]
+        return {
+            "status": "success",
+            "message": f"{len(vehicles)} active vehicles on {len(by_route)} routes",
+            "data": {
+                "totals": {
+                    "active_vehicles": len(vehicles),
+                    "active_routes": len(by_route),
+                    "routes": len(route_rows),
+                    **delay_stats(all_delays),
+                },
+                "routes": route_rows,
+            },
+            "last_updated": (timestamp or datetime.now()).isoformat(),
+            "agency": agency_key,
+            "seq": seq,
+        }
+
+    async def _trip_updates(self, agency_key: str) -> Dict[str, Dict]:
+        try:
+            return await asyncio.wait_for(self.trip_updates.get(agency_key), timeout=5.0)
+        except Exception as e:
+            logger.warning(f"Dashboard snapshot without trip updates for {agency_key}: {e}")
+            return {}
+
+    async def _build(self, agency_key: str, updates: Dict[str, Dict]) -> Tuple[int, str, bytes]:
+        summary = await self.summary(agency_key, updates)
+        body = dumps(summary)
+        etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        self._cache[agency_key] = (summary["seq"], updates, etag, body)
+        return summary["seq"], etag, body
+
+    @staticmethod
+    def _delay(update: Optional[Dict[str, Any]]) -> Optional[int]:
+        """Trip delay, else the delay at the first stop that reports one."""
+        if not update:
+            return None
+        if update.get("delay") is not None:
+            return update["delay"]
+        for stop in update.get("stop_time_updates") or ():
+            delay = stop.get("arrival_delay")
+            if delay is None:
+                delay = stop.get("departure_delay")
+            if delay is not None:
+                return delay
+        return None
+
+    @staticmethod
+    def _route_row(route: Dict[str, Any], live: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        live = live or {"vehicles": 0, "directions": {}, "headsigns": (), "delays": []}
+        return {
+            "route_id": route["route_id"],
+            "route_short_name": route.get("route_short_name"),
+            "route_long_name": route.get("route_long_name"),
+            "route_color": route.get("route_color"),
+            "route_text_color": route.get("route_text_color"),
+            "active_vehicles": live["vehicles"],
+            "directions": live["directions"],
+            "headsigns": sorted(live["headsigns"]),
+            **delay_stats(live["delays"]),
+        }
+
+    async def _route_list(self, agency_key: str) -> List[Dict[str, Any]]:
+        routes = self._routes.get(agency_key)
+        if routes is not None:
+            return routes
+        try:
+            async with SessionLocal() as db:
+                result = await db.execute(
+                    select(
+                        GTFSRoute.route_id, GTFSRoute.route_short_name, GTFSRoute.route_long_name,
+                        GTFSRoute.route_color, GTFSRoute.route_text_color,
+                    ).where(GTFSRoute.route_type == 3)
+                )
+                routes = [dict(row._mapping) for row in result]
+        except Exception as e:
+            logger.warning(f"Could not load routes for the dashboard: {e}")
+            return []
+        self._routes[agency_key] = routes
+        return routes
+
+    def _static_changed(self, agency_key: str, version: Optional[str]) -> None:
+        self._routes.pop(agency_key, None)
+        self._cache.pop(agency_key, None)
+
+
+# Process-wide dashboard snapshot builder
+dashboard_snapshots = DashboardSnapshotBuilder()
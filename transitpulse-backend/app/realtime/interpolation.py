@@ -0,0 +1,288 @@
+"""
+Dead-reckoning interpolation between realtime feed updates
+
+The upstream feed reports each vehicle every 30 seconds. Between fixes the
+engine advances every moving vehicle along its trip's shape at its last
+reported speed and sends the interpolated position to this worker's websocket
+clients once per second. Dead reckoning runs from the time the vehicle itself
+reported the fix, not from when the snapshot was ingested. When the next real
+fix arrives the vehicle snaps to it and dead reckoning restarts from there; a
+vehicle the feed repeats unchanged keeps its track, since its clients were
+sent nothing new to snap to. A vehicle whose fix is older than
+``max_extrapolation`` seconds is no longer sent at all, rather than repeated
+at the position where extrapolation stopped.
+
+Everything runs from memory: positions come from the shared snapshot, shapes
+are read from the static tables once per static feed version and cached, and nothing is written back
+or fetched from the feed. Interpolated updates are derived data, so each
+worker computes them for its own clients instead of fanning them out.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from app.cache import static_feed_versions
+from app.core.database import SessionLocal
+from app.models.gtfs_static import GTFSShape, GTFSTrip
+from app.realtime.snapshot import VehicleSnapshotStore, snapshot_store
+from app.websocket.manager import ConnectionManager, manager
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371000.0
+
+
+class ShapeGeometry:
+    """A shape polyline with cumulative distances, in a local metric projection."""
+
+    def __init__(self, lats: np.ndarray, lons: np.ndarray):
+        self.lat0 = float(np.radians(lats.mean()))
+        # Equirectangular projection around the shape: accurate to well under
+        # a metre over the extent of a transit route
+        self.x = np.radians(lons) * math.cos(self.lat0) * EARTH_RADIUS_M
+        self.y = np.radians(lats) * EARTH_RADIUS_M
+        segment_lengths = np.hypot(np.diff(self.x), np.diff(self.y))
+        self.distances = np.concatenate(([0.0], np.cumsum(segment_lengths)))
+        self.length = float(self.distances[-1])
+
+    def project(self, lat: float, lon: float) -> Tuple[float, float]:
+        """Distance along the shape of the closest point, and the offset from it (metres)."""
+        px = math.radians(lon) * math.cos(self.lat0) * EARTH_RADIUS_M
+        py = math.radians(lat) * EARTH_RADIUS_M
+        x0, y0 = self.x[:-1], self.y[:-1]
+        dx, dy = np.diff(self.x), np.diff(self.y)
+        lengths_sq = dx * dx + dy * dy
+        with np.errstate(invalid="ignore", divide="ignore"):
+            t = np.clip(((px - x0) * dx + (py - y0) * dy) / lengths_sq, 0.0, 1.0)
+        t = np.nan_to_num(t)
+        offsets = np.hypot(x0 + t * dx - px, y0 + t * dy - py)
+        i = int(np.argmin(offsets))
+        return float(self.distances[i] + t[i] * math.sqrt(lengths_sq[i])), float(offsets[i])
+
+    def point_at(self, distance: float) -> Tuple[float, float, float]:
+        """Latitude, longitude and bearing (degrees) at a distance along the shape."""
+        distance = min(max(distance, 0.0), self.length)
+        i = int(np.searchsorted(self.distances, distance, side="right")) - 1
+        i = min(max(i, 0), len(self.distances) - 2)
+        span = self.distances[i + 1] - self.distances[i]
+        t = (distance - self.distances[i]) / span if span > 0 else 0.0
+        x = self.x[i] + t * (self.x[i + 1] - self.x[i])
+        y = self.y[i] + t * (self.y[i + 1] - self.y[i])
+        bearing = math.degrees(math.atan2(self.x[i + 1] - self.x[i], self.y[i + 1] - self.y[i])) % 360
+        lat = math.degrees(y / EARTH_RADIUS_M)
+        lon = math.degrees(x / (EARTH_RADIUS_M * math.cos(self.lat0)))
+        return lat, lon, bearing
+
+
+class ShapeCache:
+    """Trip shapes loaded from the static tables on first use, until the next static feed load."""
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self.trip_shapes: Dict[str, Optional[str]] = {}
+        self.shapes: Dict[str, Optional[ShapeGeometry]] = {}
+        static_feed_versions.on_change(lambda agency_key, version: self.clear())
+
+    async def for_trips(self, trip_ids: Iterable[str]) -> Dict[str, ShapeGeometry]:
+        wanted = {trip_id for trip_id in trip_ids if trip_id}
+        missing_trips = wanted - self.trip_shapes.keys()
+        try:
+            async with self.session_factory() as db:
+                if missing_trips:
+                    result = await db.execute(
+                        select(GTFSTrip.trip_id, GTFSTrip.shape_id).where(GTFSTrip.trip_id.in_(missing_trips))
+                    )
+                    for row in result:
+                        self.trip_shapes[row.trip_id] = row.shape_id
+
+                missing_shapes = {
+                    self.trip_shapes[t] for t in wanted
+                    if self.trip_shapes.get(t) and self.trip_shapes[t] not in self.shapes
+                }
+                if missing_shapes:
+                    result = await db.execute(
+                        select(GTFSShape.shape_id, GTFSShape.shape_pt_lat, GTFSShape.shape_pt_lon)
+                        .where(GTFSShape.shape_id.in_(missing_shapes))
+                        .order_by(GTFSShape.shape_id, GTFSShape.shape_pt_sequence)
+                    )
+                    points: Dict[str, List[Tuple[float, float]]] = {}
+                    for row in result:
+                        points.setdefault(row.shape_id, []).append((row.shape_pt_lat, row.shape_pt_lon))
+                    for shape_id in missing_shapes:
+                        coords = np.array(points.get(shape_id, []), dtype=float)
+                        self.shapes[shape_id] = (
+                            ShapeGeometry(coords[:, 0], coords[:, 1]) if len(coords) >= 2 else None
+                        )
+        except Exception as e:
+            logger.warning(f"Could not load trip shapes for interpolation: {e}")
+
+        found = {}
+        for trip_id in wanted:
+            shape = self.shapes.get(self.trip_shapes.get(trip_id))
+            if shape is not None:
+                found[trip_id] = shape
+        return found
+
+    def clear(self) -> None:
+        self.trip_shapes.clear()
+        self.shapes.clear()
+
+
+@dataclass
+class Track:
+    """Dead-reckoning state of one vehicle since its last real fix."""
+    vehicle: Dict
+    shape: ShapeGeometry
+    fix_distance: float
+    fix_time: float
+    speed: float  # m/s
+
+
+class InterpolationEngine:
+    """Emits 1 Hz interpolated vehicle positions between real feed fixes."""
+
+    def __init__(
+        self,
+        agencies: Optional[List[str]] = None,
+        store: VehicleSnapshotStore = snapshot_store,
+        connections: ConnectionManager = manager,
+        shapes: Optional[ShapeCache] = None,
+        interval: float = 1.0,
+        max_extrapolation: float = 60.0,
+        max_offset: float = 150.0,
+        min_speed: float = 0.5,
+    ):
+        self.agencies = agencies or ["golden_gate"]
+        self.store = store
+        self.manager = connections
+        self.shapes = shapes or ShapeCache()
+        self.interval = interval
+        # Stop sending a vehicle this many seconds after its fix (a missed fix should not run it away)
+        self.max_extrapolation = max_extrapolation
+        # Fixes further than this (metres) from the trip's shape are not interpolated
+        self.max_offset = max_offset
+        self.min_speed = min_speed
+        self.tracks: Dict[str, Dict[str, Track]] = {}
+        self._seen_seq: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        # Re-project the tracks onto the new feed's shapes on the next tick
+        static_feed_versions.on_change(lambda agency_key, version: self._seen_seq.pop(agency_key, None))
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="vehicle-interpolation")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.monotonic()
+            try:
+                if self.manager.has_clients():
+                    for agency_key in self.agencies:
+                        await self.tick(agency_key, started)
+            except Exception as e:
+                logger.error(f"Error interpolating vehicle positions: {e}")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    async def tick(self, agency_key: str, now: float) -> None:
+        """Resync tracks on a new snapshot, then send one interpolated frame."""
+        snapshot = self.store.get(agency_key)
+        if self._seen_seq.get(agency_key) != snapshot.seq:
+            # Vehicles without a usable fix time count from when the snapshot was taken
+            age = (datetime.now() - snapshot.timestamp).total_seconds() if snapshot.timestamp else 0.0
+            await self._resync(agency_key, snapshot.vehicles, now, now - max(age, 0.0))
+            self._seen_seq[agency_key] = snapshot.seq
+            return  # The real fixes were just broadcast; start moving from the next tick
+
+        tracks = self.tracks.get(agency_key, {})
+        by_route: Dict[str, List[dict]] = {}
+        for vehicle_id, track in list(tracks.items()):
+            if now - track.fix_time > self.max_extrapolation:
+                # The fix is stale; leave the vehicle at its last real position
+                del tracks[vehicle_id]
+                continue
+            position = self.position(track, now)
+            if position is None:
+                continue
+            lat, lon, bearing = position
+            by_route.setdefault(track.vehicle["route_id"], []).append({
+                "type": "vehicle_update",
+                "data": {
+                    **track.vehicle,
+                    "latitude": round(lat, 6),
+                    "longitude": round(lon, 6),
+                    "bearing": round(bearing, 1),
+                    "interpolated": True,
+                },
+            })
+        for route_id, messages in by_route.items():
+            await self.manager.broadcast_local(route_id, messages)
+
+    def position(self, track: Track, now: float) -> Optional[Tuple[float, float, float]]:
+        elapsed = now - track.fix_time
+        if elapsed <= 0 or elapsed > self.max_extrapolation:
+            return None
+        return track.shape.point_at(track.fix_distance + track.speed * elapsed)
+
+    @staticmethod
+    def _fix_time(vehicle: Dict, now: float, default: float) -> float:
+        """The vehicle's reported fix time on the monotonic clock ``now`` is read from."""
+        try:
+            reported = datetime.fromisoformat(vehicle["timestamp"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return default
+        return now - max(time.time() - reported, 0.0)
+
+    async def _resync(self, agency_key: str, vehicles: Dict[str, Dict], now: float, snapshot_time: float) -> None:
+        previous = self.tracks.get(agency_key, {})
+        moving = {
+            vehicle_id: vehicle for vehicle_id, vehicle in vehicles.items()
+            if vehicle.get("route_id") and vehicle.get("trip_id")
+            and vehicle.get("latitude") is not None and vehicle.get("longitude") is not None
+            and (vehicle.get("speed") or 0) >= self.min_speed
+        }
+        shapes = await self.shapes.for_trips(v["trip_id"] for v in moving.values())
+
+        tracks = {}
+        for vehicle_id, vehicle in moving.items():
+            shape = shapes.get(vehicle["trip_id"])
+            if shape is None:
+                continue
+            track = previous.get(vehicle_id)
+            if track is not None and track.shape is shape and self._same_fix(track.vehicle, vehicle):
+                # The fix has not advanced and was not re-sent: carry on from the original fix
+                # instead of jumping back to it, so a stale vehicle still ages out
+                tracks[vehicle_id] = track
+                continue
+            fix_time = self._fix_time(vehicle, now, snapshot_time)
+            if now - fix_time > self.max_extrapolation:
+                continue
+            distance, offset = shape.project(vehicle["latitude"], vehicle["longitude"])
+            if offset > self.max_offset:
+                continue
+            tracks[vehicle_id] = Track(
+                vehicle=vehicle, shape=shape, fix_distance=distance, fix_time=fix_time, speed=float(vehicle["speed"])
+            )
+        self.tracks[agency_key] = tracks
+
+    @staticmethod
+    def _same_fix(old: Dict, new: Dict) -> bool:
+        """Whether the feed repeated a vehicle without a change its clients would be sent."""
+        return all(old.get(name) == new.get(name) for name in VehicleSnapshotStore.TRACKED_FIELDS)
+
+
+# Process-wide interpolation engine
+interpolation_engine = InterpolationEngine()
@@ -0,0 +1,120 @@
+"""
+Cross-worker snapshot notifications over Postgres LISTEN/NOTIFY
+
+The ingestion leader announces every new vehicle snapshot on a NOTIFY
+channel: agency, the leader's epoch and sequence number and, when it fits in
+a NOTIFY payload, the compact delta. Static feed loads and trip update fetches are announced on
+the same channel. Every worker keeps one LISTEN connection open and refreshes its
+in-memory snapshot as notifications arrive, so no worker has to poll the
+database for changes.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import asyncpg
+from sqlalchemy import text
+
+from app.core.database import IngestSessionLocal, get_asyncpg_dsn
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class SnapshotNotifier:
+    """Publishes and listens for snapshot notifications."""
+
+    CHANNEL = "transitpulse_snapshots"
+
+    # Postgres rejects NOTIFY payloads of 8000 bytes or more
+    MAX_PAYLOAD_BYTES = 7900
+
+    def __init__(self, dsn: Optional[str] = None, channel: str = CHANNEL, reconnect_interval: float = 5.0):
+        self.dsn = dsn or get_asyncpg_dsn()
+        self.channel = channel
+        self.reconnect_interval = reconnect_interval
+        self.published = 0
+        self.received = 0
+
+    def encode(self, agency_key: str, epoch: Optional[str], seq: int, delta: Optional[Dict[str, Any]] = None) -> str:
+        """Encode a notification, including the delta only if it fits."""
+        message = {"agency": agency_key, "epoch": epoch, "seq": seq, "ts": datetime.utcnow().isoformat()}
+        if delta is not None:
+            with_delta = json.dumps({**message, "delta": delta}, separators=(",", ":"), default=str)
+            if len(with_delta.encode("utf-8")) <= self.MAX_PAYLOAD_BYTES:
+                return with_delta
+        return json.dumps(message, separators=(",", ":"))
+
+    async def publish(self, agency_key: str, epoch: Optional[str], seq: int,
+                      delta: Optional[Dict[str, Any]] = None) -> None:
+        """Announce a new snapshot to every listening worker."""
+        await self._notify(self.encode(agency_key, epoch, seq, delta))
+
+    async def _notify(self, payload: str) -> None:
+        async with IngestSessionLocal() as db:
+            await db.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": self.channel, "payload": payload}
+            )
+            await db.commit()
+        self.published += 1
+
+    async def publish_static(self, agency_key: str, version: Optional[str]) -> None:
+        """Announce that a new static feed version was loaded into the database."""
+        await self._notify(json.dumps({"agency": agency_key, "static_version": version}))
+
+    async def publish_trip_updates(self, agency_key: str, count: int) -> None:
+        """Announce that new trip updates were stored in the database."""
+        await self._notify(json.dumps({"agency": agency_key, "trip_updates": count}))
+
+    async def listen(self, handler: Handler) -> None:
+        """
+        Deliver notifications to ``handler`` in order, reconnecting as needed.
+
+        After every (re)connect the handler receives ``{"resync": True}`` so
+        it can reload state that changed while no connection was listening.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def on_notification(connection, pid, channel, payload):
+            try:
+                queue.put_nowait(json.loads(payload))
+            except ValueError:
+                logger.warning(f"Ignoring malformed snapshot notification: {payload[:200]}")
+
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                await connection.add_listener(self.channel, on_notification)
+                logger.info(f"Listening for snapshot notifications on {self.channel}")
+                queue.put_nowait({"resync": True})
+
+                while not connection.is_closed():
+                    try:
+                        message = await asyncio.wait_for(queue.get(), timeout=self.reconnect_interval)
+                    except asyncio.TimeoutError:
+                        continue
+                    self.received += 1
+                    try:
+                        await handler(message)
+                    except Exception as e:
+                        logger.error(f"Error handling snapshot notification: {e}")
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Snapshot listener connection error: {e}")
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+            await asyncio.sleep(self.reconnect_interval)
+
+
+# Process-wide notifier
+snapshot_notifier = SnapshotNotifier()
@@ -0,0 +1,162 @@
+"""
+Realtime vehicle payloads built from the in-memory snapshot
+
+Streaming endpoints send the same vehicle payload as ``/vehicles/realtime``
+but build it from the shared snapshot rather than the database. Each payload
+is built and serialized once per snapshot sequence, however many clients
+receive it. Trip direction and headsign come from a small cache that only
+queries the database for trips it has not seen (unknown trips are retried,
+since they may belong to a static feed that is still loading). The trip
+cache and the serialized payloads are dropped when a new static feed version
+is loaded.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from app.cache import static_feed_versions
+from app.core.database import SessionLocal
+from app.core.responses import dumps
+from app.models.gtfs_static import GTFSTrip
+from app.realtime.snapshot import VehicleSnapshotStore, snapshot_store
+
+logger = logging.getLogger(__name__)
+
+
+class TripDirectionCache:
+    """trip_id -> (direction_id, trip_headsign), loaded on demand."""
+
+    def __init__(self, max_size: int = 50000):
+        self.max_size = max_size
+        self._trips: Dict[str, Tuple[Optional[int], Optional[str]]] = {}
+        static_feed_versions.on_change(lambda agency_key, version: self.clear())
+
+    async def lookup(self, trip_ids: Iterable[str]) -> Dict[str, Tuple[Optional[int], Optional[str]]]:
+        wanted = {trip_id for trip_id in trip_ids if trip_id}
+        missing = wanted - self._trips.keys()
+        if missing:
+            if len(self._trips) + len(missing) > self.max_size:
+                self._trips.clear()
+            try:
+                async with SessionLocal() as db:
+                    result = await db.execute(
+                        select(GTFSTrip.trip_id, GTFSTrip.direction_id, GTFSTrip.trip_headsign)
+                        .where(GTFSTrip.trip_id.in_(missing))
+                    )
+                    for row in result:
+                        self._trips[row.trip_id] = (row.direction_id, row.trip_headsign)
+            except Exception as e:
+                logger.warning(f"Could not load trip directions: {e}")
+        return {trip_id: self._trips.get(trip_id, (None, None)) for trip_id in wanted}
+
+    def clear(self) -> None:
+        self._trips.clear()
+
+
+def format_vehicle(vehicle: Dict[str, Any], trip: Tuple[Optional[int], Optional[str]]) -> Dict[str, Any]:
+    """A snapshot vehicle in the /vehicles/realtime response shape."""
+    direction_id, headsign = trip
+    return {
+        "vehicle_id": vehicle.get("vehicle_id"),
+        "route_id": vehicle.get("route_id"),
+        "trip_id": vehicle.get("trip_id"),
+        "latitude": vehicle.get("latitude"),
+        "longitude": vehicle.get("longitude"),
+        "bearing": vehicle.get("bearing"),
+        "speed": vehicle.get("speed"),
+        "timestamp": vehicle.get("timestamp"),
+        "agency": vehicle.get("agency"),
+        "status": vehicle.get("status"),
+        "direction_id": direction_id,
+        "direction_name": {0: "Outbound", 1: "Inbound"}.get(direction_id),
+        "headsign": headsign,
+    }
+
+
+class RealtimePayloadBuilder:
+    """Builds and caches serialized vehicle payloads per snapshot sequence."""
+
+    def __init__(self, store: VehicleSnapshotStore = snapshot_store, trips: Optional[TripDirectionCache] = None):
+        self.store = store
+        self.trips = trips or TripDirectionCache()
+        # (agency, route_id) -> (seq, serialized payload)
+        self._cache: Dict[Tuple[str, Optional[str]], Tuple[int, str]] = {}
+        # Builds in progress, shared by every client waiting for the same payload
+        self._building: Dict[Tuple[str, Optional[str], int], asyncio.Task] = {}
+        # Cached payloads carry directions and headsigns of the previous feed
+        static_feed_versions.on_change(lambda agency_key, version: self._cache.clear())
+
+    async def vehicles(self, agency_key: str, route_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        vehicles = self.store.get(agency_key).vehicle_list(route_id)
+        trips = await self.trips.lookup(v.get("trip_id") for v in vehicles)
+        return [format_vehicle(v, trips.get(v.get("trip_id"), (None, None))) for v in vehicles]
+
+    async def payload(self, agency_key: str, route_id: Optional[str] = None) -> Dict[str, Any]:
+        snapshot = self.store.get(agency_key)
+        seq, timestamp = snapshot.seq, snapshot.timestamp
+        vehicles = await self.vehicles(agency_key, route_id)
+        return {
+            "status": "success",
+            "message": f"Found {len(vehicles)} active vehicles with route assignments",
+            "data": vehicles,
+            "last_updated": (timestamp or datetime.now()).isoformat(),
+            "agency": agency_key,
+            "seq": seq,
+        }
+
+    async def changes(self, agency_key: str, since: int, route_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Vehicles added, changed or removed since sequence ``since``.
+
+        Falls back to every current vehicle (``"full": true``) when ``since``
+        is older than the snapshot history; the client then replaces its state.
+        """
+        snapshot = self.store.get(agency_key)
+        seq, timestamp = snapshot.seq, snapshot.timestamp
+        delta = self.store.changes_since(agency_key, since, route_id)
+        if delta is None:
+            vehicles = await self.vehicles(agency_key, route_id)
+            removed: List[str] = []
+        else:
+            trips = await self.trips.lookup(v.get("trip_id") for v in delta["upserts"])
+            vehicles = [format_vehicle(v, trips.get(v.get("trip_id"), (None, None))) for v in delta["upserts"]]
+            removed = delta["removed"]
+        return {
+            "status": "success",
+            "message": f"{len(vehicles)} vehicles changed, {len(removed)} removed since sequence {since}",
+            "data": vehicles,
+            "removed": removed,
+            "full": delta is None,
+            "since": since,
+            "seq": seq,
+            "last_updated": (timestamp or datetime.now()).isoformat(),
+            "agency": agency_key,
+        }
+
+    async def serialized(self, agency_key: str, route_id: Optional[str] = None) -> Tuple[int, str]:
+        """The payload as JSON text together with the sequence it reflects."""
+        seq = self.store.seq(agency_key)
+        cached = self._cache.get((agency_key, route_id))
+        if cached and cached[0] == seq:
+            return cached
+
+        key = (agency_key, route_id, seq)
+        task = self._building.get(key)
+        if task is None:
+            task = self._building[key] = asyncio.create_task(self._build(agency_key, route_id))
+            task.add_done_callback(lambda _: self._building.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _build(self, agency_key: str, route_id: Optional[str]) -> Tuple[int, str]:
+        payload = await self.payload(agency_key, route_id)
+        entry = (payload["seq"], dumps(payload).decode())
+        self._cache[(agency_key, route_id)] = entry
+        return entry
+
+
+# Process-wide payload builder
+realtime_payloads = RealtimePayloadBuilder()
@@ -0,0 +1,222 @@
+"""
+In-memory realtime vehicle snapshots
+
+Each agency has one snapshot: the current vehicles keyed by vehicle_id and a
+monotonically increasing sequence number. The ingestion leader publishes a new
+snapshot per ingest cycle and gets back the delta (vehicles added or changed,
+vehicle ids removed) against the previous one. Followers apply those deltas,
+or replace the snapshot wholesale when they have fallen behind.
+
+Sequence numbers belong to the epoch of the process that published them.
+Every process has its own epoch, so a new or restarted leader starts a new
+one; its first sequence number is seeded from the clock, so sequence numbers
+keep increasing across leaders (the leader publishes far less than once a
+second) and cursors held by clients never point into the new leader's
+numbering. Followers resync instead of applying a delta from another epoch.
+
+The last ``history_size`` deltas are kept per agency so a client that knows
+the sequence number it last saw can catch up without a full reload. Streaming
+endpoints wait on ``wait_for_change`` instead of polling.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+
+@dataclass
+class AgencySnapshot:
+    """Current vehicle state of one agency."""
+    seq: int = 0
+    # Epoch of the leader that published ``seq``
+    epoch: Optional[str] = None
+    timestamp: Optional[datetime] = None
+    vehicles: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    # (seq, delta) of the most recent snapshots, oldest first
+    history: Deque[Tuple[int, Dict[str, Any]]] = field(default_factory=deque)
+
+    def vehicle_list(self, route_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        if route_id:
+            return [v for v in self.vehicles.values() if v.get("route_id") == route_id]
+        return list(self.vehicles.values())
+
+
+class VehicleSnapshotStore:
+    """Sequence-numbered vehicle snapshots per agency."""
+
+    # Fields whose change makes a vehicle part of a delta. The reported fix
+    # time is left out: a vehicle re-reporting the same position has nothing
+    # new for its clients.
+    TRACKED_FIELDS = (
+        "route_id", "trip_id", "latitude", "longitude",
+        "bearing", "speed", "status",
+    )
+
+    def __init__(self, history_size: int = 120):
+        self.history_size = history_size
+        # Epoch of the snapshots this process publishes as leader
+        self.epoch = uuid.uuid4().hex[:12]
+        self._snapshots: Dict[str, AgencySnapshot] = {}
+        # agency -> event set (and discarded) on the next change
+        self._changed: Dict[str, asyncio.Event] = {}
+
+    def get(self, agency_key: str) -> AgencySnapshot:
+        if agency_key not in self._snapshots:
+            self._snapshots[agency_key] = AgencySnapshot(history=deque(maxlen=self.history_size))
+        return self._snapshots[agency_key]
+
+    def seq(self, agency_key: str) -> int:
+        return self.get(agency_key).seq
+
+    def publish(self, agency_key: str, vehicles: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Replace the snapshot with a freshly ingested vehicle list (leader side).
+
+        Returns:
+            The delta against the previous snapshot:
+            ``{"upserts": [vehicle, ...], "removed": [vehicle_id, ...]}``
+        """
+        snapshot = self.get(agency_key)
+        current = self._index(vehicles)
+        delta = self.diff(snapshot.vehicles, current)
+
+        if snapshot.epoch != self.epoch:
+            # First snapshot of this leader: continue above any earlier leader's sequence
+            snapshot.epoch = self.epoch
+            snapshot.seq = max(snapshot.seq, int(time.time()))
+            snapshot.history.clear()
+        snapshot.vehicles = current
+        snapshot.seq += 1
+        snapshot.timestamp = datetime.now()
+        snapshot.history.append((snapshot.seq, delta))
+        self._notify(agency_key)
+        return delta
+
+    def apply_delta(self, agency_key: str, epoch: Optional[str], seq: int, delta: Dict[str, Any]) -> bool:
+        """
+        Apply a delta published by the leader (follower side).
+
+        Returns:
+            False when the delta is from another epoch (a new leader) or
+            ``seq`` does not directly follow the local sequence, in which
+            case the caller must reload the full snapshot.
+        """
+        snapshot = self.get(agency_key)
+        if epoch is None or epoch != snapshot.epoch:
+            return False
+        if seq == snapshot.seq:
+            return True  # Already applied
+        if seq != snapshot.seq + 1:
+            return False
+
+        for vehicle_id in delta.get("removed", []):
+            snapshot.vehicles.pop(vehicle_id, None)
+        for vehicle in delta.get("upserts", []):
+            snapshot.vehicles[vehicle["vehicle_id"]] = vehicle
+
+        snapshot.seq = seq
+        snapshot.timestamp = datetime.now()
+        snapshot.history.append((seq, delta))
+        self._notify(agency_key)
+        return True
+
+    def replace(self, agency_key: str, vehicles: Iterable[Dict[str, Any]], seq: int,
+                epoch: Optional[str] = None) -> None:
+        """
+        Replace the snapshot wholesale, adopting the leader's epoch and
+        sequence number. Without an epoch (a resync on reconnect) the local
+        sequence is kept unless ``seq`` is ahead of it.
+        """
+        snapshot = self.get(agency_key)
+        snapshot.vehicles = self._index(vehicles)
+        if epoch is not None and epoch != snapshot.epoch:
+            snapshot.epoch = epoch
+            snapshot.seq = seq
+        else:
+            snapshot.seq = max(seq, snapshot.seq)
+        snapshot.timestamp = datetime.now()
+        # The deltas that led here are unknown, so older sequences cannot be resumed
+        snapshot.history.clear()
+        self._notify(agency_key)
+
+    async def wait_for_change(self, agency_key: str, seq: int, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until the agency's snapshot moves past ``seq``.
+
+        Returns:
+            False if ``timeout`` seconds passed without a change.
+        """
+        if self.seq(agency_key) != seq:
+            return True
+        event = self._changed.setdefault(agency_key, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _notify(self, agency_key: str) -> None:
+        event = self._changed.pop(agency_key, None)
+        if event is not None:
+            event.set()
+
+    def changes_since(
+        self, agency_key: str, since: int, route_id: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Net change from sequence ``since`` to the current snapshot.
+
+        Returns:
+            ``{"upserts": [...], "removed": [...]}`` restricted to ``route_id``
+            when given (a vehicle that left the route counts as removed), or
+            None when ``since`` is older than the retained history and the
+            caller needs the full snapshot instead.
+        """
+        snapshot = self.get(agency_key)
+        if since == snapshot.seq:
+            return {"upserts": [], "removed": []}
+        if since < 0 or since > snapshot.seq:
+            return None  # Not a sequence of this snapshot (e.g. the store was reset)
+        if not snapshot.history or snapshot.history[0][0] > since + 1:
+            return None
+
+        touched = set()
+        for seq, delta in snapshot.history:
+            if seq > since:
+                touched.update(v["vehicle_id"] for v in delta.get("upserts", []))
+                touched.update(delta.get("removed", []))
+
+        # A changed vehicle no longer on the route may have left it, so it is
+        # reported as removed; clients ignore ids they do not know
+        upserts, removed = [], []
+        for vehicle_id in touched:
+            vehicle = snapshot.vehicles.get(vehicle_id)
+            if vehicle is not None and (not route_id or vehicle.get("route_id") == route_id):
+                upserts.append(vehicle)
+            else:
+                removed.append(vehicle_id)
+        return {"upserts": upserts, "removed": removed}
+
+    @classmethod
+    def diff(cls, old: Dict[str, Dict[str, Any]], new: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Vehicles added or changed in ``new`` and ids missing from it."""
+        upserts = [
+            vehicle for vehicle_id, vehicle in new.items()
+            if vehicle_id not in old or any(
+                old[vehicle_id].get(name) != vehicle.get(name) for name in cls.TRACKED_FIELDS
+            )
+        ]
+        removed = [vehicle_id for vehicle_id in old if vehicle_id not in new]
+        return {"upserts": upserts, "removed": removed}
+
+    @staticmethod
+    def _index(vehicles: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        return {v["vehicle_id"]: v for v in vehicles if v.get("vehicle_id")}
+
+
+# Process-wide snapshot store
+snapshot_store = VehicleSnapshotStore()
@@ -45,6 +45,7 @@ class GTFSRouteResponse(BaseModel):
     routes: List[GTFSRoute]
     status: str
     message: str
+    next_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -67,6 +68,7 @@ class GTFSStopResponse(BaseModel):
     status: str
     message: str
     data: List[GTFSStop]
+    next_cursor: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from datetime import time, date
+from datetime import date
 from typing import Optional
 
 # Schemas for GTFS Static Data
@@ -65,8 +65,8 @@ class GTFSTrip(GTFSTripBase):
 
 class GTFSStopTimeBase(BaseModel):
     trip_id: str
-    arrival_time: Optional[time] = None
-    departure_time: Optional[time] = None
+    arrival_time: Optional[int] = None  # Seconds of the service day
+    departure_time: Optional[int] = None
     stop_id: str
     stop_sequence: int
     stop_headsign: Optional[str] = None
@@ -121,6 +121,7 @@ class RoutePredictionsResponse(BaseModel):
     status: str = "success"
     message: str = ""
     predictions_by_stop: Dict[str, List[StopPredictionDisplay]] = {}
+    next_cursor: Optional[str] = None
     last_updated: Optional[datetime] = None
     
     class Config:
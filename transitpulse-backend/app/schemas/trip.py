@@ -0,0 +1,11 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+
+class TripBatchRequest(BaseModel):
+    """Trips (and/or vehicles, resolved to their current trips) to look up in one request"""
+    trip_ids: List[str] = Field(default_factory=list, max_length=200)
+    vehicle_ids: List[str] = Field(default_factory=list, max_length=200)
+    agency: str = "golden_gate"
+    include_stop_times: bool = True
+    include_realtime: bool = True
@@ -1,6 +1,20 @@
 # Import all utility functions to make them available at the package level
 from .gtfs_utils import get_all_gtfs_shapes
+from .gtfs_time import (
+    format_gtfs_time,
+    format_gtfs_times,
+    gtfs_time_to_datetime,
+    gtfs_times_to_timestamps,
+    parse_gtfs_time,
+    parse_gtfs_times,
+)
 
 __all__ = [
     'get_all_gtfs_shapes',
+    'format_gtfs_time',
+    'format_gtfs_times',
+    'gtfs_time_to_datetime',
+    'gtfs_times_to_timestamps',
+    'parse_gtfs_time',
+    'parse_gtfs_times',
 ]
@@ -0,0 +1,112 @@
+"""
+GTFS schedule times as integer seconds
+
+GTFS stop times are measured from "noon minus 12h" of the service day,
+which is midnight except on daylight saving changes, and run past 24:00:00
+for trips that continue after midnight (25:15:00 is 01:15 the next
+morning). They are stored and handled as integer seconds from that origin,
+so overnight trips keep their order and schedule arithmetic is integer
+arithmetic, on whole arrays where there are many times.
+
+Missing or malformed times are ``None`` in scalar helpers and ``NO_TIME``
+in arrays.
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pytz
+
+from app.core.config import settings
+
+AGENCY_TZ = pytz.timezone(settings.AGENCY_TIMEZONE)
+
+# Missing time in integer arrays
+NO_TIME = -1
+
+# Values above this are Unix timestamps (GTFS-RT), not service-day seconds
+MAX_GTFS_TIME = 7 * 86400
+
+
+def parse_gtfs_time(value: Optional[str]) -> Optional[int]:
+    """Seconds of an ``H:MM:SS`` GTFS time, hours beyond 24 included."""
+    if not value:
+        return None
+    parts = value.strip().split(':')
+    if len(parts) != 3:
+        return None
+    try:
+        hours, minutes, seconds = (int(part) for part in parts)
+    except ValueError:
+        return None
+    if hours < 0 or not 0 <= minutes < 60 or not 0 <= seconds < 60:
+        return None
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def parse_gtfs_times(values: Sequence[Optional[str]]) -> np.ndarray:
+    """``parse_gtfs_time`` over a column of values, as an int32 array."""
+    text = np.array(["" if value is None else value for value in values], dtype=str)
+    if not len(text):
+        return np.empty(0, dtype=np.int32)
+    text = np.char.strip(text)
+    hours, _, rest = np.moveaxis(np.char.partition(text, ':'), -1, 0)
+    minutes, _, seconds = np.moveaxis(np.char.partition(rest, ':'), -1, 0)
+
+    valid = (
+        np.char.isdigit(hours) & (np.char.str_len(hours) <= 3)
+        & np.char.isdigit(minutes) & (np.char.str_len(minutes) <= 2)
+        & np.char.isdigit(seconds) & (np.char.str_len(seconds) <= 2)
+    )
+    hours, minutes, seconds = (np.where(valid, part, "0").astype(np.int32) for part in (hours, minutes, seconds))
+    valid &= (minutes < 60) & (seconds < 60)
+    parsed = hours * 3600 + minutes * 60 + seconds
+    return np.where(valid, parsed, NO_TIME).astype(np.int32)
+
+
+def format_gtfs_time(seconds: Optional[int]) -> Optional[str]:
+    """``HH:MM:SS`` of service-day seconds, e.g. 91500 -> ``25:25:00``."""
+    if seconds is None or seconds < 0:
+        return None
+    hours, rest = divmod(int(seconds), 3600)
+    return f"{hours:02d}:{rest // 60:02d}:{rest % 60:02d}"
+
+
+def format_gtfs_times(seconds: Sequence[int]) -> List[Optional[str]]:
+    """``format_gtfs_time`` over an array of seconds (``NO_TIME`` -> None)."""
+    seconds = np.asarray(seconds, dtype=np.int64)
+    if not len(seconds):
+        return []
+    hours, rest = np.divmod(np.maximum(seconds, 0), 3600)
+    minutes, secs = np.divmod(rest, 60)
+    text = np.char.add(
+        np.char.add(np.char.zfill(hours.astype(str), 2), ':'),
+        np.char.add(np.char.add(np.char.zfill(minutes.astype(str), 2), ':'), np.char.zfill(secs.astype(str), 2))
+    )
+    return [None if missing else value for missing, value in zip((seconds < 0).tolist(), text.tolist())]
+
+
+def service_day_start(service_date: date, tz=AGENCY_TZ) -> datetime:
+    """The origin GTFS times of ``service_date`` count from: noon minus 12h, timezone-aware."""
+    noon = tz.localize(datetime.combine(service_date, time(12)))
+    return tz.normalize(noon - timedelta(hours=12))
+
+
+def gtfs_time_to_datetime(seconds: int, service_date: date, tz=AGENCY_TZ) -> datetime:
+    """Timezone-aware datetime of a time of ``service_date``'s schedule."""
+    return tz.normalize(service_day_start(service_date, tz) + timedelta(seconds=int(seconds)))
+
+
+def gtfs_times_to_timestamps(seconds: Sequence[int], service_date: date, tz=AGENCY_TZ) -> np.ndarray:
+    """Unix timestamps of an array of ``service_date`` times (``NO_TIME`` is kept)."""
+    seconds = np.asarray(seconds, dtype=np.int64)
+    origin = int(service_day_start(service_date, tz).timestamp())
+    return np.where(seconds >= 0, seconds + origin, NO_TIME)
+
+
+def seconds_into_service_day(moment: datetime, service_date: date, tz=AGENCY_TZ) -> int:
+    """``moment`` as seconds of ``service_date``'s schedule; naive moments are agency-local."""
+    if moment.tzinfo is None:
+        moment = tz.localize(moment)
+    return int((moment - service_day_start(service_date, tz)).total_seconds())
@@ -1,15 +1,27 @@
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import tuple_
 from sqlalchemy.future import select
 from app.models.gtfs_static import GTFSShape
 
-async def get_all_gtfs_shapes(db: AsyncSession, shape_id: Optional[str] = None) -> List[GTFSShape]:
+# Order of shape points; id breaks ties between points with the same sequence
+SHAPE_KEYS = (GTFSShape.shape_id, GTFSShape.shape_pt_sequence, GTFSShape.id)
+
+
+async def get_all_gtfs_shapes(
+    db: AsyncSession,
+    shape_id: Optional[str] = None,
+    limit: Optional[int] = None,
+    after: Optional[Sequence[Any]] = None
+) -> List[GTFSShape]:
     """
     Helper function to get all GTFS shapes, optionally filtered by shape_id.
     
     Args:
         db: Database session
         shape_id: Optional shape_id to filter by
+        limit: Optional maximum number of points
+        after: Optional SHAPE_KEYS values; only points after them are returned
         
     Returns:
         List of GTFSShape objects
@@ -17,7 +29,43 @@ async def get_all_gtfs_shapes(db: AsyncSession, shape_id: Optional[str] = None)
     query = select(GTFSShape)
     if shape_id:
         query = query.where(GTFSShape.shape_id == shape_id)
-    query = query.order_by(GTFSShape.shape_id, GTFSShape.shape_pt_sequence)
+    if after is not None:
+        query = query.where(tuple_(*SHAPE_KEYS) > tuple_(*after))
+    query = query.order_by(*SHAPE_KEYS)
+    if limit is not None:
+        query = query.limit(limit)
     
     result = await db.execute(query)
     return result.scalars().all()
+
+
+async def stream_gtfs_shapes(session_factory, shape_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield GTFS shape points one at a time from a server-side cursor.
+
+    Opens its own session from ``session_factory``: a streamed response is
+    still being sent after the request's session has been closed.
+
+    Args:
+        session_factory: Callable returning a new AsyncSession
+        shape_id: Optional shape_id to filter by
+
+    Yields:
+        Shape point dicts with the same keys as the GTFSShape schema
+    """
+    query = select(
+        GTFSShape.id,
+        GTFSShape.shape_id,
+        GTFSShape.shape_pt_lat,
+        GTFSShape.shape_pt_lon,
+        GTFSShape.shape_pt_sequence,
+        GTFSShape.shape_dist_traveled,
+    )
+    if shape_id:
+        query = query.where(GTFSShape.shape_id == shape_id)
+    query = query.order_by(*SHAPE_KEYS)
+
+    async with session_factory() as db:
+        result = await db.stream(query)
+        async for row in result:
+            yield dict(row._mapping)
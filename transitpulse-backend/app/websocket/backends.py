@@ -0,0 +1,119 @@
+"""
+Pub/sub transports for websocket fan-out
+
+A message broadcast on any worker is published on the route's channel and
+delivered by every worker to the websocket clients connected to it. The
+transport is pluggable:
+
+- InProcessBackend delivers straight back to the publishing process. It is
+  the default for single-worker deployments.
+- RedisBackend uses Redis pub/sub (settings.REDIS_URL) so every worker sees
+  every route's messages.
+"""
+
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Called with (route_id, messages) for every batch received on a route channel
+DeliveryHandler = Callable[[str, List[Any]], Awaitable[None]]
+
+
+class FanoutBackend(ABC):
+    """Base class for websocket fan-out transports."""
+
+    def __init__(self, channel_prefix: str = "transitpulse:ws"):
+        self.channel_prefix = channel_prefix
+        self.handler: Optional[DeliveryHandler] = None
+
+    def channel_for(self, route_id: str) -> str:
+        return f"{self.channel_prefix}:route:{route_id}"
+
+    def route_for(self, channel: str) -> str:
+        return channel[len(self.channel_prefix) + len(":route:"):]
+
+    async def start(self, handler: DeliveryHandler) -> None:
+        self.handler = handler
+
+    async def stop(self) -> None:
+        self.handler = None
+
+    @abstractmethod
+    async def publish(self, route_id: str, messages: List[Any]) -> None:
+        """Publish a batch of messages on the route's channel."""
+
+
+class InProcessBackend(FanoutBackend):
+    """Delivers published batches to the local process only."""
+
+    async def publish(self, route_id: str, messages: List[Any]) -> None:
+        if self.handler:
+            await self.handler(route_id, messages)
+
+
+class RedisBackend(FanoutBackend):
+    """Fans batches out to every worker over Redis pub/sub."""
+
+    def __init__(self, redis_url: str, channel_prefix: str = "transitpulse:ws"):
+        super().__init__(channel_prefix)
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("The redis package is required for the Redis websocket fan-out backend") from e
+
+        self.redis = aioredis.from_url(redis_url)
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, handler: DeliveryHandler) -> None:
+        await super().start(handler)
+        self._listener = asyncio.create_task(self._listen(), name="websocket-fanout")
+
+    async def stop(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        await self.redis.close()
+        await super().stop()
+
+    async def publish(self, route_id: str, messages: List[Any]) -> None:
+        payload = json.dumps(messages, separators=(",", ":"), default=str)
+        await self.redis.publish(self.channel_for(route_id), payload)
+
+    async def _listen(self) -> None:
+        pattern = f"{self.channel_prefix}:route:*"
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.psubscribe(pattern)
+                logger.info(f"Subscribed to websocket fan-out channels {pattern}")
+                async for item in pubsub.listen():
+                    if item.get("type") != "pmessage" or not self.handler:
+                        continue
+                    channel = item["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    try:
+                        await self.handler(self.route_for(channel), json.loads(item["data"]))
+                    except Exception as e:
+                        logger.error(f"Error delivering fan-out message on {channel}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Websocket fan-out subscription error: {e}")
+                await asyncio.sleep(2)
+            finally:
+                await pubsub.reset()
+
+
+def create_backend(name: str, redis_url: Optional[str] = None) -> FanoutBackend:
+    """Build the configured fan-out backend ("memory" or "redis")."""
+    if name == "redis":
+        return RedisBackend(redis_url)
+    if name == "memory":
+        return InProcessBackend()
+    raise ValueError(f"Unknown websocket fan-out backend: {name}")
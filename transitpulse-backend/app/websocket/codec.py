@@ -0,0 +1,161 @@
+"""
+Compact binary websocket encoding
+
+Clients that connect with ``?encoding=msgpack`` receive MessagePack binary
+frames instead of JSON text. Vehicle messages are reduced to the fields that
+changed since the client last heard about the vehicle:
+
+    {"t": type, "s": seq, "ts": unix_time, "d": [record, ...], "r": [vehicle_ref, ...],
+     "i": {ref: "string", ...}}
+
+- ``t``: 1 update, 2 removed, 3 snapshot (client state replaced), 4 resume delta
+- ``d``: records ``{0: vehicle_ref, 1: route_ref, 2: trip_ref, 3: lat, 4: lon,
+  5: bearing, 6: speed, 7: status}`` holding only the changed fields. Latitude
+  and longitude are fixed-point integers (degrees * 1e5, about 1 m), speed is
+  in tenths of m/s, and bearing is whole degrees.
+- ``r``: refs of removed vehicles
+- ``i``: strings (vehicle, route and trip ids) interned for this connection,
+  sent once the first time each string is used. Trip ids keep changing over
+  a service day, so once a connection has interned ``max_refs`` strings the
+  table starts over: refs are numbered from 0 again, each string is sent
+  again with its new ref, and every vehicle is sent in full. A ref means
+  whatever ``i`` last defined it as.
+
+Other messages (pings, errors) are sent as plain MessagePack maps. When the
+msgpack package is not installed, clients get JSON text frames as usual.
+"""
+
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import msgpack
+except ImportError:  # Optional: binary encoding is disabled without it
+    msgpack = None
+
+COORD_SCALE = 100000
+SPEED_SCALE = 10
+
+# Record keys
+VEHICLE, ROUTE, TRIP, LAT, LON, BEARING, SPEED, STATUS = range(8)
+
+# Frame types
+UPDATE, REMOVED, SNAPSHOT, RESUME = 1, 2, 3, 4
+
+ENCODINGS = ("json", "msgpack")
+
+
+def binary_available() -> bool:
+    return msgpack is not None
+
+
+class VehicleCodec:
+    """Per-connection MessagePack encoder with string interning and field deltas."""
+
+    def __init__(self, max_refs: int = 10000):
+        self.max_refs = max_refs
+        self.refs: Dict[str, int] = {}
+        # vehicle_id -> last record sent to this client
+        self.sent: Dict[str, Dict[int, Any]] = {}
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        if len(self.refs) >= self.max_refs or len(self.sent) >= self.max_refs:
+            self.reset()
+        message_type = message.get("type")
+        if message_type == "vehicle_update":
+            frame = self._frame(UPDATE, message, records=[message["data"]])
+        elif message_type == "vehicle_removed":
+            frame = self._frame(REMOVED, message, removed=[message["data"]["vehicle_id"]])
+        elif message_type == "snapshot":
+            self.sent.clear()
+            frame = self._frame(SNAPSHOT, message, records=message.get("data") or [])
+            if "subscription" in message:
+                frame["sub"] = message["subscription"]
+        elif message_type == "vehicle_delta":
+            data = message.get("data") or {}
+            frame = self._frame(RESUME, message, records=data.get("upserts", []), removed=data.get("removed", []))
+        else:
+            return msgpack.packb(message, default=str)
+        return msgpack.packb(frame, default=str)
+
+    def reset(self) -> None:
+        """Forget the interned strings and sent records; the next frames carry everything again."""
+        self.refs.clear()
+        self.sent.clear()
+
+    def _frame(
+        self,
+        frame_type: int,
+        message: Dict[str, Any],
+        records: List[Dict[str, Any]] = (),
+        removed: List[str] = (),
+    ) -> Dict[str, Any]:
+        new_strings: Dict[int, str] = {}
+        frame: Dict[str, Any] = {"t": frame_type, "s": message.get("seq"), "ts": int(time.time())}
+
+        encoded = []
+        for vehicle in records:
+            record = self._record(vehicle, new_strings)
+            if record is not None:
+                encoded.append(record)
+        if encoded:
+            frame["d"] = encoded
+
+        if removed:
+            frame["r"] = [self._ref(vehicle_id, new_strings) for vehicle_id in removed]
+            for vehicle_id in removed:
+                self.sent.pop(vehicle_id, None)
+
+        if new_strings:
+            frame["i"] = new_strings
+        return frame
+
+    def _record(self, vehicle: Dict[str, Any], new_strings: Dict[int, str]) -> Optional[Dict[int, Any]]:
+        vehicle_id = vehicle.get("vehicle_id")
+        if not vehicle_id:
+            return None
+
+        full = {
+            ROUTE: self._ref(vehicle.get("route_id"), new_strings),
+            TRIP: self._ref(vehicle.get("trip_id"), new_strings),
+            LAT: self._scaled(vehicle.get("latitude"), COORD_SCALE),
+            LON: self._scaled(vehicle.get("longitude"), COORD_SCALE),
+            BEARING: self._scaled(vehicle.get("bearing"), 1),
+            SPEED: self._scaled(vehicle.get("speed"), SPEED_SCALE),
+            STATUS: vehicle.get("status", vehicle.get("current_status")),
+        }
+        previous = self.sent.get(vehicle_id)
+        self.sent[vehicle_id] = full
+
+        record = {VEHICLE: self._ref(vehicle_id, new_strings)}
+        for key, value in full.items():
+            if previous is None or previous.get(key) != value:
+                if value is not None or previous is not None:
+                    record[key] = value
+        return record
+
+    def _ref(self, value: Optional[str], new_strings: Dict[int, str]) -> Optional[int]:
+        if value is None or value == "":
+            return None
+        value = str(value)
+        ref = self.refs.get(value)
+        if ref is None:
+            ref = self.refs[value] = len(self.refs)
+            new_strings[ref] = value
+        return ref
+
+    @staticmethod
+    def _scaled(value: Any, scale: int) -> Optional[int]:
+        if value is None:
+            return None
+        try:
+            return round(float(value) * scale)
+        except (TypeError, ValueError):
+            return None
+
+
+def create_codec(encoding: Optional[str]) -> Optional[VehicleCodec]:
+    """Codec for a negotiated encoding, or None for JSON text frames."""
+    if encoding == "msgpack" and binary_available():
+        return VehicleCodec()
+    return None
@@ -1,20 +1,109 @@
-from typing import Dict, Set, Optional
+from typing import Any, Dict, List, Set, Optional
 import asyncio
 import json
-from fastapi import WebSocket
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.core.config import settings
+from app.realtime.snapshot import VehicleSnapshotStore, snapshot_store
+from app.websocket.backends import FanoutBackend, create_backend
+from app.websocket.codec import VehicleCodec, create_codec
+from app.websocket.subscriptions import Subscription, SubscriptionIndex
 
 class ConnectionManager:
-    def __init__(self):
+    """
+    Route-keyed websocket connections with pub/sub fan-out.
+
+    Broadcasts are queued per route and flushed every ``flush_interval``
+    seconds as one message per route on the fan-out backend. Every worker
+    subscribed to the backend delivers the batch to its own connections, so a
+    client receives updates no matter which worker produced them.
+
+    On connect a client first receives the route's current state from the
+    in-memory snapshot, stamped with the snapshot sequence number: a
+    ``snapshot`` message, or a ``vehicle_delta`` when it resumes from a
+    sequence still in the snapshot history. Later broadcasts carry the
+    sequence of the delta they belong to; clients drop any with a sequence
+    not greater than the one they started from.
+
+    The process-wide lock only guards the connection registries; nothing is
+    sent while holding it. Each client has its own send lock, so its initial
+    state goes out before any broadcast queued behind it. Batches are sent to
+    all clients concurrently, and a client that does not accept its batch
+    within ``send_timeout`` seconds is closed and dropped.
+
+    Clients of the route-less /ws/vehicles endpoint instead manage filters
+    (routes, a viewport bbox, or all) over the socket; see ``subscribe``.
+
+    Clients connecting with ``encoding="msgpack"`` get compact binary frames
+    (see app.websocket.codec) through a codec that lives as long as their
+    connection; everyone else gets JSON text.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[FanoutBackend] = None,
+        flush_interval: float = 0.05,
+        store: VehicleSnapshotStore = snapshot_store,
+        send_timeout: float = settings.WEBSOCKET_SEND_TIMEOUT,
+    ):
         self.active_connections: Dict[str, Set[WebSocket]] = {}
+        self.subscriptions = SubscriptionIndex()
+        self.codecs: Dict[WebSocket, VehicleCodec] = {}
+        self.send_locks: Dict[WebSocket, asyncio.Lock] = {}
+        self.store = store
         self.lock = asyncio.Lock()
+        self.send_timeout = send_timeout
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, List[Any]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Subscribe to the fan-out backend and start flushing queued broadcasts."""
+        if self._flush_task is not None:
+            return
+        if self.backend is None:
+            self.backend = create_backend(settings.WEBSOCKET_FANOUT_BACKEND, settings.REDIS_URL)
+        await self.backend.start(self._deliver_local)
+        self._flush_task = asyncio.create_task(self._flush_loop(), name="websocket-flush")
+
+    async def stop(self):
+        if self._flush_task is None:
+            return
+        self._flush_task.cancel()
+        await asyncio.gather(self._flush_task, return_exceptions=True)
+        self._flush_task = None
+        await self.flush()
+        await self.backend.stop()
 
-    async def connect(self, websocket: WebSocket, route_id: str):
+    async def connect(
+        self,
+        websocket: WebSocket,
+        route_id: str,
+        agency_key: str = "golden_gate",
+        since: Optional[int] = None,
+        encoding: Optional[str] = None,
+    ):
         await websocket.accept()
-        async with self.lock:
-            if route_id not in self.active_connections:
-                self.active_connections[route_id] = set()
-            self.active_connections[route_id].add(websocket)
-            print(f"New connection for route {route_id}. Total connections: {len(self.active_connections[route_id])}")
+        self._negotiate(websocket, encoding)
+        # Broadcasts to this client wait on its send lock until the initial state is out
+        async with self._send_lock(websocket):
+            async with self.lock:
+                if route_id not in self.active_connections:
+                    self.active_connections[route_id] = set()
+                self.active_connections[route_id].add(websocket)
+                print(f"New connection for route {route_id}. Total connections: {len(self.active_connections[route_id])}")
+                message = self.initial_state(route_id, agency_key, since)
+            await self._write(websocket, message)
+
+    def initial_state(self, route_id: str, agency_key: str = "golden_gate", since: Optional[int] = None) -> dict:
+        """The route's current vehicles, or the changes since ``since`` if still known."""
+        snapshot = self.store.get(agency_key)
+        if since is not None:
+            changes = self.store.changes_since(agency_key, since, route_id)
+            if changes is not None:
+                return {"type": "vehicle_delta", "seq": snapshot.seq, "since": since, "data": changes}
+        return {"type": "snapshot", "seq": snapshot.seq, "data": snapshot.vehicle_list(route_id)}
 
     async def disconnect(self, websocket: WebSocket, route_id: str):
         async with self.lock:
@@ -23,21 +112,248 @@ class ConnectionManager:
                 if not self.active_connections[route_id]:
                     del self.active_connections[route_id]
                 print(f"Connection closed for route {route_id}")
+        self._forget(websocket)
+
+    async def send(self, websocket: WebSocket, message: dict):
+        """Send one message in the client's negotiated encoding."""
+        async with self._send_lock(websocket):
+            await self._write(websocket, message)
+
+    async def _write(self, websocket: WebSocket, message: dict, text_frames: Optional[Dict[int, str]] = None):
+        """Send one message; the caller holds the client's send lock."""
+        codec = self.codecs.get(websocket)
+        if codec is not None:
+            await websocket.send_bytes(codec.encode(message))
+            return
+        if text_frames is None:
+            await websocket.send_text(json.dumps(message, default=str))
+            return
+        frame = text_frames.get(id(message))
+        if frame is None:
+            frame = text_frames[id(message)] = json.dumps(message, default=str)
+        await websocket.send_text(frame)
+
+    def _send_lock(self, websocket: WebSocket) -> asyncio.Lock:
+        lock = self.send_locks.get(websocket)
+        if lock is None:
+            lock = self.send_locks[websocket] = asyncio.Lock()
+        return lock
+
+    def _forget(self, websocket: WebSocket):
+        self.codecs.pop(websocket, None)
+        self.send_locks.pop(websocket, None)
+
+    def _negotiate(self, websocket: WebSocket, encoding: Optional[str]):
+        codec = create_codec(encoding)
+        if codec is not None:
+            self.codecs[websocket] = codec
+        elif encoding not in (None, "json"):
+            print(f"WebSocket encoding {encoding} unavailable, using JSON")
+
+    async def connect_subscriber(
+        self, websocket: WebSocket, agency_key: str = "golden_gate", encoding: Optional[str] = None,
+        agency_id: Optional[str] = None
+    ):
+        """Accept a /ws/vehicles client; it receives nothing until it subscribes."""
+        await websocket.accept()
+        self._negotiate(websocket, encoding)
+        async with self.lock:
+            self.subscriptions.add(websocket, Subscription(agency_key, agency_id))
+            print(f"New subscription connection. Total subscribers: {len(self.subscriptions)}")
+
+    async def disconnect_subscriber(self, websocket: WebSocket):
+        async with self.lock:
+            self.subscriptions.remove(websocket)
+        self._forget(websocket)
+
+    async def serve_subscriber(
+        self, websocket: WebSocket, agency_key: str = "golden_gate", encoding: Optional[str] = None,
+        agency_id: Optional[str] = None
+    ):
+        """Run a /ws/vehicles connection: apply subscription requests, ping when idle."""
+        await self.connect_subscriber(websocket, agency_key, encoding, agency_id)
+        try:
+            while True:
+                try:
+                    raw = await asyncio.wait_for(websocket.receive_text(), timeout=10)
+                except asyncio.TimeoutError:
+                    await self.send(websocket, {"type": "ping", "message": "Connection alive"})
+                    continue
+                try:
+                    request = json.loads(raw)
+                except ValueError:
+                    request = None
+                if not isinstance(request, dict):
+                    await self.send(websocket, {"type": "error", "message": "Expected a JSON object"})
+                    continue
+                await self.subscribe(websocket, request)
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            print(f"WebSocket error: {e}")
+        finally:
+            await self.disconnect_subscriber(websocket)
+
+    async def subscribe(self, websocket: WebSocket, request: dict):
+        """
+        Apply a subscription request from a /ws/vehicles client:
+
+            {"action": "subscribe", "routes": ["10", "30"]}
+            {"action": "unsubscribe", "routes": ["30"]}
+            {"action": "bbox", "bbox": [min_lon, min_lat, max_lon, max_lat]}  (null clears it)
+            {"action": "all", "enabled": true}
+
+        The client then receives a ``snapshot`` of every vehicle it now sees,
+        which replaces what it showed before.
+        """
+        action = request.get("action")
+        try:
+            # The snapshot goes out before any broadcast matched against the new subscription
+            async with self._send_lock(websocket):
+                async with self.lock:
+                    if action == "subscribe":
+                        subscription = self.subscriptions.update(websocket, add_routes=request.get("routes", []))
+                    elif action == "unsubscribe":
+                        subscription = self.subscriptions.update(websocket, remove_routes=request.get("routes", []))
+                    elif action == "bbox":
+                        subscription = self.subscriptions.update(websocket, bbox=request.get("bbox"))
+                    elif action == "all":
+                        subscription = self.subscriptions.update(websocket, all=request.get("enabled", True))
+                    else:
+                        raise ValueError(f"Unknown action: {action}")
+
+                    snapshot = self.store.get(subscription.agency_key)
+                    vehicles = [v for v in snapshot.vehicles.values() if subscription.matches(v)]
+                    self.subscriptions.reset_visible(websocket, [v["vehicle_id"] for v in vehicles])
+                    message = {
+                        "type": "snapshot",
+                        "seq": snapshot.seq,
+                        "subscription": subscription.as_dict(),
+                        "data": vehicles
+                    }
+                await self._write(websocket, message)
+        except ValueError as e:
+            await self.send(websocket, {"type": "error", "message": str(e)})
 
     async def broadcast(self, route_id: str, message: dict):
+        """Queue a message for every client of the route, on any worker."""
+        if self._flush_task is None:
+            # Fan-out not started (e.g. scripts): deliver to local clients only
+            await self._deliver_local(route_id, [message])
+            return
+        self._pending.setdefault(route_id, []).append(message)
+
+    async def broadcast_local(self, route_id: str, messages: List[dict]):
+        """Send messages to this worker's clients only, bypassing the fan-out."""
+        await self._deliver_local(route_id, messages)
+
+    def has_clients(self) -> bool:
+        return bool(self.active_connections) or len(self.subscriptions) > 0
+
+    async def flush(self):
+        """Publish the queued messages, one batch per route."""
+        pending, self._pending = self._pending, {}
+        for route_id, messages in pending.items():
+            try:
+                await self.backend.publish(route_id, messages)
+            except Exception as e:
+                print(f"Error publishing WebSocket fan-out for route {route_id}: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._pending:
+                await self.flush()
+
+    async def _deliver_local(self, route_id: str, messages: List[Any]):
+        """Send a batch to this worker's clients of the route."""
+        if len(self.subscriptions):
+            await self._deliver_subscribers(route_id, messages)
+
         async with self.lock:
-            if route_id in self.active_connections:
-                disconnected = set()
-                for connection in self.active_connections[route_id]:
-                    try:
-                        await connection.send_json(message)
-                    except Exception as e:
-                        print(f"Error sending to WebSocket: {e}")
-                        disconnected.add(connection)
-                
-                # Clean up disconnected clients
-                for connection in disconnected:
-                    self.active_connections[route_id].remove(connection)
+            connections = list(self.active_connections.get(route_id, ()))
+        if not connections:
+            return
+
+        outgoing = {connection: messages for connection in connections}
+        disconnected = await self._send_batches(outgoing)
+
+        # Clean up disconnected clients
+        if disconnected:
+            async with self.lock:
+                clients = self.active_connections.get(route_id)
+                if clients is not None:
+                    clients.difference_update(disconnected)
+                    if not clients:
+                        del self.active_connections[route_id]
+
+    async def _deliver_subscribers(self, route_id: str, messages: List[Any]):
+        """Send each vehicle message to the /ws/vehicles clients that can see it."""
+        outgoing: Dict[WebSocket, List[dict]] = {}
+        async with self.lock:
+            for message in messages:
+                data = message.get("data") or {}
+                vehicle_id = data.get("vehicle_id")
+                viewers = set(self.subscriptions.viewers.get(vehicle_id, ())) if vehicle_id else set()
+
+                if message.get("type") == "vehicle_update" and vehicle_id:
+                    recipients = self.subscriptions.match(data)
+                    gone = viewers - recipients
+                elif message.get("type") == "vehicle_removed" and vehicle_id:
+                    recipients, gone = viewers, set()
+                else:
+                    recipients, gone = self.subscriptions.by_route.get(route_id, set()), set()
+
+                for websocket in recipients:
+                    outgoing.setdefault(websocket, []).append(message)
+                if gone:
+                    # Left the client's routes or viewport
+                    removed = {"type": "vehicle_removed", "seq": message.get("seq"), "data": {"vehicle_id": vehicle_id}}
+                    for websocket in gone:
+                        outgoing.setdefault(websocket, []).append(removed)
+
+                if vehicle_id:
+                    visible = message.get("type") == "vehicle_update"
+                    for websocket in recipients | gone:
+                        self.subscriptions.set_visible(websocket, vehicle_id, visible and websocket in recipients)
+
+        disconnected = await self._send_batches(outgoing)
+        if disconnected:
+            async with self.lock:
+                for websocket in disconnected:
+                    self.subscriptions.remove(websocket)
+
+    async def _send_batches(self, outgoing: Dict[WebSocket, List[dict]]) -> Set[WebSocket]:
+        """Send each client its messages concurrently; returns the clients that failed or timed out."""
+        # JSON frames are encoded once per message rather than once per client
+        text_frames: Dict[int, str] = {}
+        clients = list(outgoing)
+        delivered = await asyncio.gather(
+            *(self._send_batch(websocket, outgoing[websocket], text_frames) for websocket in clients)
+        )
+        disconnected = {websocket for websocket, ok in zip(clients, delivered) if not ok}
+        for websocket in disconnected:
+            self._forget(websocket)
+        return disconnected
+
+    async def _send_batch(self, websocket: WebSocket, messages: List[dict], text_frames: Dict[int, str]) -> bool:
+        async def send_all():
+            async with self._send_lock(websocket):
+                for message in messages:
+                    await self._write(websocket, message, text_frames)
+
+        try:
+            await asyncio.wait_for(send_all(), timeout=self.send_timeout)
+            return True
+        except asyncio.TimeoutError:
+            print(f"WebSocket client did not accept its batch within {self.send_timeout}s, dropping it")
+            try:
+                await asyncio.wait_for(websocket.close(code=1013), timeout=1.0)
+            except Exception:
+                pass
+        except Exception as e:
+            print(f"Error sending to WebSocket: {e}")
+        return False
 
 # Create a global instance of the connection manager
 manager = ConnectionManager()
@@ -0,0 +1,213 @@
+"""
+Multi-route and viewport websocket subscriptions
+
+A client on /ws/vehicles chooses what it sees over the socket itself:
+route filters, a viewport bounding box, or all vehicles. The index finds the
+clients interested in a vehicle without scanning every subscription. Route
+filters are looked up in a route index. Viewport-only subscriptions are
+registered in the cells of a coarse lat/lon grid, so a vehicle position
+only checks the subscribers whose viewport overlaps its cell.
+"""
+
+import math
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+# (min_lon, min_lat, max_lon, max_lat), the GeoJSON bbox order
+BBox = Tuple[float, float, float, float]
+
+
+class Subscription:
+    """What one client wants to receive."""
+
+    def __init__(self, agency_key: str = "golden_gate", agency_id: Optional[str] = None):
+        self.agency_key = agency_key
+        # The feed's agency_id, which vehicles carry as "agency"; other agencies' vehicles never match
+        self.agency_id = agency_id
+        self.routes: Set[str] = set()
+        self.bbox: Optional[BBox] = None
+        self.all = False
+        # Vehicle ids the client currently shows, so it can be told when one leaves its view
+        self.visible: Set[str] = set()
+
+    @property
+    def active(self) -> bool:
+        return self.all or bool(self.routes) or self.bbox is not None
+
+    def matches(self, vehicle: Dict[str, Any]) -> bool:
+        """
+        Route filters and the viewport combine: with both set, a vehicle must
+        be on a subscribed route and inside the viewport.
+        """
+        if not self.active:
+            return False
+        if self.agency_id is not None and vehicle.get("agency") != self.agency_id:
+            return False
+        if self.routes and not self.all and vehicle.get("route_id") not in self.routes:
+            return False
+        if self.bbox is not None:
+            lat, lon = vehicle.get("latitude"), vehicle.get("longitude")
+            if lat is None or lon is None:
+                return False
+            min_lon, min_lat, max_lon, max_lat = self.bbox
+            return min_lat <= lat <= max_lat and min_lon <= lon <= max_lon
+        return True
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "agency": self.agency_key,
+            "routes": sorted(self.routes),
+            "bbox": list(self.bbox) if self.bbox else None,
+            "all": self.all,
+        }
+
+
+class SubscriptionIndex:
+    """Route index and spatial grid over client subscriptions."""
+
+    def __init__(self, cell_size: float = 0.05, max_cells: int = 2500):
+        self.cell_size = cell_size
+        # Viewports covering more cells than this are checked exactly on every vehicle
+        self.max_cells = max_cells
+        self.subscriptions: Dict[Hashable, Subscription] = {}
+        self.by_route: Dict[str, Set[Hashable]] = {}
+        self.grid: Dict[Tuple[int, int], Set[Hashable]] = {}
+        self.wide: Set[Hashable] = set()
+        self.everyone: Set[Hashable] = set()
+        # vehicle_id -> clients currently showing it
+        self.viewers: Dict[str, Set[Hashable]] = {}
+
+    def __len__(self) -> int:
+        return len(self.subscriptions)
+
+    def add(self, key: Hashable, subscription: Subscription) -> None:
+        self.subscriptions[key] = subscription
+        self._index(key, subscription)
+
+    def remove(self, key: Hashable) -> None:
+        subscription = self.subscriptions.pop(key, None)
+        if subscription is None:
+            return
+        self._unindex(key, subscription)
+        for vehicle_id in subscription.visible:
+            self._drop_viewer(vehicle_id, key)
+
+    def update(
+        self,
+        key: Hashable,
+        add_routes: Iterable[str] = (),
+        remove_routes: Iterable[str] = (),
+        bbox: Any = ...,
+        all: Optional[bool] = None,
+    ) -> Subscription:
+        """Change a subscription and re-index it. ``bbox=None`` clears the viewport."""
+        subscription = self.subscriptions[key]
+        # Validated before anything changes, so a bad request leaves the subscription intact
+        add_routes = self.parse_routes(add_routes)
+        remove_routes = self.parse_routes(remove_routes)
+        if bbox is not ...:
+            bbox = self.parse_bbox(bbox) if bbox is not None else None
+        self._unindex(key, subscription)
+        subscription.routes.update(add_routes)
+        subscription.routes.difference_update(remove_routes)
+        if bbox is not ...:
+            subscription.bbox = bbox
+        if all is not None:
+            subscription.all = bool(all)
+        self._index(key, subscription)
+        return subscription
+
+    def candidates(self, vehicle: Dict[str, Any]) -> Set[Hashable]:
+        """Clients that may want the vehicle; confirm with Subscription.matches."""
+        found = set(self.everyone)
+        found |= self.wide
+        route_id = vehicle.get("route_id")
+        if route_id in self.by_route:
+            found |= self.by_route[route_id]
+        if self.grid and vehicle.get("latitude") is not None and vehicle.get("longitude") is not None:
+            found |= self.grid.get(self._cell(vehicle["latitude"], vehicle["longitude"]), set())
+        return found
+
+    def match(self, vehicle: Dict[str, Any]) -> Set[Hashable]:
+        return {key for key in self.candidates(vehicle) if self.subscriptions[key].matches(vehicle)}
+
+    def set_visible(self, key: Hashable, vehicle_id: str, visible: bool) -> None:
+        subscription = self.subscriptions.get(key)
+        if subscription is None:
+            return
+        if visible:
+            subscription.visible.add(vehicle_id)
+            self.viewers.setdefault(vehicle_id, set()).add(key)
+        else:
+            subscription.visible.discard(vehicle_id)
+            self._drop_viewer(vehicle_id, key)
+
+    def reset_visible(self, key: Hashable, vehicle_ids: Iterable[str]) -> None:
+        subscription = self.subscriptions[key]
+        for vehicle_id in subscription.visible:
+            self._drop_viewer(vehicle_id, key)
+        subscription.visible = set()
+        for vehicle_id in vehicle_ids:
+            self.set_visible(key, vehicle_id, True)
+
+    @staticmethod
+    def parse_routes(value: Any) -> List[str]:
+        """Validate a list of route ids (a bare string would otherwise be read as its characters)."""
+        if not isinstance(value, (list, tuple, set)):
+            raise ValueError("routes must be a list of route ids")
+        return [str(route_id) for route_id in value]
+
+    @staticmethod
+    def parse_bbox(value: Any) -> BBox:
+        """Validate ``[min_lon, min_lat, max_lon, max_lat]``."""
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(v) for v in value)
+        except (TypeError, ValueError):
+            raise ValueError("bbox must be [min_lon, min_lat, max_lon, max_lat]")
+        if not (-180 <= min_lon <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+            raise ValueError("bbox must be [min_lon, min_lat, max_lon, max_lat] within valid coordinates")
+        return (min_lon, min_lat, max_lon, max_lat)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    def _cells(self, bbox: BBox) -> Optional[List[Tuple[int, int]]]:
+        min_lon, min_lat, max_lon, max_lat = bbox
+        (y0, x0), (y1, x1) = self._cell(min_lat, min_lon), self._cell(max_lat, max_lon)
+        if (y1 - y0 + 1) * (x1 - x0 + 1) > self.max_cells:
+            return None
+        return [(y, x) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)]
+
+    def _index(self, key: Hashable, subscription: Subscription) -> None:
+        # Each subscription lives under its most selective key only
+        if subscription.routes and not subscription.all:
+            for route_id in subscription.routes:
+                self.by_route.setdefault(route_id, set()).add(key)
+        elif subscription.bbox is not None:
+            cells = self._cells(subscription.bbox)
+            if cells is None:
+                self.wide.add(key)
+            else:
+                for cell in cells:
+                    self.grid.setdefault(cell, set()).add(key)
+        elif subscription.all:
+            self.everyone.add(key)
+
+    def _unindex(self, key: Hashable, subscription: Subscription) -> None:
+        for route_id in subscription.routes:
+            self._discard(self.by_route, route_id, key)
+        if subscription.bbox is not None:
+            for cell in self._cells(subscription.bbox) or ():
+                self._discard(self.grid, cell, key)
+        self.wide.discard(key)
+        self.everyone.discard(key)
+
+    def _drop_viewer(self, vehicle_id: str, key: Hashable) -> None:
+        self._discard(self.viewers, vehicle_id, key)
+
+    @staticmethod
+    def _discard(mapping: Dict[Any, Set[Hashable]], name: Any, key: Hashable) -> None:
+        keys = mapping.get(name)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del mapping[name]
@@ -6,24 +6,27 @@ from transit agencies and updates the database periodically.
 """
 
 import asyncio
+import hashlib
 import httpx
-import zipfile
-import io
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
 import json
 from pathlib import Path
 
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import SessionLocal
-from app.models.gtfs_static import GTFSRoute, GTFSStop, GTFSTrip, GTFSStopTime, GTFSCalendar, GTFSCalendarDate, GTFSShape
-from app.schemas.gtfs_static import (
-    GTFSRouteBase, GTFSStopBase, GTFSTripBase, GTFSStopTimeBase, 
-    GTFSCalendarBase, GTFSCalendarDateBase, GTFSShapeBase
-)
-from app.crud.vehicle_crud import bulk_create_or_update_vehicle_positions
-from data_ingestion.gtfs_static_loader import _load_csv_to_db
+from sqlalchemy.future import select
+
+from app.cache.timetables import route_timetables
+from app.cache.trips import trip_updates_cache
+from app.cache.versions import static_feed_versions
+from app.core.config import settings
+from app.core.database import IngestSessionLocal, SessionLocal
+from app.models.vehicle import LiveVehiclePosition
+from app.realtime.notifier import snapshot_notifier
+from app.realtime.snapshot import snapshot_store
+from app.websocket.manager import manager
+from app.crud.vehicle_crud import bulk_create_or_update_vehicle_positions, replace_trip_updates
+from data_ingestion.static_load_orchestrator import static_load_orchestrator
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -64,26 +67,125 @@ class AutoGTFSUpdater:
         
         self.last_static_update = {}
         self.vehicle_positions = {}
+
+        # Downloaded static archives are kept on disk, keyed by agency
+        self.cache_dir = Path(settings.GTFS_CACHE_DIR)
+        self.download_chunk_size = 1024 * 1024  # 1 MB
+        self.feed_versions = {}  # sha256 of the cached archive per agency
+        # sha256 of the archive last loaded into the DB, persisted as loaded_sha256 in feed.json
+        self.loaded_feed_versions = {}
+        self.last_static_load_timings = {}  # per-table load seconds of the last load
         
-    async def download_gtfs_static(self, agency_key: str) -> Optional[bytes]:
-        """Download GTFS static data for an agency."""
+    async def download_gtfs_static(self, agency_key: str) -> Optional[Path]:
+        """
+        Download GTFS static data for an agency into the feed cache.
+
+        The archive is streamed to disk in chunks rather than held in memory.
+        A conditional request is sent when a cached archive exists, and an
+        unchanged feed (HTTP 304 or same checksum) reuses the cached file.
+        The previously cached archive is kept as ``feed.prev.zip`` for diffing.
+        """
         feed_info = self.gtfs_feeds.get(agency_key)
         if not feed_info:
             logger.error(f"Unknown agency: {agency_key}")
             return None
-            
+
+        agency_dir = self.cache_dir / agency_key
+        archive_path = agency_dir / "feed.zip"
+        meta_path = self._feed_meta_path(agency_key)
+        partial_path = agency_dir / "feed.zip.part"
+
         try:
+            agency_dir.mkdir(parents=True, exist_ok=True)
+            cached_meta = self._read_feed_meta(meta_path) if archive_path.exists() else {}
+
+            headers = {}
+            if cached_meta.get("etag"):
+                headers["If-None-Match"] = cached_meta["etag"]
+            if cached_meta.get("last_modified"):
+                headers["If-Modified-Since"] = cached_meta["last_modified"]
+
             logger.info(f"Downloading GTFS static data for {feed_info['name']}...")
-            async with httpx.AsyncClient(timeout=self.session_timeout) as client:
-                response = await client.get(feed_info["static_url"])
-                response.raise_for_status()
-                logger.info(f"Downloaded {len(response.content)} bytes for {feed_info['name']}")
-                return response.content
-                
+            digest = hashlib.sha256()
+            size = 0
+            async with httpx.AsyncClient(timeout=self.session_timeout, follow_redirects=True) as client:
+                async with client.stream("GET", feed_info["static_url"], headers=headers) as response:
+                    if response.status_code == 304:
+                        logger.info(f"GTFS static feed for {feed_info['name']} not modified, reusing cached archive")
+                        self.feed_versions[agency_key] = cached_meta.get("sha256")
+                        return archive_path
+                    response.raise_for_status()
+
+                    with open(partial_path, "wb") as out:
+                        async for chunk in response.aiter_bytes(self.download_chunk_size):
+                            out.write(chunk)
+                            digest.update(chunk)
+                            size += len(chunk)
+
+                    meta = {
+                        "sha256": digest.hexdigest(),
+                        "size": size,
+                        "etag": response.headers.get("etag"),
+                        "last_modified": response.headers.get("last-modified"),
+                        "downloaded_at": datetime.now().isoformat(),
+                        "url": feed_info["static_url"],
+                        # The database still holds the previously loaded feed
+                        "loaded_sha256": cached_meta.get("loaded_sha256"),
+                    }
+
+            if archive_path.exists() and cached_meta.get("sha256") == meta["sha256"]:
+                partial_path.unlink()
+                logger.info(f"GTFS static feed for {feed_info['name']} unchanged ({size} bytes), reusing cached archive")
+            else:
+                if archive_path.exists():
+                    archive_path.replace(agency_dir / "feed.prev.zip")
+                partial_path.replace(archive_path)
+                logger.info(f"Downloaded {size} bytes for {feed_info['name']} to {archive_path}")
+
+            meta_path.write_text(json.dumps(meta, indent=2))
+            self.feed_versions[agency_key] = meta["sha256"]
+            return archive_path
+
         except Exception as e:
             logger.error(f"Failed to download GTFS static data for {agency_key}: {e}")
+            if partial_path.exists():
+                partial_path.unlink()
             return None
-    
+
+    def _feed_meta_path(self, agency_key: str) -> Path:
+        return self.cache_dir / agency_key / "feed.json"
+
+    @staticmethod
+    def _read_feed_meta(meta_path: Path) -> Dict:
+        """Read the metadata sidecar of a cached feed archive."""
+        try:
+            return json.loads(meta_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _loaded_feed_version(self, agency_key: str) -> Optional[str]:
+        """
+        sha256 of the archive last loaded into the database. Read from the
+        feed.json sidecar after a restart, so an unchanged feed is not
+        reloaded just because the process started again.
+        """
+        if agency_key not in self.loaded_feed_versions:
+            meta = self._read_feed_meta(self._feed_meta_path(agency_key))
+            self.loaded_feed_versions[agency_key] = meta.get("loaded_sha256")
+        return self.loaded_feed_versions[agency_key]
+
+    def _mark_feed_loaded(self, agency_key: str, feed_version: Optional[str]) -> None:
+        """Record ``feed_version`` as loaded, in memory and in the feed.json sidecar."""
+        self.loaded_feed_versions[agency_key] = feed_version
+        meta_path = self._feed_meta_path(agency_key)
+        meta = self._read_feed_meta(meta_path)
+        meta["loaded_sha256"] = feed_version
+        meta["loaded_at"] = datetime.now().isoformat()
+        try:
+            meta_path.write_text(json.dumps(meta, indent=2))
+        except OSError as e:
+            logger.error(f"Failed to record loaded feed version for {agency_key}: {e}")
+
     async def update_static_data(self, agency_key: str = "golden_gate") -> bool:
         """Update GTFS static data for an agency."""
         feed_info = self.gtfs_feeds.get(agency_key)
@@ -98,29 +200,51 @@ class AutoGTFSUpdater:
             return True
             
         # Download new data
-        gtfs_data = await self.download_gtfs_static(agency_key)
-        if not gtfs_data:
+        archive_path = await self.download_gtfs_static(agency_key)
+        if not archive_path:
             return False
+
+        feed_version = self.feed_versions.get(agency_key)
+        if feed_version and self._loaded_feed_version(agency_key) == feed_version:
+            logger.info(f"Static data for {agency_key} already loaded from feed version {feed_version[:12]}")
+            self.last_static_update[agency_key] = datetime.now()
+            await self._publish_timetables(agency_key)
+            static_feed_versions.set(agency_key, feed_version)
+            return True
             
         try:
-            # Use existing loader function to actually load the data
-            gtfs_zip = zipfile.ZipFile(io.BytesIO(gtfs_data))
-            
-            async with SessionLocal() as db:
-                logger.info(f"Loading GTFS data for {feed_info['name']} into database...")
-                
-                # Load each GTFS file in proper order
-                await self._load_gtfs_files(db, gtfs_zip, agency_key)
-                await db.commit()
-                
-                logger.info(f"Successfully loaded GTFS data for {feed_info['name']}")
-                self.last_static_update[agency_key] = datetime.now()
-                return True
+            logger.info(f"Loading GTFS data for {feed_info['name']} into database...")
+
+            # Tables are staged concurrently and replace the live tables in one transaction
+            timings = await self._load_gtfs_files(archive_path, agency_key, feed_version)
+
+            self.last_static_load_timings[agency_key] = timings
+            logger.info(f"Successfully loaded GTFS data for {feed_info['name']} in {timings.get('total')}s")
+            self.last_static_update[agency_key] = datetime.now()
+            self._mark_feed_loaded(agency_key, feed_version)
+            # Stored before the announcement, so workers reload the new timetables
+            await self._publish_timetables(agency_key)
+            static_feed_versions.set(agency_key, feed_version)
+
+            # Let the other workers drop caches built from the previous feed
+            try:
+                await snapshot_notifier.publish_static(agency_key, feed_version)
+            except Exception as e:
+                logger.error(f"Error publishing static feed notification: {e}")
+            return True
                     
         except Exception as e:
             logger.error(f"Error processing static data for {agency_key}: {e}")
             return False
     
+    async def _publish_timetables(self, agency_key: str) -> None:
+        """Build the route timetables of the loaded feed once, for every worker."""
+        try:
+            await route_timetables.publish()
+        except Exception as e:
+            # Workers build the timetables themselves until the next load stores them
+            logger.error(f"Error building route timetables for {agency_key}: {e}")
+
     async def fetch_realtime_vehicles(self, agency_key: str = "golden_gate") -> Optional[List[Dict]]:
         """Fetch real-time vehicle positions."""
         feed_info = self.gtfs_feeds.get(agency_key)
@@ -163,7 +287,9 @@ class AutoGTFSUpdater:
                                         "longitude": vehicle.position.longitude,
                                         "bearing": vehicle.position.bearing if vehicle.position.HasField('bearing') else None,
                                         "speed": vehicle.position.speed if vehicle.position.HasField('speed') else None,
-                                        "timestamp": datetime.now().isoformat(),
+                                        "timestamp": self._fix_timestamp(
+                                            vehicle.timestamp if vehicle.HasField('timestamp') else None
+                                        ),
                                         "agency": feed_info["agency_id"],
                                         "status": vehicle.current_status if vehicle.HasField('current_status') else None
                                     })
@@ -210,12 +336,18 @@ class AutoGTFSUpdater:
                             "longitude": vehicle["position"].get("longitude"),
                             "bearing": vehicle["position"].get("bearing"),
                             "speed": vehicle["position"].get("speed"),
-                            "timestamp": datetime.now().isoformat(),
+                            "timestamp": self._fix_timestamp(vehicle.get("timestamp")),
                             "agency": feed_info["agency_id"]
                         })
         
         return vehicles
     
+    @staticmethod
+    def _fix_timestamp(feed_timestamp: Optional[int]) -> str:
+        """When the vehicle reported its position (POSIX seconds in the feed), or now if it did not say."""
+        fix_time = datetime.fromtimestamp(int(feed_timestamp)) if feed_timestamp else datetime.now()
+        return fix_time.isoformat()
+
     def _is_vehicle_active(self, vehicle) -> bool:
         """
         Determine if a vehicle is actively in service.
@@ -311,14 +443,13 @@ class AutoGTFSUpdater:
         vehicles = await self.fetch_realtime_vehicles(agency_key)
         if vehicles:
             # Store in memory for immediate access
-            self.vehicle_positions[agency_key] = {
-                "timestamp": datetime.now(),
-                "vehicles": vehicles
-            }
+            previous = snapshot_store.get(agency_key).vehicles
+            delta = snapshot_store.publish(agency_key, vehicles)
+            self._sync_vehicle_positions(agency_key)
             
             # Save to database for persistence
             try:
-                async with SessionLocal() as db:
+                async with IngestSessionLocal() as db:
                     # Convert vehicle data to format expected by database
                     vehicle_positions_data = []
                     for vehicle in vehicles:
@@ -330,7 +461,10 @@ class AutoGTFSUpdater:
                             'speed': vehicle.get('speed'),
                             'bearing': vehicle.get('bearing'),
                             'trip_id': vehicle.get('trip_id'),
-                            'timestamp': datetime.utcnow()
+                            # The vehicle's own fix time, in UTC like the rest of the table
+                            'timestamp': datetime.utcfromtimestamp(
+                                datetime.fromisoformat(vehicle['timestamp']).timestamp()
+                            )
                         }
                         # Only add vehicles with valid required data
                         if all([position_data['vehicle_id'], position_data['route_id'], 
@@ -344,8 +478,45 @@ class AutoGTFSUpdater:
             except Exception as e:
                 logger.error(f"Error saving vehicle positions to database: {e}")
             
-            # TODO: Broadcast to WebSocket clients
+            # Announce the new snapshot to the other workers
+            try:
+                snapshot = snapshot_store.get(agency_key)
+                await snapshot_notifier.publish(agency_key, snapshot.epoch, snapshot.seq, delta)
+            except Exception as e:
+                logger.error(f"Error publishing snapshot notification: {e}")
+
+            # Broadcast changes to WebSocket clients of the affected routes
+            await self._broadcast_delta(delta, previous, snapshot_store.seq(agency_key))
             logger.info(f"Updated {len(vehicles)} vehicle positions for {agency_key}")
+
+    async def _broadcast_delta(self, delta: Dict, previous: Dict[str, Dict], seq: int):
+        """Send a snapshot delta to the WebSocket clients of each affected route."""
+        try:
+            for vehicle in delta["upserts"]:
+                old_route = previous.get(vehicle["vehicle_id"], {}).get("route_id")
+                if old_route and old_route != vehicle.get("route_id"):
+                    await manager.broadcast(old_route, {
+                        "type": "vehicle_removed", "seq": seq, "data": {"vehicle_id": vehicle["vehicle_id"]}
+                    })
+                if vehicle.get("route_id"):
+                    await manager.broadcast(vehicle["route_id"], {"type": "vehicle_update", "seq": seq, "data": vehicle})
+            for vehicle_id in delta["removed"]:
+                route_id = previous.get(vehicle_id, {}).get("route_id")
+                if route_id:
+                    await manager.broadcast(route_id, {
+                        "type": "vehicle_removed", "seq": seq, "data": {"vehicle_id": vehicle_id}
+                    })
+        except Exception as e:
+            logger.error(f"Error broadcasting vehicle updates: {e}")
+
+    def _sync_vehicle_positions(self, agency_key: str):
+        """Mirror the agency's snapshot into the vehicle_positions cache."""
+        snapshot = snapshot_store.get(agency_key)
+        self.vehicle_positions[agency_key] = {
+            "timestamp": snapshot.timestamp,
+            "vehicles": snapshot.vehicle_list(),
+            "seq": snapshot.seq
+        }
     
     async def get_current_vehicles(self, agency_key: str = "golden_gate", route_id: str = None) -> List[Dict]:
         """Get current vehicle positions, optionally filtered by route."""
@@ -357,6 +528,96 @@ class AutoGTFSUpdater:
             
         return vehicles
     
+    async def refresh_vehicle_positions_from_db(self, agency_key: str = "golden_gate", seq: int = 0,
+                                                epoch: Optional[str] = None) -> int:
+        """
+        Refresh the in-memory vehicle snapshot from the positions the ingestion
+        leader wrote to the database. Used by follower processes, which do not
+        poll the upstream feed themselves.
+        """
+        feed_info = self.gtfs_feeds.get(agency_key)
+        if not feed_info:
+            logger.error(f"Unknown agency: {agency_key}")
+            return 0
+
+        cutoff = datetime.utcnow() - timedelta(minutes=15)
+        async with SessionLocal() as db:
+            result = await db.execute(
+                select(LiveVehiclePosition).where(LiveVehiclePosition.timestamp > cutoff)
+            )
+            positions = result.scalars().all()
+
+        vehicles = [{
+            "vehicle_id": position.vehicle_id,
+            "route_id": position.route_id,
+            "trip_id": position.trip_id,
+            "latitude": position.latitude,
+            "longitude": position.longitude,
+            "bearing": position.bearing,
+            "speed": position.speed,
+            # Stored in UTC; the in-memory snapshot holds local fix times like the leader's
+            "timestamp": datetime.fromtimestamp(
+                position.timestamp.replace(tzinfo=timezone.utc).timestamp()
+            ).isoformat() if position.timestamp else None,
+            "agency": feed_info["agency_id"],
+            "status": position.current_status
+        } for position in positions]
+
+        snapshot_store.replace(agency_key, vehicles, seq, epoch)
+        self._sync_vehicle_positions(agency_key)
+        return len(vehicles)
+
+    async def start_follower_refresh(self, agencies: List[str] = None, is_follower: Callable[[], bool] = lambda: True):
+        """
+        Follow the ingestion leader's snapshot notifications while this process
+        is not the leader. Deltas carried in a notification are applied in
+        memory; the snapshot is reloaded from the database only when a
+        notification has no delta, comes from a new leader epoch, or a
+        sequence number was missed.
+        """
+        if agencies is None:
+            agencies = ["golden_gate"]
+
+        async def on_snapshot(message: Dict):
+            if not is_follower():
+                return
+
+            if message.get("resync"):
+                trip_updates_cache.invalidate()
+                # Static loads announced while not listening (or before this process started)
+                try:
+                    for agency, version in (await static_feed_versions.refresh()).items():
+                        self.loaded_feed_versions[agency] = version
+                except Exception as e:
+                    logger.error(f"Error reading loaded static feed versions: {e}")
+                for agency in agencies:
+                    await self.refresh_vehicle_positions_from_db(agency)
+                return
+
+            agency = message.get("agency")
+            if agency not in agencies:
+                return
+
+            if "static_version" in message:
+                self.loaded_feed_versions[agency] = message["static_version"]
+                static_feed_versions.set(agency, message["static_version"])
+                return
+
+            if "trip_updates" in message:
+                # Read from the database on the next request
+                trip_updates_cache.invalidate(agency)
+                return
+
+            # A delta from another epoch (a new leader) or out of sequence means a full reload
+            delta = message.get("delta")
+            epoch = message.get("epoch")
+            if delta is not None and snapshot_store.apply_delta(agency, epoch, message["seq"], delta):
+                self._sync_vehicle_positions(agency)
+            else:
+                await self.refresh_vehicle_positions_from_db(agency, seq=message["seq"], epoch=epoch)
+
+        await snapshot_notifier.listen(on_snapshot)
+
     async def start_realtime_updates(self, agencies: List[str] = None):
         """Start continuous real-time vehicle position updates."""
         if agencies is None:
@@ -456,22 +717,27 @@ class AutoGTFSUpdater:
             logger.error(f"Failed to fetch trip updates for {agency_key}: {e}")
             return None
     
-    async def _load_gtfs_files(self, db: AsyncSession, gtfs_zip: zipfile.ZipFile, agency_key: str):
-        """Load GTFS files into database in proper order."""
+    async def update_trip_updates(self, agency_key: str = "golden_gate"):
+        """Fetch trip updates and publish them to the other workers through the database."""
+        updates = await self.fetch_trip_updates(agency_key)
+        if updates is None:
+            return
+
+        trip_updates_cache.store(agency_key, updates)
         try:
-            # Load in order of dependencies
-            await _load_csv_to_db(db, gtfs_zip, 'routes.txt', GTFSRoute, GTFSRouteBase)
-            await _load_csv_to_db(db, gtfs_zip, 'stops.txt', GTFSStop, GTFSStopBase)
-            await _load_csv_to_db(db, gtfs_zip, 'shapes.txt', GTFSShape, GTFSShapeBase)
-            await _load_csv_to_db(db, gtfs_zip, 'trips.txt', GTFSTrip, GTFSTripBase)
-            await _load_csv_to_db(db, gtfs_zip, 'stop_times.txt', GTFSStopTime, GTFSStopTimeBase)
-            await _load_csv_to_db(db, gtfs_zip, 'calendar.txt', GTFSCalendar, GTFSCalendarBase)
-            
-            # calendar_dates.txt is optional
-            if 'calendar_dates.txt' in gtfs_zip.namelist():
-                await _load_csv_to_db(db, gtfs_zip, 'calendar_dates.txt', GTFSCalendarDate, GTFSCalendarDateBase)
-            
+            async with IngestSessionLocal() as db:
+                await replace_trip_updates(db, agency_key, updates)
+            await snapshot_notifier.publish_trip_updates(agency_key, len(updates))
+        except Exception as e:
+            logger.error(f"Error publishing trip updates for {agency_key}: {e}")
+
+    async def _load_gtfs_files(self, archive_path: Path, agency_key: str,
+                               feed_version: Optional[str] = None) -> Dict[str, float]:
+        """Replace the static tables with the archive's GTFS files."""
+        try:
+            timings = await static_load_orchestrator.load(archive_path, agency_key, feed_version)
             logger.info(f"All GTFS files loaded successfully for {agency_key}")
+            return timings
             
         except Exception as e:
             logger.error(f"Error loading GTFS files for {agency_key}: {e}")
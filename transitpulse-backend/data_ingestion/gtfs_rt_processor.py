@@ -16,7 +16,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 # Now import the app modules
 try:
-    from app.core.database import SessionLocal
+    from app.core.database import IngestSessionLocal
     from app.models.vehicle import LiveVehiclePosition
     from app.schemas.vehicle import LiveVehiclePositionCreate
     from app.core.config import settings
@@ -98,7 +98,7 @@ async def fetch_and_process_gtfs_rt_data():
             feed = gtfs_realtime_pb2.FeedMessage()
             feed.ParseFromString(response.content)
 
-            async with SessionLocal() as db:
+            async with IngestSessionLocal() as db:
                 updated_count = 0
                 new_count = 0
 
@@ -1,23 +1,21 @@
 import zipfile
 import io
 import csv
-from datetime import datetime, time, date
-from typing import List, Dict, Any, Optional
+import mmap
+import tempfile
+from contextlib import contextmanager
+from itertools import islice
+from datetime import datetime
+from pathlib import Path
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
 
 import httpx
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy.future import select
 
-from app.core.database import SessionLocal, create_db_and_tables
+from app.utils.gtfs_time import NO_TIME, parse_gtfs_times
 from app.models.gtfs_static import (
-    GTFSRoute, GTFSStop, GTFSShape, GTFSTrip,
+    GTFSStop, GTFSShape, GTFSTrip,
     GTFSStopTime, GTFSCalendar, GTFSCalendarDate
 )
-from app.schemas.gtfs_static import (
-    GTFSRouteBase, GTFSStopBase, GTFSShapeBase, GTFSTripBase,
-    GTFSStopTimeBase, GTFSCalendarBase, GTFSCalendarDateBase
-)
 
 # --- Configuration ---
 # Operator IDs for Golden Gate Transit and Ferry
@@ -29,120 +27,137 @@ GTFS_STATIC_URL = "https://gtfs.goldengate.org/gtfs/google_transit.zip"
 # URL for Golden Gate Transit GTFS Static data download
 GTFS_DATA_URL = GTFS_STATIC_URL
 
-def parse_gtfs_time(time_str: str) -> Optional[time]:
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+# Rows parsed together, so stop times are converted a whole column at a time
+PARSE_CHUNK_ROWS = 50_000
+
+# --- Archive Access ---
+
+class _MappedArchive(mmap.mmap):
+    """Read-only memory map usable as the file object of a ZipFile."""
+
+    def seekable(self) -> bool:
+        return True
+
+@contextmanager
+def open_gtfs_archive(path: Union[str, Path]) -> Iterator[zipfile.ZipFile]:
     """
-    Parse GTFS time format which can include times like 24:00:00, 25:30:00, etc.
-    These represent times after midnight (next day).
-    For simplicity, we'll convert times >= 24:00:00 to their equivalent within 24-hour format.
+    Open a GTFS zip archive on disk through a read-only memory map.
+
+    Member reads are served from the page cache instead of a Python-side
+    copy of the archive, so memory use does not grow with the feed size.
     """
-    if not time_str:
-        return None
-    
-    try:
-        # Split the time string
-        parts = time_str.split(':')
-        if len(parts) != 3:
-            return None
-            
-        hours = int(parts[0])
-        minutes = int(parts[1])
-        seconds = int(parts[2])
-        
-        # Handle times >= 24:00:00 by converting to next day equivalent
-        if hours >= 24:
-            hours = hours % 24
-        
-        return time(hours, minutes, seconds)
-    except (ValueError, TypeError):
-        return None
+    with open(path, 'rb') as fh:
+        with _MappedArchive(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with zipfile.ZipFile(mapped, 'r') as zf:
+                yield zf
 
 # --- Data Parsing and Loading Functions ---
 
-async def _load_csv_to_db(
-    db: AsyncSession,
-    zip_file: zipfile.ZipFile,
+def _clean_row(model_class, row: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """Convert the values of a CSV row to the types of the model, or None to skip the row."""
+    # Clean up data: replace empty strings with None
+    cleaned_row = {k: (v if v != '' else None) for k, v in row.items()}
+
+    # Convert types as necessary for SQLAlchemy models
+    if model_class == GTFSStop:
+        # Handle potential non-numeric values for lat/lon
+        try:
+            cleaned_row['stop_lat'] = float(cleaned_row['stop_lat']) if cleaned_row.get('stop_lat') else None
+            cleaned_row['stop_lon'] = float(cleaned_row['stop_lon']) if cleaned_row.get('stop_lon') else None
+        except (ValueError, TypeError):
+            print(f"Warning: Invalid lat/lon for stop {cleaned_row.get('stop_id')}")
+            return None  # Skip invalid stop
+
+    if model_class == GTFSTrip:
+        cleaned_row['direction_id'] = int(cleaned_row['direction_id']) if cleaned_row.get('direction_id') else None
+        cleaned_row['wheelchair_accessible'] = int(cleaned_row['wheelchair_accessible']) if cleaned_row.get('wheelchair_accessible') else None
+        cleaned_row['bikes_allowed'] = int(cleaned_row['bikes_allowed']) if cleaned_row.get('bikes_allowed') else None
+
+    if model_class == GTFSCalendar:
+        for day in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']:
+            cleaned_row[day] = int(cleaned_row[day]) if cleaned_row.get(day) else 0
+        cleaned_row['start_date'] = datetime.strptime(cleaned_row['start_date'], '%Y%m%d').date() if cleaned_row.get('start_date') else None
+        cleaned_row['end_date'] = datetime.strptime(cleaned_row['end_date'], '%Y%m%d').date() if cleaned_row.get('end_date') else None
+
+    if model_class == GTFSStopTime:
+        cleaned_row['stop_sequence'] = int(cleaned_row['stop_sequence']) if cleaned_row.get('stop_sequence') else None
+        cleaned_row['pickup_type'] = int(cleaned_row['pickup_type']) if cleaned_row.get('pickup_type') else None
+        cleaned_row['drop_off_type'] = int(cleaned_row['drop_off_type']) if cleaned_row.get('drop_off_type') else None
+        cleaned_row['shape_dist_traveled'] = float(cleaned_row['shape_dist_traveled']) if cleaned_row.get('shape_dist_traveled') else None
+
+    if model_class == GTFSShape:
+        cleaned_row['shape_pt_lat'] = float(cleaned_row['shape_pt_lat']) if cleaned_row.get('shape_pt_lat') else None
+        cleaned_row['shape_pt_lon'] = float(cleaned_row['shape_pt_lon']) if cleaned_row.get('shape_pt_lon') else None
+        cleaned_row['shape_pt_sequence'] = int(cleaned_row['shape_pt_sequence']) if cleaned_row.get('shape_pt_sequence') else None
+        cleaned_row['shape_dist_traveled'] = float(cleaned_row['shape_dist_traveled']) if cleaned_row.get('shape_dist_traveled') else None
+
+    if model_class == GTFSCalendarDate:
+        cleaned_row['date'] = datetime.strptime(cleaned_row['date'], '%Y%m%d').date() if cleaned_row.get('date') else None
+        cleaned_row['exception_type'] = int(cleaned_row['exception_type']) if cleaned_row.get('exception_type') else None
+
+    return cleaned_row
+
+
+def _parse_stop_time_columns(rows: List[Dict[str, Any]]) -> None:
+    """Replace the arrival and departure times of a chunk of rows with seconds (None if missing or invalid)."""
+    for column in ('arrival_time', 'departure_time'):
+        seconds = parse_gtfs_times([row.get(column) for row in rows]).tolist()
+        for row, value in zip(rows, seconds):
+            row[column] = value if value != NO_TIME else None
+
+
+def write_table_csv(
+    archive_path: Union[str, Path],
     csv_filename: str,
     model_class,
     schema_class,
-    primary_key_field: str = None  # Field to check for existing records (e.g., 'route_id' for GTFSRoute)
-):
-    print(f"Loading {csv_filename}...")
-    try:
-        with zip_file.open(csv_filename) as f:
-            # Decode as UTF-8, ignore errors
-            reader = csv.DictReader(io.TextIOWrapper(f, 'utf-8', errors='ignore'))
-            rows_to_insert = []
-            existing_records_count = 0
-            total_records = 0
-
-            for row in reader:
-                total_records += 1
-                # Clean up data: replace empty strings with None
-                cleaned_row = {k: (v if v != '' else None) for k, v in row.items()}
-
-                # Convert types as necessary for SQLAlchemy models
-                if model_class == GTFSStop:
-                    # Handle potential non-numeric values for lat/lon
-                    try:
-                        cleaned_row['stop_lat'] = float(cleaned_row['stop_lat']) if cleaned_row.get('stop_lat') else None
-                        cleaned_row['stop_lon'] = float(cleaned_row['stop_lon']) if cleaned_row.get('stop_lon') else None
-                    except (ValueError, TypeError):
-                        print(f"Warning: Invalid lat/lon for stop {cleaned_row.get('stop_id')}")
-                        continue  # Skip invalid stop
-
-                if model_class == GTFSTrip:
-                    cleaned_row['direction_id'] = int(cleaned_row['direction_id']) if cleaned_row.get('direction_id') else None
-                    cleaned_row['wheelchair_accessible'] = int(cleaned_row['wheelchair_accessible']) if cleaned_row.get('wheelchair_accessible') else None
-                    cleaned_row['bikes_allowed'] = int(cleaned_row['bikes_allowed']) if cleaned_row.get('bikes_allowed') else None
-
-                if model_class == GTFSCalendar:
-                    for day in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']:
-                        cleaned_row[day] = int(cleaned_row[day]) if cleaned_row.get(day) else 0
-                    cleaned_row['start_date'] = datetime.strptime(cleaned_row['start_date'], '%Y%m%d').date() if cleaned_row.get('start_date') else None
-                    cleaned_row['end_date'] = datetime.strptime(cleaned_row['end_date'], '%Y%m%d').date() if cleaned_row.get('end_date') else None
-
-                if model_class == GTFSStopTime:
-                    cleaned_row['stop_sequence'] = int(cleaned_row['stop_sequence']) if cleaned_row.get('stop_sequence') else None
-                    cleaned_row['arrival_time'] = parse_gtfs_time(cleaned_row.get('arrival_time'))
-                    cleaned_row['departure_time'] = parse_gtfs_time(cleaned_row.get('departure_time'))
-                    cleaned_row['pickup_type'] = int(cleaned_row['pickup_type']) if cleaned_row.get('pickup_type') else None
-                    cleaned_row['drop_off_type'] = int(cleaned_row['drop_off_type']) if cleaned_row.get('drop_off_type') else None
-                    cleaned_row['shape_dist_traveled'] = float(cleaned_row['shape_dist_traveled']) if cleaned_row.get('shape_dist_traveled') else None
-
-                if model_class == GTFSShape:
-                    cleaned_row['shape_pt_lat'] = float(cleaned_row['shape_pt_lat']) if cleaned_row.get('shape_pt_lat') else None
-                    cleaned_row['shape_pt_lon'] = float(cleaned_row['shape_pt_lon']) if cleaned_row.get('shape_pt_lon') else None
-                    cleaned_row['shape_pt_sequence'] = int(cleaned_row['shape_pt_sequence']) if cleaned_row.get('shape_pt_sequence') else None
-                    cleaned_row['shape_dist_traveled'] = float(cleaned_row['shape_dist_traveled']) if cleaned_row.get('shape_dist_traveled') else None
-
-                if model_class == GTFSCalendarDate:
-                    cleaned_row['date'] = datetime.strptime(cleaned_row['date'], '%Y%m%d').date() if cleaned_row.get('date') else None
-                    cleaned_row['exception_type'] = int(cleaned_row['exception_type']) if cleaned_row.get('exception_type') else None
-
+    out_path: Union[str, Path]
+) -> Tuple[List[str], int]:
+    """
+    Parse and validate one GTFS file of the archive into a CSV file for COPY.
+
+    Rows are converted and validated with the Pydantic schema as before, then
+    written with the schema's columns and no header; missing values are
+    written as empty unquoted fields, which COPY reads as NULL. Runs in a
+    worker process, so it takes the archive path rather than an open
+    ZipFile. Rows are read in chunks; stop times have their arrival and
+    departure columns parsed per chunk rather than row by row. Returns the
+    column names and the number of rows written.
+    """
+    columns = list(schema_class.model_fields)
+    total_records = 0
+    written = 0
+    print(f"Parsing {csv_filename}...")
+    with open_gtfs_archive(archive_path) as zip_file, zip_file.open(csv_filename) as f, \
+            open(out_path, 'w', newline='', encoding='utf-8') as out:
+        # Decode as UTF-8, ignore errors
+        reader = csv.DictReader(io.TextIOWrapper(f, 'utf-8', errors='ignore'))
+        writer = csv.writer(out)
+        while True:
+            rows = list(islice(reader, PARSE_CHUNK_ROWS))
+            if not rows:
+                break
+            total_records += len(rows)
+            if model_class == GTFSStopTime:
+                _parse_stop_time_columns(rows)
+            for row in rows:
                 try:
+                    cleaned_row = _clean_row(model_class, row)
+                    if cleaned_row is None:
+                        continue
                     # Validate data with Pydantic schema
                     validated_data = schema_class(**cleaned_row)
-                    rows_to_insert.append(validated_data.model_dump())  # Use model_dump() for Pydantic v2
                 except Exception as e:
-                    print(f"Schema validation error for row in {csv_filename}: {e} - Row: {cleaned_row}")
+                    print(f"Skipping invalid row in {csv_filename}: {e} - Row: {row}")
                     continue
+                values = validated_data.model_dump()
+                writer.writerow([values[column] for column in columns])
+                written += 1
 
-                # Batch insert
-                if len(rows_to_insert) >= 1000:  # Adjust batch size as needed
-                    await db.execute(model_class.__table__.insert(), rows_to_insert)
-                    rows_to_insert = []
-
-            if rows_to_insert:  # Insert any remaining rows
-                await db.execute(model_class.__table__.insert(), rows_to_insert)
-
-        print(f"Finished loading {csv_filename}. Total records: {total_records}, Existing records skipped: {existing_records_count}")
-
-    except KeyError as e:
-        print(f"Warning: Expected column '{e}' not found in {csv_filename}. Skipping file.")
-    except zipfile.BadZipFile:
-        print(f"Error: {csv_filename} is not a valid file in the zip archive.")
-    except Exception as e:
-        print(f"Error processing {csv_filename}: {e}")
+    print(f"Finished parsing {csv_filename}. Total records: {total_records}, Rows written: {written}")
+    return columns, written
 
 
 async def load_gtfs_static_data():
@@ -152,60 +167,55 @@ async def load_gtfs_static_data():
     url = GTFS_DATA_URL
     print(f"Attempting to download GTFS data from {url}")
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, follow_redirects=True, timeout=30.0)  # Add timeout
-            response.raise_for_status()  # Raise an exception for bad status codes
-
-            # Check if the response is actually a ZIP file
-            if 'content-type' not in response.headers or 'zip' not in response.headers['content-type']:
-                print(f"Error: Expected ZIP file but received {response.headers.get('content-type')}. "
-                      f"Content snippet: {response.text[:500]}...")
-                # If it's not a zip, it might be an API error message
-                if response.status_code == 401:
+    with tempfile.TemporaryDirectory() as download_dir:
+        archive_path = Path(download_dir) / "gtfs.zip"
+        async with httpx.AsyncClient() as client:
+            try:
+                # Stream the archive to disk in chunks instead of holding it in memory
+                async with client.stream("GET", url, follow_redirects=True, timeout=30.0) as response:
+                    if response.is_error:
+                        await response.aread()
+                    response.raise_for_status()  # Raise an exception for bad status codes
+
+                    # Check if the response is actually a ZIP file
+                    if 'content-type' not in response.headers or 'zip' not in response.headers['content-type']:
+                        await response.aread()
+                        print(f"Error: Expected ZIP file but received {response.headers.get('content-type')}. "
+                              f"Content snippet: {response.text[:500]}...")
+                        # If it's not a zip, it might be an API error message
+                        if response.status_code == 401:
+                            print("Authentication Error: Invalid API Key. Please check your API key.")
+                        elif response.status_code == 404:
+                            print(f"Not Found: Operator ID 'Golden Gate Transit' might be incorrect or data not available.")
+                        return False  # Indicate failure
+
+                    with open(archive_path, 'wb') as out:
+                        async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                            out.write(chunk)
+
+                # Imported here: the orchestrator imports this module's parser
+                from data_ingestion.static_load_orchestrator import load_static_tables
+
+                # All tables are replaced in one transaction, so a reload does not duplicate rows
+                timings = await load_static_tables(archive_path)
+                print(f"GTFS static data for 'Golden Gate Transit' loaded successfully in {timings['total']}s.")
+                return True
+            except httpx.HTTPStatusError as e:
+                print(f"HTTP error occurred during download for 'Golden Gate Transit': {e.response.status_code} - {e.response.text}")
+                if e.response.status_code == 401:
                     print("Authentication Error: Invalid API Key. Please check your API key.")
-                elif response.status_code == 404:
+                elif e.response.status_code == 404:
                     print(f"Not Found: Operator ID 'Golden Gate Transit' might be incorrect or data not available.")
-                return False  # Indicate failure
-
-            zip_file_bytes = io.BytesIO(response.content)
-            with zipfile.ZipFile(zip_file_bytes, 'r') as zf:
-                print(f"Successfully downloaded and opened GTFS zip for Golden Gate Transit.")
-
-                async with SessionLocal() as db:
-                    # Order of loading matters due to foreign key relationships in real GTFS data
-                    # though our models don't enforce them with SQLAlchemy directly, it's good practice.
-                    await _load_csv_to_db(db, zf, 'routes.txt', GTFSRoute, GTFSRouteBase)
-                    await _load_csv_to_db(db, zf, 'stops.txt', GTFSStop, GTFSStopBase)
-                    await _load_csv_to_db(db, zf, 'shapes.txt', GTFSShape, GTFSShapeBase)
-                    await _load_csv_to_db(db, zf, 'trips.txt', GTFSTrip, GTFSTripBase)
-                    await _load_csv_to_db(db, zf, 'stop_times.txt', GTFSStopTime, GTFSStopTimeBase)
-                    await _load_csv_to_db(db, zf, 'calendar.txt', GTFSCalendar, GTFSCalendarBase)
-                    # calendar_dates.txt is optional, check if it exists
-                    if 'calendar_dates.txt' in zf.namelist():
-                        await _load_csv_to_db(db, zf, 'calendar_dates.txt', GTFSCalendarDate, GTFSCalendarDateBase)
-                    else:
-                        print("calendar_dates.txt not found in zip, skipping.")
-
-                    await db.commit()
-                    print(f"GTFS static data for 'Golden Gate Transit' loaded successfully.")
-                    return True
-        except httpx.HTTPStatusError as e:
-            print(f"HTTP error occurred during download for 'Golden Gate Transit': {e.response.status_code} - {e.response.text}")
-            if e.response.status_code == 401:
-                print("Authentication Error: Invalid API Key. Please check your API key.")
-            elif e.response.status_code == 404:
-                print(f"Not Found: Operator ID 'Golden Gate Transit' might be incorrect or data not available.")
-            return False
-        except httpx.RequestError as e:
-            print(f"Network error during download for 'Golden Gate Transit': {e}")
-            return False
-        except zipfile.BadZipFile as e:
-            print(f"Downloaded file is not a valid ZIP archive for 'Golden Gate Transit': {e}")
-            return False
-        except Exception as e:
-            print(f"An unexpected error occurred while loading GTFS data for 'Golden Gate Transit': {e}")
-            return False
+                return False
+            except httpx.RequestError as e:
+                print(f"Network error during download for 'Golden Gate Transit': {e}")
+                return False
+            except zipfile.BadZipFile as e:
+                print(f"Downloaded file is not a valid ZIP archive for 'Golden Gate Transit': {e}")
+                return False
+            except Exception as e:
+                print(f"An unexpected error occurred while loading GTFS data for 'Golden Gate Transit': {e}")
+                return False
 
 if __name__ == "__main__":
     import asyncio
@@ -16,7 +16,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 # Now import the app modules
 try:
-    from app.core.database import SessionLocal
+    from app.core.database import IngestSessionLocal
     from app.models.predictions import StopPrediction
     from app.core.config import settings
     DATABASE_URL = settings.DATABASE_URL
@@ -97,7 +97,7 @@ async def fetch_and_process_trip_updates():
                 return False
 
             # Connect to database
-            async with SessionLocal() as session:
+            async with IngestSessionLocal() as session:
                 try:
                     trip_updates_data = []
                     
@@ -0,0 +1,299 @@
+"""
+Parallel GTFS Static Load Orchestrator
+
+Loads a GTFS static archive as a whole. Each table is parsed and validated
+in a worker process, since CSV parsing is CPU-bound and would otherwise hold
+the event loop, then copied with COPY into a staging table on its own pooled
+database connection, together with the rows other agencies' feeds loaded
+into the live table. The staging table gets the live table's constraints
+and indexes only after the bulk load, and is analyzed; all of this runs
+for the tables in parallel, while the API keeps reading the live tables.
+
+Once every table is staged, one short transaction drops the live tables
+and renames the staging tables and their indexes into their place, so the
+API reads either the previous feed or the new one, never a mix. The same
+transaction records the agency's feed version in static_feed_versions.
+
+The time spent on each table is reported so slow tables are easy to spot.
+"""
+
+import asyncio
+import logging
+import re
+import tempfile
+import time
+from datetime import datetime
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.database import ingest_engine
+from app.models.gtfs_static import (
+    GTFSRoute, GTFSStop, GTFSShape, GTFSTrip,
+    GTFSStopTime, GTFSCalendar, GTFSCalendarDate, StaticFeedVersion
+)
+from app.schemas.gtfs_static import (
+    GTFSRouteBase, GTFSStopBase, GTFSShapeBase, GTFSTripBase,
+    GTFSStopTimeBase, GTFSCalendarBase, GTFSCalendarDateBase
+)
+from data_ingestion.gtfs_static_loader import open_gtfs_archive, write_table_csv
+
+logger = logging.getLogger(__name__)
+
+# Indexes of a table other than those backing its constraints
+INDEXES_QUERY = text("""
+    SELECT ic.relname AS name, pg_get_indexdef(i.indexrelid) AS definition
+    FROM pg_index i
+    JOIN pg_class ic ON ic.oid = i.indexrelid
+    WHERE i.indrelid = CAST(:table AS regclass)
+      AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+""")
+
+# Primary key and unique constraints of a table, with their columns
+CONSTRAINTS_QUERY = text("""
+    SELECT c.conname AS name, pg_get_constraintdef(c.oid) AS definition,
+           ARRAY(SELECT a.attname FROM unnest(c.conkey) AS k(attnum)
+                 JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k.attnum) AS columns
+    FROM pg_constraint c
+    WHERE c.conrelid = CAST(:table AS regclass) AND c.contype IN ('p', 'u')
+""")
+
+# "CREATE [UNIQUE] INDEX name ON [ONLY] table USING ..." as returned by pg_get_indexdef
+INDEX_DEFINITION = re.compile(r'^(CREATE (?:UNIQUE )?INDEX )\S+( ON (?:ONLY )?)\S+( .*)$', re.DOTALL)
+
+STAGING_SUFFIX = "_staging"
+
+# (file name, model, schema, required). The models declare no foreign keys,
+# so every table can be staged independently of the others.
+GTFS_TABLES = [
+    ('routes.txt', GTFSRoute, GTFSRouteBase, True),
+    ('stops.txt', GTFSStop, GTFSStopBase, True),
+    ('shapes.txt', GTFSShape, GTFSShapeBase, True),
+    ('trips.txt', GTFSTrip, GTFSTripBase, True),
+    ('stop_times.txt', GTFSStopTime, GTFSStopTimeBase, True),
+    ('calendar.txt', GTFSCalendar, GTFSCalendarBase, True),
+    ('calendar_dates.txt', GTFSCalendarDate, GTFSCalendarDateBase, False),
+]
+
+
+class StaticLoadOrchestrator:
+    """Stages GTFS static tables in parallel and swaps them in atomically."""
+
+    def __init__(self, db_engine=ingest_engine, max_concurrency: int = 4):
+        self.engine = db_engine
+        self.max_concurrency = max_concurrency
+        self.last_timings: Dict[str, float] = {}
+
+    async def load(self, archive_path: Union[str, Path], agency_key: str = "golden_gate",
+                   feed_version: Optional[str] = None) -> Dict[str, float]:
+        """
+        Replace an agency's static data with the contents of a GTFS archive.
+
+        Args:
+            archive_path: GTFS static archive on disk
+            agency_key: Agency the feed belongs to; other agencies' rows are kept
+            feed_version: sha256 of the archive, recorded with the tables
+
+        Returns:
+            Dict mapping table name to staging time in seconds, plus
+            ``swap`` and ``total`` entries.
+
+        Raises:
+            RuntimeError: A required file is missing or a table failed to
+                stage; the live tables are left untouched.
+        """
+        with open_gtfs_archive(archive_path) as gtfs_zip:
+            members = set(gtfs_zip.namelist())
+        tables: List[Tuple[Optional[str], type, type]] = []
+        for filename, model_class, schema_class, required in GTFS_TABLES:
+            if filename in members:
+                tables.append((filename, model_class, schema_class))
+            elif required:
+                raise RuntimeError(f"{filename} not found in GTFS archive")
+            else:
+                # Staged without a file, so the agency's previous rows are still replaced
+                tables.append((None, model_class, schema_class))
+
+        started = time.perf_counter()
+        await self._ensure_agency_columns()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        timings: Dict[str, float] = {}
+        try:
+            with tempfile.TemporaryDirectory() as work_dir, \
+                    ProcessPoolExecutor(max_workers=self.max_concurrency) as pool:
+                results = await asyncio.gather(
+                    *(self._stage_table(semaphore, pool, archive_path, agency_key, Path(work_dir),
+                                        filename, model_class, schema_class)
+                      for filename, model_class, schema_class in tables),
+                    return_exceptions=True
+                )
+
+            errors = []
+            for (_, model_class, _), result in zip(tables, results):
+                if isinstance(result, BaseException):
+                    errors.append((model_class.__tablename__, result))
+                else:
+                    timings[model_class.__tablename__] = result
+
+            if errors:
+                table_name, error = errors[0]
+                raise RuntimeError(f"Failed to load {table_name}: {error}") from error
+
+            swap_started = time.perf_counter()
+            await self._swap(agency_key, feed_version)
+            timings["swap"] = round(time.perf_counter() - swap_started, 3)
+        finally:
+            await self._drop_staging_tables()
+
+        timings["total"] = round(time.perf_counter() - started, 3)
+        self.last_timings = timings
+
+        for table_name, seconds in sorted(timings.items(), key=lambda item: -item[1]):
+            logger.info(f"Static load timing: {table_name} {seconds:.3f}s")
+        return timings
+
+    @staticmethod
+    def _staging_name(name: str) -> str:
+        return f"{name}{STAGING_SUFFIX}"
+
+    async def _ensure_agency_columns(self) -> None:
+        """Add the agency_key column to tables created before it existed."""
+        async with self.engine.begin() as conn:
+            for _, model_class, _, _ in GTFS_TABLES:
+                await conn.execute(text(
+                    f'ALTER TABLE "{model_class.__tablename__}" ADD COLUMN IF NOT EXISTS agency_key varchar'
+                ))
+
+    async def _stage_table(self, semaphore: asyncio.Semaphore, pool: Executor, archive_path: Union[str, Path],
+                           agency_key: str, work_dir: Path, filename: Optional[str], model_class,
+                           schema_class) -> float:
+        """
+        Build the staging table of one model and return elapsed seconds: the
+        file parsed in a worker process and COPYed in, the other agencies'
+        rows copied over, then constraints, indexes and statistics.
+        """
+        async with semaphore:
+            started = time.perf_counter()
+            columns, rows = list(schema_class.model_fields), 0
+            csv_path = work_dir / f"{model_class.__tablename__}.csv"
+            if filename is not None:
+                columns, rows = await asyncio.get_running_loop().run_in_executor(
+                    pool, write_table_csv, archive_path, filename, model_class, schema_class, csv_path
+                )
+
+            table = model_class.__tablename__
+            staging = self._staging_name(table)
+            column_list = ", ".join(f'"{column}"' for column in columns)
+            agency_literal = "'" + agency_key.replace("'", "''") + "'"
+            async with self.engine.begin() as conn:
+                constraints = (await conn.execute(CONSTRAINTS_QUERY, {"table": table})).fetchall()
+                indexes = (await conn.execute(INDEXES_QUERY, {"table": table})).fetchall()
+
+                await conn.execute(text(f'DROP TABLE IF EXISTS "{staging}"'))
+                # Columns, defaults and NOT NULLs of the live table; no constraints or indexes yet
+                await conn.execute(text(f'CREATE TABLE "{staging}" (LIKE "{table}" INCLUDING DEFAULTS)'))
+                if filename is not None:
+                    # Rows COPYed in get the agency from the column default
+                    await conn.execute(text(
+                        f'ALTER TABLE "{staging}" ALTER COLUMN agency_key SET DEFAULT {agency_literal}'
+                    ))
+                    raw_connection = await conn.get_raw_connection()
+                    await raw_connection.driver_connection.copy_to_table(
+                        staging, source=csv_path, columns=columns, format='csv'
+                    )
+                    await conn.execute(text(f'ALTER TABLE "{staging}" ALTER COLUMN agency_key DROP DEFAULT'))
+
+                # Rows of other agencies' feeds; rows loaded before agency_key existed belong to no
+                # agency and are replaced. Copied after the new feed, so its rows win on duplicate keys.
+                await conn.execute(text(
+                    f'INSERT INTO "{staging}" ({column_list}, agency_key) '
+                    f'SELECT {column_list}, agency_key FROM "{table}" WHERE agency_key <> {agency_literal}'
+                ))
+
+                generated = {c.name for c in model_class.__table__.primary_key.columns if c.autoincrement is True}
+                for constraint in constraints:
+                    if not set(constraint.columns) <= generated:
+                        # Duplicate keys in the feed are skipped, as the row-by-row loader did
+                        matches = " AND ".join(f'a."{c}" = b."{c}"' for c in constraint.columns)
+                        await conn.execute(text(
+                            f'DELETE FROM "{staging}" a USING "{staging}" b WHERE a.ctid > b.ctid AND {matches}'
+                        ))
+                    await conn.execute(text(
+                        f'ALTER TABLE "{staging}" ADD CONSTRAINT "{self._staging_name(constraint.name)}" '
+                        f'{constraint.definition}'
+                    ))
+                for index in indexes:
+                    match = INDEX_DEFINITION.match(index.definition)
+                    if match is None:
+                        raise RuntimeError(f"Unexpected definition of index {index.name}: {index.definition}")
+                    await conn.execute(text(
+                        f'{match.group(1)}"{self._staging_name(index.name)}"{match.group(2)}"{staging}"{match.group(3)}'
+                    ))
+                await conn.execute(text(f'ANALYZE "{staging}"'))
+            logger.info(f"Staged {rows} rows of {filename or table}")
+            return round(time.perf_counter() - started, 3)
+
+    async def _swap(self, agency_key: str, feed_version: Optional[str]) -> None:
+        """Put every staging table, with its constraints and indexes, in place of the live table in one transaction."""
+        async with self.engine.begin() as conn:
+            stmt = insert(StaticFeedVersion).values(
+                agency_key=agency_key, version=feed_version, loaded_at=datetime.utcnow()
+            )
+            await conn.execute(stmt.on_conflict_do_update(
+                index_elements=['agency_key'],
+                set_={'version': stmt.excluded.version, 'loaded_at': stmt.excluded.loaded_at}
+            ))
+
+            for _, model_class, _, _ in GTFS_TABLES:
+                table = model_class.__tablename__
+                staging = self._staging_name(table)
+                constraints = (await conn.execute(CONSTRAINTS_QUERY, {"table": table})).fetchall()
+                indexes = (await conn.execute(INDEXES_QUERY, {"table": table})).fetchall()
+
+                # The id sequence belongs to the live table and would be dropped with it
+                for column in model_class.__table__.primary_key.columns:
+                    if column.autoincrement is not True:
+                        continue
+                    sequence = (await conn.execute(
+                        text("SELECT pg_get_serial_sequence(:table, :column)"),
+                        {"table": table, "column": column.name}
+                    )).scalar()
+                    if sequence:
+                        await conn.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY "{staging}"."{column.name}"'))
+
+                await conn.execute(text(f'DROP TABLE "{table}"'))
+                await conn.execute(text(f'ALTER TABLE "{staging}" RENAME TO "{table}"'))
+                for constraint in constraints:
+                    await conn.execute(text(
+                        f'ALTER TABLE "{table}" RENAME CONSTRAINT "{self._staging_name(constraint.name)}" '
+                        f'TO "{constraint.name}"'
+                    ))
+                for index in indexes:
+                    await conn.execute(text(f'ALTER INDEX "{self._staging_name(index.name)}" RENAME TO "{index.name}"'))
+                logger.info(f"Swapped in {table}")
+
+    async def _drop_staging_tables(self) -> None:
+        try:
+            async with self.engine.begin() as conn:
+                for _, model_class, _, _ in GTFS_TABLES:
+                    await conn.execute(text(f'DROP TABLE IF EXISTS "{self._staging_name(model_class.__tablename__)}"'))
+        except Exception as e:
+            # Left-over staging tables are dropped again by the next load
+            logger.error(f"Failed to drop staging tables: {e}")
+
+
+# Shared orchestrator instance
+static_load_orchestrator = StaticLoadOrchestrator()
+
+
+async def load_static_tables(archive_path: Union[str, Path], agency_key: str = "golden_gate",
+                             feed_version: Optional[str] = None,
+                             max_concurrency: Optional[int] = None) -> Dict[str, float]:
+    """Convenience wrapper around the shared orchestrator."""
+    orchestrator = static_load_orchestrator
+    if max_concurrency is not None:
+        orchestrator = StaticLoadOrchestrator(max_concurrency=max_concurrency)
+    return await orchestrator.load(archive_path, agency_key, feed_version)
@@ -1,131 +1,168 @@
 """
 TransitPulse Background Scheduler
 Runs automatic GTFS updates and real-time data processing
+
+The same job set runs either embedded in the API process (SCHEDULER_MODE=embedded)
+or as a standalone worker:
+
+    python scheduler.py
 """
 
 import asyncio
-import schedule
-import time
-from datetime import datetime, timedelta
-from typing import Dict, Any
+from datetime import time as dtime, timedelta
 import logging
-from data_ingestion.auto_gtfs_updater import AutoGTFSUpdater
-from data_ingestion.gtfs_rt_processor import GTFSRTProcessor
-from data_ingestion.gtfs_trip_updates_processor import GTFSTripUpdatesProcessor
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('transitpulse_scheduler.log')
-    ]
-)
+from app.core.config import settings
+from app.core.leader import LeaderElector
+from app.core.scheduler import AsyncJobScheduler, MissedRunPolicy
+from data_ingestion.auto_gtfs_updater import AutoGTFSUpdater, auto_updater
+
 logger = logging.getLogger(__name__)
 
 class TransitPulseScheduler:
     """Background scheduler for TransitPulse data updates."""
-    
-    def __init__(self):
-        self.gtfs_updater = AutoGTFSUpdater()
-        self.rt_processor = GTFSRTProcessor()
-        self.trip_updates_processor = GTFSTripUpdatesProcessor()
-        self.is_running = False
-        
+
+    def __init__(self, gtfs_updater: AutoGTFSUpdater = auto_updater, agencies=None):
+        # Share the process-wide updater so jobs and API endpoints see the same caches
+        self.gtfs_updater = gtfs_updater
+        self.trip_updates_processor = None
+        self.agencies = agencies or ["golden_gate"]
+        self.scheduler = AsyncJobScheduler(name="TransitPulse Scheduler")
+        self.setup_schedule()
+
+    @property
+    def is_running(self) -> bool:
+        return self.scheduler.is_running
+
     async def update_static_data_job(self):
         """Daily GTFS static data update job."""
         logger.info("🔄 Starting daily GTFS static data update...")
-        try:
-            # Update Golden Gate Transit data
-            success = await self.gtfs_updater.update_static_data("golden_gate")
+        for agency in self.agencies:
+            success = await self.gtfs_updater.update_static_data(agency)
             if success:
-                logger.info("✅ Daily GTFS static update completed successfully")
+                logger.info(f"✅ Daily GTFS static update completed successfully for {agency}")
             else:
-                logger.error("❌ Daily GTFS static update failed")
-        except Exception as e:
-            logger.error(f"❌ Error during daily GTFS update: {e}")
-    
+                logger.error(f"❌ Daily GTFS static update failed for {agency}")
+
     async def update_realtime_vehicles_job(self):
         """Real-time vehicle position update job (every 30 seconds)."""
-        try:
-            await self.rt_processor.fetch_and_store_vehicle_positions()
-            logger.debug("📍 Real-time vehicle positions updated")
-        except Exception as e:
-            logger.error(f"❌ Error updating real-time vehicles: {e}")
-    
+        for agency in self.agencies:
+            await self.gtfs_updater.update_vehicle_positions(agency)
+        logger.debug("📍 Real-time vehicle positions updated")
+
+    async def publish_trip_updates_job(self):
+        """Trip updates feed for the API workers (every 30 seconds)."""
+        for agency in self.agencies:
+            await self.gtfs_updater.update_trip_updates(agency)
+        logger.debug("🕐 Trip updates feed published")
+
     async def update_trip_updates_job(self):
         """Real-time trip updates job (every 60 seconds)."""
-        try:
-            await self.trip_updates_processor.fetch_and_store_trip_updates()
-            logger.debug("🕐 Real-time trip updates processed")
-        except Exception as e:
-            logger.error(f"❌ Error updating trip updates: {e}")
-    
+        if self.trip_updates_processor is None:
+            # Imported on first use: the processor module configures its own log file
+            from data_ingestion.gtfs_trip_updates_processor import GTFSTripUpdatesProcessor
+            self.trip_updates_processor = GTFSTripUpdatesProcessor()
+        await self.trip_updates_processor.fetch_and_store_trip_updates()
+        logger.debug("🕐 Real-time trip updates processed")
+
     def setup_schedule(self):
         """Setup the automated schedule."""
-        # Daily GTFS static update at 3:00 AM
-        schedule.every().day.at("03:00").do(self.run_async_job, self.update_static_data_job)
-        
+        # Daily GTFS static update at 3:00 AM, plus an initial load on start
+        self.scheduler.add_job(
+            "gtfs_static",
+            self.update_static_data_job,
+            at=dtime(3, 0),
+            jitter=60,
+            missed_policy=MissedRunPolicy.RUN_ONCE,
+            run_immediately=True,
+        )
+
         # Real-time vehicle updates every 30 seconds
-        schedule.every(30).seconds.do(self.run_async_job, self.update_realtime_vehicles_job)
-        
+        self.scheduler.add_job(
+            "realtime_vehicles",
+            self.update_realtime_vehicles_job,
+            interval=self.gtfs_updater.realtime_update_interval,
+            jitter=2,
+            missed_policy=MissedRunPolicy.SKIP,
+            run_immediately=True,
+        )
+
+        # Trip updates served by the API, every 30 seconds
+        self.scheduler.add_job(
+            "trip_updates_feed",
+            self.publish_trip_updates_job,
+            interval=timedelta(seconds=30),
+            jitter=2,
+            missed_policy=MissedRunPolicy.SKIP,
+            run_immediately=True,
+        )
+
         # Real-time trip updates every 60 seconds
-        schedule.every(60).seconds.do(self.run_async_job, self.update_trip_updates_job)
-        
+        self.scheduler.add_job(
+            "trip_updates",
+            self.update_trip_updates_job,
+            interval=timedelta(seconds=60),
+            jitter=5,
+            missed_policy=MissedRunPolicy.SKIP,
+        )
+
         logger.info("📅 Scheduled jobs:")
         logger.info("  • GTFS Static Data: Daily at 3:00 AM")
         logger.info("  • Real-time Vehicles: Every 30 seconds")
+        logger.info("  • Trip Updates Feed: Every 30 seconds")
         logger.info("  • Real-time Trip Updates: Every 60 seconds")
-    
-    def run_async_job(self, job_func):
-        """Run an async job in the event loop."""
-        try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(job_func())
-        except Exception as e:
-            logger.error(f"Error running scheduled job: {e}")
-        finally:
-            loop.close()
-    
+
+    async def start(self):
+        """Start the jobs on the running event loop and return (embedded mode)."""
+        await self.scheduler.start()
+        logger.info("🚀 TransitPulse Scheduler started")
+
     async def start_scheduler(self):
-        """Start the background scheduler."""
-        self.setup_schedule()
-        self.is_running = True
-        
+        """Start the background scheduler and run until stopped (worker mode)."""
         logger.info("🚀 TransitPulse Scheduler started")
-        logger.info("   Real-time updates: Every 30 seconds")
-        logger.info("   Static data updates: Daily at 3:00 AM")
-        
-        # Run initial updates
-        logger.info("🔄 Running initial data updates...")
-        await self.update_static_data_job()
-        await self.update_realtime_vehicles_job()
-        
-        # Start the scheduler loop
-        while self.is_running:
-            schedule.run_pending()
-            await asyncio.sleep(1)
-    
-    def stop_scheduler(self):
+        await self.scheduler.run_forever()
+
+    async def stop_scheduler(self):
         """Stop the background scheduler."""
-        self.is_running = False
+        await self.scheduler.stop()
         logger.info("🛑 TransitPulse Scheduler stopped")
 
+    def metrics(self):
+        """Per-job duration and lag metrics."""
+        return self.scheduler.metrics()
+
 # Entry point for running the scheduler
 async def main():
     """Main entry point for the scheduler."""
     scheduler = TransitPulseScheduler()
-    
+    elector = None
+
     try:
-        await scheduler.start_scheduler()
-    except KeyboardInterrupt:
+        if settings.LEADER_ELECTION_ENABLED:
+            # Several workers may run; only the advisory-lock holder ingests
+            elector = LeaderElector(on_elected=scheduler.start, on_demoted=scheduler.stop_scheduler)
+            await elector.start()
+            await asyncio.Event().wait()
+        else:
+            await scheduler.start_scheduler()
+    except asyncio.CancelledError:
         logger.info("⚡ Received interrupt signal")
-        scheduler.stop_scheduler()
     except Exception as e:
         logger.error(f"❌ Scheduler error: {e}")
-        scheduler.stop_scheduler()
+    finally:
+        if elector:
+            await elector.stop()
+        await scheduler.stop_scheduler()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(),
+            logging.FileHandler('transitpulse_scheduler.log')
+        ]
+    )
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
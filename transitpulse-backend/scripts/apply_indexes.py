@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Bring the indexes of an existing database in line with the models.
+
+``create_all`` only creates indexes together with new tables, so databases
+created before an index was added to a model never get it. This script
+builds every index declared on the models that is missing (or was left
+invalid by an interrupted build) with ``CREATE INDEX CONCURRENTLY``, so the
+tables stay writable while it runs, then drops the indexes the composite
+ones replaced and refreshes the planner statistics.
+
+Usage:
+    python scripts/apply_indexes.py [--dry-run]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from typing import List
+
+import asyncpg
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.base import Base
+from app.core.database import get_asyncpg_dsn
+import app.models  # noqa: F401  (imported for its side effect: registers every table with Base.metadata)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Single-column indexes made redundant by a composite index with the same leading column
+SUPERSEDED_INDEXES = [
+    "ix_gtfs_stop_times_trip_id",          # idx_gtfs_stop_times_trip_sequence
+    "ix_gtfs_shapes_shape_id",             # idx_gtfs_shapes_shape_sequence
+    "ix_gtfs_trips_route_id",              # idx_gtfs_trips_route_service
+    "ix_live_vehicle_positions_timestamp", # idx_live_vehicle_positions_recent
+]
+
+
+def create_statement(index) -> str:
+    """CREATE INDEX CONCURRENTLY IF NOT EXISTS for a model index."""
+    ddl = str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+    for prefix in ("CREATE UNIQUE INDEX ", "CREATE INDEX "):
+        if ddl.startswith(prefix):
+            return prefix + "CONCURRENTLY IF NOT EXISTS " + ddl[len(prefix):]
+    raise ValueError(f"Unexpected index DDL: {ddl}")
+
+
+async def apply_indexes(dry_run: bool = False) -> None:
+    indexes = [
+        index
+        for table in Base.metadata.sorted_tables
+        for index in sorted(table.indexes, key=lambda i: i.name)
+    ]
+
+    # CONCURRENTLY cannot run inside a transaction: asyncpg runs each statement on its own
+    conn = await asyncpg.connect(get_asyncpg_dsn())
+    try:
+        tables = {row["tablename"] for row in await conn.fetch(
+            "SELECT tablename FROM pg_tables WHERE schemaname = current_schema()"
+        )}
+        existing = {row["relname"]: row["indisvalid"] for row in await conn.fetch("""
+            SELECT c.relname, i.indisvalid
+            FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = current_schema()
+        """)}
+
+        statements: List[str] = []
+        for index in indexes:
+            if index.table.name not in tables:
+                continue  # create_all builds it with the table
+            if existing.get(index.name) is False:
+                # Left behind by a failed concurrent build; it is not used and must be rebuilt
+                statements.append(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"')
+            if not existing.get(index.name):
+                statements.append(create_statement(index))
+        for name in SUPERSEDED_INDEXES:
+            if name in existing:
+                statements.append(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+        if not statements:
+            logger.info("All model indexes are present")
+            return
+
+        for statement in statements:
+            logger.info(statement)
+            if not dry_run:
+                await conn.execute(statement)
+
+        if not dry_run:
+            for table in sorted({index.table.name for index in indexes} & tables):
+                await conn.execute(f'ANALYZE "{table}"')
+            logger.info(f"Applied {len(statements)} index changes")
+    finally:
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Print the statements without running them")
+    args = parser.parse_args()
+    asyncio.run(apply_indexes(dry_run=args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Check that the hot queries are planned on the indexes meant for them.
+
+Each check runs EXPLAIN on one of the queries the API runs most and fails
+when the plan does not use the expected index, or sorts rows the index
+already returns in order. Run it after changing models, indexes or those
+queries; it exits with status 1 when a check fails.
+
+With ``--seed`` a synthetic feed (thousands of trips, their stop times,
+shapes and vehicle positions) is inserted and analyzed first, inside a
+transaction that is rolled back at the end, so the planner sees realistic
+table sizes even on an empty development database. Without it the checks
+run against the data already loaded.
+
+Usage:
+    python scripts/check_query_plans.py [--seed] [--show-plans]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Sequence
+
+import asyncpg
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import get_asyncpg_dsn
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PlanCheck:
+    name: str
+    query: str
+    # Returns one row: the query's parameters, taken from the loaded data
+    params_query: str
+    # The plan must scan one of these indexes
+    indexes: Sequence[str]
+    # The index returns rows in the requested order, so no Sort node is expected
+    presorted: bool = False
+
+
+CHECKS = [
+    PlanCheck(
+        name="stop times of a trip in order",
+        query="""
+            SELECT stop_id, stop_sequence, arrival_time, departure_time
+            FROM gtfs_stop_times WHERE trip_id = $1 ORDER BY stop_sequence
+        """,
+        params_query="SELECT trip_id FROM gtfs_stop_times LIMIT 1",
+        indexes=["idx_gtfs_stop_times_trip_sequence"],
+        presorted=True,
+    ),
+    PlanCheck(
+        name="sequence of a stop on a trip (active trips)",
+        query="SELECT stop_sequence FROM gtfs_stop_times WHERE trip_id = $1 AND stop_id = $2 LIMIT 1",
+        params_query="SELECT trip_id, stop_id FROM gtfs_stop_times LIMIT 1",
+        indexes=["idx_gtfs_stop_times_trip_stop"],
+    ),
+    PlanCheck(
+        name="stop count of a trip (active trips)",
+        query="SELECT COUNT(*) FROM gtfs_stop_times WHERE trip_id = $1",
+        params_query="SELECT trip_id FROM gtfs_stop_times LIMIT 1",
+        indexes=["idx_gtfs_stop_times_trip_sequence", "idx_gtfs_stop_times_trip_stop"],
+    ),
+    PlanCheck(
+        name="trips of a route on the active services (schedules)",
+        query="SELECT trip_id, direction_id, trip_headsign FROM gtfs_trips WHERE route_id = $1 AND service_id = ANY($2)",
+        params_query="SELECT route_id, ARRAY[service_id] FROM gtfs_trips LIMIT 1",
+        indexes=["idx_gtfs_trips_route_service"],
+    ),
+    PlanCheck(
+        name="shape points keyset page",
+        query="""
+            SELECT id, shape_id, shape_pt_lat, shape_pt_lon, shape_pt_sequence
+            FROM gtfs_shapes WHERE (shape_id, shape_pt_sequence, id) > ($1, $2, $3)
+            ORDER BY shape_id, shape_pt_sequence, id LIMIT 1001
+        """,
+        params_query="SELECT shape_id, shape_pt_sequence, id FROM gtfs_shapes ORDER BY shape_id, shape_pt_sequence, id LIMIT 1",
+        indexes=["idx_gtfs_shapes_shape_sequence"],
+        presorted=True,
+    ),
+    PlanCheck(
+        name="recently reported vehicle positions",
+        query="""
+            SELECT vehicle_id, trip_id, route_id FROM live_vehicle_positions
+            WHERE timestamp > NOW() - INTERVAL '10 minutes'
+        """,
+        params_query="SELECT",
+        indexes=["idx_live_vehicle_positions_recent"],
+    ),
+]
+
+# A day of service for 60 routes: 3000 trips of 40 stops, 120 shapes of 600
+# points and 5000 vehicle positions spread over the last day
+SEED_STATEMENTS = [
+    """
+    INSERT INTO gtfs_trips (trip_id, route_id, service_id, direction_id, trip_headsign, shape_id)
+    SELECT 'plan_trip_' || t, 'plan_route_' || (t % 60), 'plan_service_' || (t % 4), t % 2,
+           'Headsign ' || (t % 60), 'plan_shape_' || (t % 120)
+    FROM generate_series(1, 3000) AS t
+    """,
+    """
+    INSERT INTO gtfs_stop_times (trip_id, stop_id, stop_sequence, arrival_time, departure_time)
+    SELECT 'plan_trip_' || t, 'plan_stop_' || ((t * 7 + s) % 2500), s,
+           5 * 3600 + (t % 1000) * 60 + s * 120,
+           5 * 3600 + (t % 1000) * 60 + s * 120 + 20
+    FROM generate_series(1, 3000) AS t, generate_series(1, 40) AS s
+    """,
+    """
+    INSERT INTO gtfs_shapes (shape_id, shape_pt_lat, shape_pt_lon, shape_pt_sequence)
+    SELECT 'plan_shape_' || sh, 37.8 + p * 0.0001, -122.4 - p * 0.0001, p
+    FROM generate_series(1, 120) AS sh, generate_series(1, 600) AS p
+    """,
+    """
+    INSERT INTO live_vehicle_positions (vehicle_id, trip_id, route_id, latitude, longitude, timestamp)
+    SELECT 'plan_vehicle_' || v, 'plan_trip_' || (v % 3000), 'plan_route_' || (v % 60),
+           37.8, -122.4, NOW() - v * INTERVAL '17 seconds'
+    FROM generate_series(1, 5000) AS v
+    """,
+]
+SEEDED_TABLES = ["gtfs_trips", "gtfs_stop_times", "gtfs_shapes", "live_vehicle_positions"]
+
+
+def plan_nodes(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+async def run_check(conn: asyncpg.Connection, check: PlanCheck, show_plan: bool) -> List[str]:
+    """Problems with the plan of one check (empty when it passes)."""
+    params = await conn.fetchrow(check.params_query)
+    if params is None:
+        return ["no data to take query parameters from (load a feed or use --seed)"]
+    explained = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {check.query}", *params)
+    plan = (json.loads(explained) if isinstance(explained, str) else explained)[0]["Plan"]
+    if show_plan:
+        logger.info(json.dumps(plan, indent=2))
+
+    nodes = list(plan_nodes(plan))
+    problems = []
+    used = {node["Index Name"] for node in nodes if "Index Name" in node}
+    if not used & set(check.indexes):
+        scans = sorted({node["Node Type"] for node in nodes if "Scan" in node["Node Type"]})
+        problems.append(
+            f"expected a scan on {' or '.join(check.indexes)}, "
+            f"plan has {', '.join(scans) or 'no scans'}{' on ' + ', '.join(sorted(used)) if used else ''}"
+        )
+    if check.presorted and any(node["Node Type"] in ("Sort", "Incremental Sort") for node in nodes):
+        problems.append("plan sorts rows the index already returns in order")
+    return problems
+
+
+async def check_query_plans(seed: bool = False, show_plans: bool = False) -> bool:
+    conn = await asyncpg.connect(get_asyncpg_dsn())
+    transaction = conn.transaction()
+    await transaction.start()
+    try:
+        if seed:
+            logger.info("Seeding a synthetic feed (rolled back afterwards)...")
+            for statement in SEED_STATEMENTS:
+                await conn.execute(statement)
+            for table in SEEDED_TABLES:
+                await conn.execute(f'ANALYZE "{table}"')
+
+        failures = 0
+        for check in CHECKS:
+            problems = await run_check(conn, check, show_plans)
+            if problems:
+                failures += 1
+                for problem in problems:
+                    logger.error(f"FAIL {check.name}: {problem}")
+            else:
+                logger.info(f"ok   {check.name}")
+
+        logger.info(f"{len(CHECKS) - failures}/{len(CHECKS)} query plan checks passed")
+        return failures == 0
+    finally:
+        await transaction.rollback()
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", action="store_true", help="Plan against a synthetic feed, rolled back afterwards")
+    parser.add_argument("--show-plans", action="store_true", help="Log every plan")
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(check_query_plans(seed=args.seed, show_plans=args.show_plans)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Convert gtfs_stop_times arrival/departure times to integer seconds.
+
+Stop times used to be stored as TIME, which wrapped times past midnight
+(25:15:00 was stored as 01:15:00). They are now integer seconds of the
+service day. This script converts the columns of an existing database in
+one transaction and restores the wrapped times: within a trip, every time
+earlier than the one before it is moved a day later, together with the
+times that follow it.
+
+Reloading the static feed gives the same result; the script avoids the
+download and reload. It does nothing when the columns are already integers.
+
+Usage:
+    python scripts/migrate_stop_times_to_seconds.py [--dry-run]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+import asyncpg
+
+# Add the project root to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.database import get_asyncpg_dsn
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+COLUMN_TYPES_QUERY = """
+    SELECT column_name, data_type FROM information_schema.columns
+    WHERE table_schema = current_schema() AND table_name = 'gtfs_stop_times'
+      AND column_name IN ('arrival_time', 'departure_time')
+"""
+
+CONVERT_STATEMENT = """
+    ALTER TABLE gtfs_stop_times
+        ALTER COLUMN arrival_time TYPE integer USING EXTRACT(EPOCH FROM arrival_time)::integer,
+        ALTER COLUMN departure_time TYPE integer USING EXTRACT(EPOCH FROM departure_time)::integer
+"""
+
+# Arrivals and departures of each trip in travel order; each decrease is a midnight
+# the old TIME columns wrapped, and every later time moves one more day on
+UNWRAP_STATEMENT = """
+    WITH times AS (
+        SELECT id, trip_id, stop_sequence, 0 AS side, arrival_time AS value
+        FROM gtfs_stop_times WHERE arrival_time IS NOT NULL
+        UNION ALL
+        SELECT id, trip_id, stop_sequence, 1 AS side, departure_time AS value
+        FROM gtfs_stop_times WHERE departure_time IS NOT NULL
+    ),
+    wrapped AS (
+        SELECT id, trip_id, stop_sequence, side,
+               CASE WHEN value < LAG(value) OVER w THEN 1 ELSE 0 END AS wrap
+        FROM times
+        WINDOW w AS (PARTITION BY trip_id ORDER BY stop_sequence, side)
+    ),
+    days AS (
+        SELECT id, side,
+               SUM(wrap) OVER (PARTITION BY trip_id ORDER BY stop_sequence, side) AS days
+        FROM wrapped
+    ),
+    shifts AS (
+        SELECT id,
+               COALESCE(MAX(days) FILTER (WHERE side = 0), 0) AS arrival_days,
+               COALESCE(MAX(days) FILTER (WHERE side = 1), 0) AS departure_days
+        FROM days
+        GROUP BY id
+        HAVING MAX(days) > 0
+    )
+    UPDATE gtfs_stop_times st SET
+        arrival_time = st.arrival_time + 86400 * shifts.arrival_days,
+        departure_time = st.departure_time + 86400 * shifts.departure_days
+    FROM shifts
+    WHERE st.id = shifts.id
+"""
+
+
+async def migrate(dry_run: bool = False) -> None:
+    conn = await asyncpg.connect(get_asyncpg_dsn())
+    try:
+        types = {row["column_name"]: row["data_type"] for row in await conn.fetch(COLUMN_TYPES_QUERY)}
+        if not types:
+            logger.info("gtfs_stop_times does not exist; create_all builds it with integer times")
+            return
+        if all(data_type == "integer" for data_type in types.values()):
+            logger.info("Stop times are already stored as integer seconds")
+            return
+
+        logger.info(f"Converting stop time columns ({', '.join(f'{k}: {v}' for k, v in sorted(types.items()))})")
+        if dry_run:
+            logger.info(CONVERT_STATEMENT)
+            logger.info(UNWRAP_STATEMENT)
+            return
+
+        async with conn.transaction():
+            await conn.execute(CONVERT_STATEMENT)
+            status = await conn.execute(UNWRAP_STATEMENT)
+        logger.info(f"Converted; restored past-midnight times of {status.split()[-1]} stop times")
+        await conn.execute('ANALYZE "gtfs_stop_times"')
+    finally:
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="Print the statements without running them")
+    args = parser.parse_args()
+    asyncio.run(migrate(dry_run=args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -136,7 +136,7 @@ export const getRoutes = async (): Promise<Route[]> => {
 };
 
 export const getRouteStops = async (routeId: string): Promise<Stop[]> => {
-  const res = await apiClient.get(`/gtfs/stops?route_id=${routeId}`);
+  const res = await apiClient.get(`/gtfs/stops?route_id=${routeId}&fields=stop_id,stop_name,stop_lat,stop_lon`);
   return res.data.data || [];
 };
 
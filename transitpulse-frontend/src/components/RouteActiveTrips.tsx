@@ -118,59 +118,46 @@ export const RouteActiveTrips: React.FC<RouteActiveTripsProps> = ({
         (vehicle: VehicleData) => vehicle.route_id === routeId
       );
 
-      // Fetch trip details for each vehicle
-      const tripPromises = routeVehicles.map(async (vehicle: VehicleData) => {
-        try {
-          // Fetch trip details
-          const tripResponse = await fetch(`${import.meta.env.VITE_API_BASE_URL || 'http://localhost:9002/api/v1'}/trips/${vehicle.trip_id}`);
-          const tripData = await tripResponse.json();
-
-          // Fetch stop times for the trip
-          const stopTimesResponse = await fetch(`${import.meta.env.VITE_API_BASE_URL || 'http://localhost:9002/api/v1'}/trips/${vehicle.trip_id}/stop_times`);
-          const stopTimesData = await stopTimesResponse.json();
-
-          // Create mock stop updates (in a real system, this would come from real-time updates)
-          const scheduledStops: StopUpdate[] = (stopTimesData.stop_times || []).map((stop: any, index: number) => ({
-            stop_id: stop.stop_id,
-            stop_name: stop.stop_name || `Stop ${stop.stop_id}`,
-            sequence: stop.stop_sequence,
-            scheduled_arrival: stop.arrival_time,
-            scheduled_departure: stop.departure_time,
-            estimated_arrival: stop.arrival_time, // Mock - would be real-time estimate
-            estimated_departure: stop.departure_time,
-            delay_minutes: Math.floor(Math.random() * 10) - 2, // Mock delay: -2 to +7 minutes
-            passed: index < Math.floor(Math.random() * stopTimesData.stop_times?.length || 0)
-          }));
-
-          const trip: TripData = {
-            trip_id: vehicle.trip_id,
-            vehicle_id: vehicle.vehicle_id,
-            route_id: vehicle.route_id,
-            headsign: vehicle.headsign || tripData.trip_headsign || 'Unknown Destination',
-            direction_name: vehicle.direction_name || (vehicle.direction_id === 0 ? 'Outbound' : 'Inbound'),
-            scheduled_stops: scheduledStops,
-            delay_minutes: Math.floor(Math.random() * 10) - 2, // Mock overall delay
-            vehicle_data: vehicle
-          };
-
-          return trip;
-        } catch (error) {
-          console.error(`Failed to fetch trip details for ${vehicle.trip_id}:`, error);
-          // Return basic trip data even if details fail
-          return {
-            trip_id: vehicle.trip_id,
-            vehicle_id: vehicle.vehicle_id,
-            route_id: vehicle.route_id,
-            headsign: vehicle.headsign || 'Unknown Destination',
-            direction_name: vehicle.direction_name || 'Unknown Direction',
-            scheduled_stops: [],
-            delay_minutes: 0,
-            vehicle_data: vehicle
-          };
-        }
+      // Fetch trip details and stop times for every vehicle in one request
+      const batchResponse = await fetch(`${import.meta.env.VITE_API_BASE_URL || 'http://localhost:9002/api/v1'}/trips/batch`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          trip_ids: routeVehicles.map((vehicle: VehicleData) => vehicle.trip_id).filter(Boolean),
+          include_realtime: false
+        })
+      });
+      const batchData = batchResponse.ok ? await batchResponse.json() : { trips: {} };
+
+      const tripsData: TripData[] = routeVehicles.map((vehicle: VehicleData) => {
+        const tripEntry = batchData.trips?.[vehicle.trip_id];
+        const stopTimes = tripEntry?.stop_times || [];
+
+        // Create mock stop updates (in a real system, this would come from real-time updates)
+        const scheduledStops: StopUpdate[] = stopTimes.map((stop: any, index: number) => ({
+          stop_id: stop.stop_id,
+          stop_name: stop.stop_name || `Stop ${stop.stop_id}`,
+          sequence: stop.stop_sequence,
+          scheduled_arrival: stop.arrival_time,
+          scheduled_departure: stop.departure_time,
+          estimated_arrival: stop.arrival_time, // Mock - would be real-time estimate
+          estimated_departure: stop.departure_time,
+          delay_minutes: Math.floor(Math.random() * 10) - 2, // Mock delay: -2 to +7 minutes
+          passed: index < Math.floor(Math.random() * stopTimes.length || 0)
+        }));
+
+        return {
+          trip_id: vehicle.trip_id,
+          vehicle_id: vehicle.vehicle_id,
+          route_id: vehicle.route_id,
+          headsign: vehicle.headsign || tripEntry?.trip_info?.trip_headsign || 'Unknown Destination',
+          direction_name: vehicle.direction_name || (vehicle.direction_id === 0 ? 'Outbound' : 'Inbound'),
+          scheduled_stops: scheduledStops,
+          delay_minutes: tripEntry ? Math.floor(Math.random() * 10) - 2 : 0, // Mock overall delay
+          vehicle_data: vehicle
+        };
       });
 
-      const tripsData = await Promise.all(tripPromises);
       setTrips(tripsData);
 
     } catch (error) {
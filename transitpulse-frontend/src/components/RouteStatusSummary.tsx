@@ -19,22 +19,6 @@ import {
 } from '@chakra-ui/react';
 import { FiTruck, FiClock, FiAlertTriangle, FiCheckCircle } from 'react-icons/fi';
 
-interface VehicleData {
-  vehicle_id: string;
-  route_id: string;
-  trip_id: string;
-  latitude: number;
-  longitude: number;
-  bearing?: number;
-  speed?: number;
-  timestamp: string;
-  agency: string;
-  status?: string;
-  direction_id?: number;
-  direction_name?: string;
-  headsign?: string;
-}
-
 interface RouteStats {
   route_id: string;
   route_name: string;
@@ -70,75 +54,30 @@ export const RouteStatusSummary: React.FC<RouteStatusSummaryProps> = ({
 
   const fetchRouteStats = async () => {
     try {
-      // Fetch vehicles data
-      const vehiclesResponse = await fetch(`${import.meta.env.VITE_API_BASE_URL || 'http://localhost:9002/api/v1'}/vehicles/realtime`);
-      const vehiclesData = await vehiclesResponse.json();
-      
-      // Fetch routes data  
-      const routesResponse = await fetch(`${import.meta.env.VITE_API_BASE_URL || 'http://localhost:9002/api/v1'}/routes`);
-      const routesData = await routesResponse.json();
-
-      if (vehiclesData.status === 'success' && routesData.status === 'success') {
-        const vehicles = vehiclesData.data || [];
-        const routes = routesData.routes || [];
-        
-        // Create route statistics
-        const routeStatsMap = new Map<string, RouteStats>();
-        
-        // Initialize all routes
-        routes.forEach((route: any) => {
-          routeStatsMap.set(route.route_id, {
+      // One pre-joined summary per real-time update, computed by the backend
+      const response = await fetch(`${import.meta.env.VITE_API_BASE_URL || 'http://localhost:9002/api/v1'}/dashboard/snapshot`);
+      const snapshot = await response.json();
+
+      if (snapshot.status === 'success') {
+        const statsArray: RouteStats[] = (snapshot.data.routes || [])
+          .filter((route: any) => route.active_vehicles > 0)
+          .map((route: any) => ({
             route_id: route.route_id,
             route_name: route.route_short_name || route.route_id,
-            active_vehicles: 0,
-            total_trips: 0,
-            on_time: 0,
-            late: 0,
-            early: 0,
-            issues: 0,
-            performance_score: 100
-          });
-        });
-
-        // Populate with vehicle data
-        vehicles.forEach((vehicle: VehicleData) => {
-          const routeId = vehicle.route_id;
-          if (routeStatsMap.has(routeId)) {
-            const stats = routeStatsMap.get(routeId)!;
-            stats.active_vehicles++;
-            stats.total_trips++;
-            
-            // For now, assign random performance indicators since we don't have schedule adherence
-            // In a real system, this would be calculated from schedule data
-            const randomPerf = Math.random();
-            if (randomPerf < 0.1) {
-              stats.early++;
-              stats.issues++;
-            } else if (randomPerf < 0.8) {
-              stats.on_time++;
-            } else {
-              stats.late++;
-              stats.issues++;
-            }
-          }
-        });
-
-        // Calculate performance scores
-        routeStatsMap.forEach((stats) => {
-          if (stats.total_trips > 0) {
-            stats.performance_score = Math.round((stats.on_time / stats.total_trips) * 100);
-          }
-        });
+            active_vehicles: route.active_vehicles,
+            total_trips: route.active_vehicles,
+            on_time: route.on_time,
+            late: route.late,
+            early: route.early,
+            issues: route.late + route.early,
+            performance_score: route.on_time_percentage !== null ? Math.round(route.on_time_percentage) : 100
+          }));
 
-        const statsArray = Array.from(routeStatsMap.values())
-          .filter(stats => stats.active_vehicles > 0)
-          .sort((a, b) => b.active_vehicles - a.active_vehicles);
-        
         setRouteStats(statsArray);
 
         // Calculate totals
         const totals = {
-          total_vehicles: vehicles.length,
+          total_vehicles: snapshot.data.totals.active_vehicles,
           total_routes: statsArray.length,
           performance_avg: statsArray.length > 0 
             ? Math.round(statsArray.reduce((sum, route) => sum + route.performance_score, 0) / statsArray.length)
@@ -3,6 +3,7 @@ import { useEffect, useRef, useCallback } from 'react';
 interface WebSocketMessage {
   type: string;
   data: any;
+  seq?: number;
 }
 
 const useWebSocket = (
@@ -13,6 +14,9 @@ const useWebSocket = (
   const reconnectAttempts = useRef(0);
   const maxReconnectAttempts = 5;
   const reconnectInterval = 3000; // 3 seconds
+  // Snapshot sequence the current state was built from (resumed from on reconnect)
+  const baseSeq = useRef<number | null>(null);
+  const lastSeq = useRef<number | null>(null);
 
   const connect = useCallback(() => {
     if (!routeId) return;
@@ -26,7 +30,8 @@ const useWebSocket = (
     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
     const host = window.location.host;
     // Use correct WebSocket endpoint that matches backend
-    const wsUrl = `${protocol}//${host}/api/ws/vehicles/${routeId}`;
+    const since = lastSeq.current !== null ? `?since=${lastSeq.current}` : '';
+    const wsUrl = `${protocol}//${host}/api/ws/vehicles/${routeId}${since}`;
     
     ws.current = new WebSocket(wsUrl);
 
@@ -37,7 +42,15 @@ const useWebSocket = (
 
     ws.current.onmessage = (event) => {
       try {
-        const message = JSON.parse(event.data);
+        const message: WebSocketMessage = JSON.parse(event.data);
+        if (message.type === 'snapshot' || message.type === 'vehicle_delta') {
+          baseSeq.current = message.seq ?? null;
+        } else if (message.seq !== undefined && baseSeq.current !== null && message.seq <= baseSeq.current) {
+          return; // Already reflected in the initial state
+        }
+        if (message.seq !== undefined) {
+          lastSeq.current = Math.max(lastSeq.current ?? 0, message.seq);
+        }
         onMessage(message);
       } catch (error) {
         console.error('Error parsing WebSocket message:', error);
@@ -61,6 +74,8 @@ const useWebSocket = (
 
   // Connect on mount and when routeId changes
   useEffect(() => {
+    baseSeq.current = null;
+    lastSeq.current = null;
     if (routeId) {
       connect();
     }